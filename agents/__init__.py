@@ -1,3 +1,4 @@
 from .gemini_agent import GeminiAgent
+from .document import LegalDocument
 
-__all__ = ['GeminiAgent'] 
\ No newline at end of file
+__all__ = ['GeminiAgent', 'LegalDocument'] 
\ No newline at end of file
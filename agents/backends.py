@@ -0,0 +1,63 @@
+import logging
+
+from .stub import StubEngine, StubModel
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiBackend:
+    """Real Gemini models, with the static template instructions as system instruction.
+
+    No explicit context cache is created: the API only caches contents of
+    a few thousand tokens and the fixed instructions of every template are
+    a few hundred (the reference provisions change with each request).
+
+    The SDK is imported here rather than at module level: it takes about a
+    second to import and is not needed by the stub backend.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+
+    def build_model(self, template, model_name=None):
+        """Model for ``template`` on ``model_name`` (default: the configured model)"""
+        return self._genai.GenerativeModel(model_name or self.model_name, system_instruction=template.instructions)
+
+
+class StubBackend:
+    """Offline backend answering from :mod:`agents.stub` (in-process or a stub server)"""
+
+    name = 'stub'
+
+    def __init__(self, url=None, latency=0.0, error_rate=0.0, seed=0, timeout=30, tail_rate=0.0):
+        self.url = url
+        self.timeout = timeout
+        self.engine = StubEngine(latency=latency, error_rate=error_rate, seed=seed, tail_rate=tail_rate)
+
+    def build_model(self, template, model_name=None):
+        # Todos os níveis respondem com o mesmo motor; o nome do modelo só separa as rotas
+        return StubModel(template, engine=self.engine, url=self.url, timeout=self.timeout)
+
+
+def create_backend(config):
+    """Build the model backend selected by ``Config.MODEL_BACKEND``"""
+    if config.MODEL_BACKEND == 'stub':
+        logger.warning("Using the stub model backend: documents are synthetic")
+        return StubBackend(
+            url=config.STUB_URL,
+            latency=config.STUB_LATENCY,
+            error_rate=config.STUB_ERROR_RATE,
+            seed=config.STUB_SEED,
+            timeout=config.GEMINI_TIMEOUT,
+            tail_rate=config.STUB_TAIL_RATE
+        )
+    if config.MODEL_BACKEND != 'gemini':
+        raise ValueError(f"Unknown MODEL_BACKEND: {config.MODEL_BACKEND}")
+    return GeminiBackend(config.GEMINI_API_KEY, config.GEMINI_MODEL)
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.metrics import GEMINI_CALLS
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_SUCCESS = 'success'
+OUTCOME_THROTTLED = 'throttled'
+OUTCOME_ERROR = 'error'
+# Chamada abandonada (a outra de um par com hedge respondeu antes); não mexe no limite
+OUTCOME_CANCELLED = 'cancelled'
+
+
+def _api_exceptions():
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return None
+    return exceptions
+
+
+def is_throttle(exc):
+    """True for quota (429) and overload (503) responses"""
+    exceptions = _api_exceptions()
+    if exceptions is None:
+        return False
+    return isinstance(exc, (exceptions.ResourceExhausted, exceptions.ServiceUnavailable))
+
+
+def is_retryable(exc):
+    """True for errors that may succeed on a later attempt.
+
+    Throttling, timeouts, transient server errors and dropped connections
+    are retried; invalid requests, auth failures and empty/blocked
+    responses are not.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    exceptions = _api_exceptions()
+    if exceptions is None:
+        return False
+    return isinstance(exc, (
+        exceptions.ResourceExhausted,
+        exceptions.ServiceUnavailable,
+        exceptions.DeadlineExceeded,
+        exceptions.InternalServerError,
+        exceptions.Aborted,
+    ))
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter for the given zero based attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit shared by the sync and asyncio call paths.
+
+    Each successful call raises the limit by ``increase / limit`` (about one
+    slot per window of calls); each throttled call (429/503) multiplies it by
+    ``decrease``. Callers beyond the current limit wait for a slot, which
+    spreads retries out instead of letting every worker hit the quota at
+    the same time.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, increase=1.0, decrease=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._async_waiters = deque()
+
+    def _has_slot(self):
+        return self.in_flight < max(self.minimum, int(self.limit))
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(self._has_slot, timeout):
+                raise TimeoutError("Timed out waiting for a Gemini concurrency slot")
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._has_slot():
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        # release() já gastou uma vaga com este waiter: repassa para o próximo
+                        self._wake_waiters()
+                raise
+
+    def release(self, outcome=OUTCOME_SUCCESS):
+        GEMINI_CALLS.inc(outcome=outcome)
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == OUTCOME_SUCCESS:
+                self.limit = min(float(self.maximum), self.limit + self.increase / self.limit)
+            elif outcome == OUTCOME_THROTTLED:
+                self.limit = max(float(self.minimum), self.limit * self.decrease)
+                logger.warning(f"Gemini throttled; concurrency limit reduced to {self.limit:.2f}")
+            self._cond.notify_all()
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Chamado com self._cond adquirido; waiters cancelados não contam como vaga entregue
+        free = max(self.minimum, int(self.limit)) - self.in_flight
+        while free > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            loop.call_soon_threadsafe(_wake, waiter)
+            free -= 1
+
+    @staticmethod
+    def _outcome(exc):
+        if exc is None:
+            return OUTCOME_SUCCESS
+        return OUTCOME_THROTTLED if is_throttle(exc) else OUTCOME_ERROR
+
+    @contextmanager
+    def slot(self, timeout=None):
+        self.acquire(timeout)
+        try:
+            yield
+        except Exception as e:
+            self.release(self._outcome(e))
+            raise
+        except GeneratorExit:
+            # Streaming abandonado pelo cliente (o gerador foi fechado no meio)
+            self.release(OUTCOME_CANCELLED)
+            raise
+        except BaseException:
+            self.release(OUTCOME_ERROR)
+            raise
+        self.release(OUTCOME_SUCCESS)
+
+    @asynccontextmanager
+    async def slot_async(self):
+        await self.acquire_async()
+        try:
+            yield
+        except Exception as e:
+            self.release(self._outcome(e))
+            raise
+        except asyncio.CancelledError:
+            self.release(OUTCOME_CANCELLED)
+            raise
+        except BaseException:
+            self.release(OUTCOME_ERROR)
+            raise
+        self.release(OUTCOME_SUCCESS)
+
+    def has_free_slot(self):
+        """True when a new call would get a slot right away, with nobody waiting for one"""
+        with self._cond:
+            return self._has_slot() and not self._async_waiters
+
+    def stats(self):
+        with self._cond:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'waiting': len(self._async_waiters)}
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class BackgroundLoop:
+    """Process wide event loop running in a daemon thread.
+
+    The SDK's asyncio client keeps its connection bound to the loop that
+    created it, so running every coroutine on this single loop lets
+    requests reuse the same channel instead of reconnecting per call.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name='gemini-loop', daemon=True)
+                thread.start()
+            return self._loop
+
+    def run(self, coro, timeout=None):
+        """Run ``coro`` on the background loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def submit(self, coro):
+        """Schedule ``coro`` and return a ``concurrent.futures.Future``.
+
+        The coroutine sees the caller's context variables (request id,
+        sampled stage timings), as if it ran in the calling thread.
+        """
+        return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), self._get_loop())
+
+
+async def _in_context(coro, context):
+    # A tarefa ganha uma cópia do contexto da thread do loop; recebe os valores de quem chamou
+    for var, value in context.items():
+        var.set(value)
+    return await coro
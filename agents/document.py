@@ -0,0 +1,136 @@
+import html as html_lib
+from collections.abc import Mapping
+
+from .formatter import sanitize
+
+SECTION_MARKERS = {
+    '[PARTIES]': 'parties',
+    '[FACTS]': 'facts',
+    '[LEGAL_GROUNDS]': 'legal_grounds',
+    '[REQUESTS]': 'requests',
+    '[VALUE_CAUSE]': 'value_cause',
+    '[CITY_DATE]': 'city_date',
+    '[LAWYER_NAME]': 'lawyer_name',
+    '[LAWYER_OAB]': 'lawyer_oab'
+}
+SECTION_NAMES = tuple(SECTION_MARKERS.values())
+
+_PARAGRAPH_OPEN = '<p class="document-paragraph">'
+_PARAGRAPH_BREAK = '</p><p class="document-paragraph">'
+
+
+def paragraphs_html(text):
+    """One ``document-paragraph`` per line of ``text``, sanitized like the formatter output"""
+    if not text:
+        return ''
+    return sanitize(_PARAGRAPH_OPEN + _PARAGRAPH_BREAK.join(text.split('\n')) + '</p>')
+
+
+def items_html(text):
+    """One ``<li>`` per non blank line of ``text``, sanitized like the formatter output"""
+    if not text:
+        return ''
+    return sanitize(''.join(f'<li>{line.strip()}</li>' for line in text.split('\n') if line.strip()))
+
+
+# Seções exibidas como fragmentos HTML; as demais entram no template como texto
+FRAGMENT_BUILDERS = {
+    'parties': paragraphs_html,
+    'facts': paragraphs_html,
+    'legal_grounds': paragraphs_html,
+    'requests': items_html,
+}
+
+
+class LegalDocument(Mapping):
+    """Sections of a generated document, with their HTML rendered on demand.
+
+    Behaves as a read only mapping of section name to text, so it can be
+    cached, serialized (``dict(document)``) and passed around like the
+    plain dict it replaces. HTML fragments and the rendered document body
+    are computed once and kept on the instance; concurrent first calls may
+    compute the same value twice, which is harmless.
+    """
+
+    __slots__ = SECTION_NAMES + ('_fragments', '_body')
+
+    def __init__(self, **sections):
+        for name in SECTION_NAMES:
+            setattr(self, name, sections.get(name) or '')
+        self._fragments = {}
+        self._body = None
+
+    @classmethod
+    def from_mapping(cls, data):
+        """Wrap a section dict (e.g. loaded from the disk cache); instances are returned unchanged"""
+        if isinstance(data, cls):
+            return data
+        return cls(**{name: data.get(name) for name in SECTION_NAMES})
+
+    def __getitem__(self, name):
+        if name not in SECTION_NAMES:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self):
+        return iter(SECTION_NAMES)
+
+    def __len__(self):
+        return len(SECTION_NAMES)
+
+    def __repr__(self):
+        filled = [name for name in SECTION_NAMES if getattr(self, name)]
+        return f'<LegalDocument sections={filled}>'
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in SECTION_NAMES}
+
+    def text(self):
+        """Plain text of the document, section after section"""
+        return '\n\n'.join(text for text in (getattr(self, name) for name in SECTION_NAMES) if text)
+
+    def replace(self, **sections):
+        """Copy with ``sections`` replaced; the HTML of the untouched sections is carried over"""
+        document = LegalDocument(**{**self.to_dict(), **sections})
+        document._fragments = {name: html for name, html in self._fragments.items() if name not in sections}
+        return document
+
+    def html(self, name):
+        """HTML fragment of section ``name`` as embedded in ``_legal_document.html``"""
+        builder = FRAGMENT_BUILDERS.get(name)
+        if builder is None:
+            # Seções de uma linha (valor da causa, cidade e data...) são só texto
+            return html_lib.escape(getattr(self, name))
+        html = self._fragments.get(name)
+        if html is None:
+            html = self._fragments[name] = builder(getattr(self, name))
+        return html
+
+    @property
+    def parties_html(self):
+        return self.html('parties')
+
+    @property
+    def facts_html(self):
+        return self.html('facts')
+
+    @property
+    def legal_grounds_html(self):
+        return self.html('legal_grounds')
+
+    @property
+    def requests_html(self):
+        return self.html('requests')
+
+    def body(self, key, render):
+        """Rendered document body, reused while ``key`` (header values, date) is unchanged.
+
+        ``render`` is called without arguments on a miss; the preview page
+        and the print template both embed the same body.
+        """
+        cached = self._body
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        html = render()
+        self._body = (key, html)
+        return html
@@ -0,0 +1,281 @@
+import re
+from datetime import datetime
+
+ALLOWED_TAGS = frozenset({'h1', 'h2', 'p', 'div', 'span', 'em', 'strong', 'ol', 'li'})
+ALLOWED_CLASSES = frozenset({
+    "section-title", "document-paragraph", "highlight", "citation",
+    "legal-reference", "legal-item", "legal-subitem", "paragraph-number",
+    "article-number", "law-number", "code-reference", "court-reference"
+})
+# Tags removidas quando não têm texto relevante
+PRUNED_TAGS = frozenset({'p', 'div', 'h2', 'li'})
+
+# Limpeza do texto gerado
+_CODE_FENCE_RE = re.compile(r'```[a-zA-Z]*')
+_DOCUMENT_TITLE_RE = re.compile(r'Petição Inicial')
+_STYLE_BLOCK_RE = re.compile(r'<style.*?>.*?</style>', re.DOTALL)
+_BODY_RULE_RE = re.compile(r'body\s*{[^}]*}', re.DOTALL)
+_BRACES_RE = re.compile(r'\{[^}]*\}', re.DOTALL)
+_STYLE_ATTR_RE = re.compile(r'style="[^"]*"')
+
+# Estrutura jurídica
+_SECTION_TITLE_RE = re.compile(r'(?<![\w>])D(A|O|OS|AS)?\s+([A-ZÇÃÕÉÊÍÓÚÂÔÛÀÈÌÒÙ\s]+)')
+_TITLE_SMALL_WORD_RE = re.compile(
+    r'\b(Da|Do|Dos|Das|E|A|O|As|Os|De|Em|No|Na|Nos|Nas|Por|Para|Com|Ao|À|Pelo|Pela|Pelos|Pelas)\b'
+)
+_ROMAN_ITEM_RE = re.compile(r'(?m)^([IVX]+)\s*-\s*(.*)$')
+_LETTER_ITEM_RE = re.compile(r'(?m)^([a-j])\)\s*(.*)$')
+_NUMBERED_PARAGRAPH_RE = re.compile(r'§\s*(\d+)\.\s*(.*)')
+_REQUESTS_RE = re.compile(r'(requer a Vossa Excelência:)(.*?)(<p|§|$)', re.DOTALL | re.IGNORECASE)
+_REQUEST_SPLIT_RE = re.compile(r';|\n')
+_BLANK_LINES_RE = re.compile(r'\n{2,}')
+
+# Tópicos vazios ou irrelevantes
+_PUNCTUATION_ONLY_RE = re.compile(r'[-–—.·•§\\s]*')
+_MARKERS_ONLY_RE = re.compile(r'(Art\\.?|§|I+\\s*-|[0-9]+\\.|\\[.*?\\]|\\.{2,}|-+|–+|—+|•+|·+|,|;|:|/|\\\\)+')
+_MARKER_TEXTS = frozenset(['...', '[]', 'art.', '§', 'i -', 'ii -', 'iii -', 'iv -', 'v -', 'vi -', 'vii -', 'viii -', 'ix -', 'x -'])
+_LEGAL_WORDS_RE = re.compile(r'(fato|pedido|fundamenta|qualifica|parte|conclus|requer|direito|dos|da|do|das|dos)', re.IGNORECASE)
+
+# Tokenizador do HTML intermediário. Cobre apenas o HTML que o próprio
+# formatador e o modelo produzem; qualquer outra construção cai no caminho
+# com BeautifulSoup, para que a saída seja sempre a mesma.
+_TOKEN_RE = re.compile(
+    r'<(?:'
+    r'(?P<start>[a-zA-Z][a-zA-Z0-9]*)'
+    r'(?P<attrs>(?:\s+[a-zA-Z_:][-a-zA-Z0-9_:.]*(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s"\'=<>`/]+))?)*)'
+    r'\s*(?P<close>/?)>'
+    r'|/(?P<end>[a-zA-Z][a-zA-Z0-9]*)\s*>'
+    r'|(?P<other>[a-zA-Z/!?]|$))'  # tag malformada, comentário, declaração ou '<' final
+)
+_ATTR_RE = re.compile(r'([a-zA-Z_:][-a-zA-Z0-9_:.]*)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`/]+)))?')
+_NONWHITESPACE_RE = re.compile(r'\S+')
+
+# Tags fechadas assim que abertas pelo html.parser do BeautifulSoup
+_VOID_TAGS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr'
+})
+# Tags com regras próprias de texto no BeautifulSoup (conteúdo bruto,
+# espaços preservados ou strings especiais)
+_UNSUPPORTED_TAGS = frozenset({'script', 'style', 'pre', 'textarea', 'rt', 'rp', 'template'})
+_ASCII_SPACES = ' \n\t\x0c\r'
+
+
+class _Unsupported(Exception):
+    """Markup outside what the single-pass sanitizer reproduces"""
+
+
+def _title_case_section(match):
+    artigo = match.group(1) or ''
+    texto = match.group(2).strip().title()
+    # Corrige palavras comuns do juridiquês para maiúsculas
+    texto = _TITLE_SMALL_WORD_RE.sub(lambda m: m.group(0).upper(), texto)
+    return f'<h2 class="section-title">D{artigo.upper()} {texto}</h2>'
+
+
+def _requests_to_list(match):
+    itens = _REQUEST_SPLIT_RE.split(match.group(2))
+    lis = ''.join(f'<li>{item.strip()}</li>' for item in itens if item.strip())
+    return f'{match.group(1)}<ol>{lis}</ol>'
+
+
+def structure_document(document):
+    """Clean the generated text and mark up its legal structure as (unsanitized) HTML"""
+    # Remove blocos de código markdown e títulos duplicados
+    document = _CODE_FENCE_RE.sub('', document)
+    document = _DOCUMENT_TITLE_RE.sub('', document, count=1)
+
+    # Remove blocos de CSS, tags <style> e atributos style
+    document = _STYLE_BLOCK_RE.sub('', document)
+    document = _BODY_RULE_RE.sub('', document)
+    document = _BRACES_RE.sub('', document)
+    document = _STYLE_ATTR_RE.sub('', document)
+
+    # Títulos de seção, incisos, alíneas e parágrafos numerados
+    document = _SECTION_TITLE_RE.sub(_title_case_section, document)
+    document = _ROMAN_ITEM_RE.sub(r'<div class="legal-item">\1 - \2</div>', document)
+    document = _LETTER_ITEM_RE.sub(r'<div class="legal-subitem">\1) \2</div>', document)
+    document = _NUMBERED_PARAGRAPH_RE.sub(
+        r'<p class="document-paragraph"><span class="paragraph-number">§ \1.</span> \2</p>', document
+    )
+
+    # Garante que linhas soltas virem parágrafos
+    lines = []
+    for line in document.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith('<'):
+            line = f'<p class="document-paragraph">{stripped}</p>'
+        lines.append(line)
+    document = '\n'.join(lines)
+
+    # Pedidos após "requer a Vossa Excelência:" viram lista numerada
+    document = _REQUESTS_RE.sub(_requests_to_list, document)
+    return _BLANK_LINES_RE.sub('\n', document)
+
+
+def _is_irrelevant(name, text):
+    """True if a p/div/h2/li with this stripped text should be dropped"""
+    if (
+        not text or
+        _PUNCTUATION_ONLY_RE.fullmatch(text) or
+        _MARKERS_ONLY_RE.fullmatch(text) or
+        text.lower() in _MARKER_TEXTS
+    ):
+        return True
+    # Títulos de seção sem palavras jurídicas relevantes
+    return name in ('h2', 'div') and not _LEGAL_WORDS_RE.search(text)
+
+
+def _escape(text):
+    return text.replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _start_tag(name, raw_attrs):
+    """Serialize an allowed start tag; ``class`` (with allowed classes only) is the one attribute kept"""
+    value = None
+    for match in _ATTR_RE.finditer(raw_attrs or ''):
+        if match.group(1).lower() == 'class':
+            # Atributo repetido: o último valor vence
+            value = next((v for v in match.group(2, 3, 4) if v is not None), '')
+    classes = [c for c in _NONWHITESPACE_RE.findall(value or '') if c in ALLOWED_CLASSES]
+    if not classes:
+        return f'<{name}>'
+    return f'<{name} class="{" ".join(classes)}">'
+
+
+def sanitize(markup):
+    """Single tokenizing pass over the structured HTML.
+
+    Disallowed tags are unwrapped, every attribute but ``class`` is dropped
+    (and ``class`` keeps only :data:`ALLOWED_CLASSES`), and
+    ``p``/``div``/``h2``/``li`` elements without relevant text are dropped,
+    all while the output is being written. Produces exactly what
+    :func:`sanitize_with_soup` produces; markup this pass does not model
+    (comments, entities, raw text elements, malformed tags) is delegated to
+    it.
+    """
+    try:
+        return _sanitize(markup)
+    except _Unsupported:
+        return sanitize_with_soup(markup)
+
+
+def _sanitize(markup):
+    if '&' in markup:
+        raise _Unsupported()
+    out = []
+    texts = []
+    # Pilha de (nome, posição na saída, posição nos textos, permitida)
+    stack = []
+    open_counts = {}
+    data = []
+
+    def flush():
+        text = ''.join(data)
+        data.clear()
+        if not text.strip(_ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        out.append(_escape(text))
+        stripped = text.strip()
+        if stripped:
+            texts.append(stripped)
+
+    def close(name, out_start, text_start, allowed):
+        open_counts[name] -= 1
+        if not allowed:
+            return
+        if name in PRUNED_TAGS and _is_irrelevant(name, ''.join(texts[text_start:])):
+            del out[out_start:]
+        else:
+            out.append(f'</{name}>')
+
+    pos = 0
+    for match in _TOKEN_RE.finditer(markup):
+        start, name, end = match.start(), match.group('start'), match.group('end')
+        if start > pos:
+            data.append(markup[pos:start])
+        pos = match.end()
+        if match.group('other') is not None:
+            raise _Unsupported()
+
+        if data:
+            flush()
+        if name is not None:
+            name = name.lower()
+            if name in _UNSUPPORTED_TAGS:
+                raise _Unsupported()
+            allowed = name in ALLOWED_TAGS
+            frame = (name, len(out), len(texts), allowed)
+            if allowed:
+                out.append(_start_tag(name, match.group('attrs')))
+            open_counts[name] = open_counts.get(name, 0) + 1
+            if match.group('close') or name in _VOID_TAGS:
+                close(*frame)
+            else:
+                stack.append(frame)
+        else:
+            end = end.lower()
+            if end in _VOID_TAGS or end in _UNSUPPORTED_TAGS:
+                raise _Unsupported()
+            if open_counts.get(end):
+                while True:
+                    frame = stack.pop()
+                    close(*frame)
+                    if frame[0] == end:
+                        break
+
+    # Um '<' que não abre tag não casa com o tokenizador e segue como texto
+    if pos < len(markup):
+        data.append(markup[pos:])
+    if data:
+        flush()
+    while stack:
+        close(*stack.pop())
+    return ''.join(out)
+
+
+def sanitize_with_soup(markup):
+    """Reference sanitizer built on BeautifulSoup; handles arbitrary markup"""
+    # Importado só quando necessário: o BeautifulSoup pesa na inicialização do app
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(markup, "html.parser")
+    for tag in soup.find_all(True):
+        if tag.name not in ALLOWED_TAGS:
+            tag.unwrap()
+        # Só o atributo class sobrevive: nada de style, on*, href, src...
+        classes = [c for c in tag.get('class', []) if c in ALLOWED_CLASSES]
+        tag.attrs = {'class': classes} if classes else {}
+
+    # Limpeza agressiva de tópicos vazios ou irrelevantes
+    for tag in soup.find_all(list(PRUNED_TAGS)):
+        if _is_irrelevant(tag.name, tag.get_text(strip=True)):
+            tag.decompose()
+    return str(soup)
+
+
+def format_document(document, case_type, current_date=None):
+    """Turn the generated text into the structured, sanitized document HTML"""
+    current_date = current_date or datetime.now().strftime("%d de %B de %Y")
+    content = sanitize(structure_document(document))
+    return f"""
+        <div class="legal-document">
+            <div class="document-header">
+                <h1 class="document-title">{case_type}</h1>
+                <p class="document-date">Data: {current_date}</p>
+            </div>
+            <div class="document-content">
+                {content}
+            </div>
+            <div class="document-signature">
+                <div class="signature-line"></div>
+                <p class="signature-name">Advogado(a)</p>
+                <p class="signature-oab">OAB/XX XXX.XXX</p>
+            </div>
+            <div class="document-footer">
+                <p class="footer-text">Documento gerado por LexGenius</p>
+                <p class="footer-date">Data de geração: {current_date}</p>
+            </div>
+        </div>
+        """
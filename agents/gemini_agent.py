@@ -1,252 +1,445 @@
-import os
 import logging
-import google.generativeai as genai
 from config import Config
-from functools import wraps
-import time
-from datetime import datetime
-from bs4 import BeautifulSoup
+import asyncio
+import json
 import re
+import threading
+import time
+from .formatter import format_document
+from .document import SECTION_MARKERS, LegalDocument
+from .prompts import estimate_tokens, document_template, ANALYSIS_TEMPLATE, BASIS_TEMPLATE, REVIEW_TEMPLATE, SECTION_TEMPLATE, SECTION_CONTEXT
+from utils.metrics import metrics, stage, record_usage, GEMINI_SECONDS, PROMPT_TRIMS
+from .backends import create_backend
+from .concurrency import AdaptiveConcurrencyLimiter, BackgroundLoop, is_retryable, is_throttle, backoff_delay
+from .router import create_model_router, document_input_tokens
 
 # Configuração do logger
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def retry_on_failure(max_retries=3, delay=1):
-    """Decorator to retry a function on failure"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        logger.error(f"Failed after {max_retries} attempts: {str(e)}")
-                        raise
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                    time.sleep(delay)
-            return None
-        return wrapper
-    return decorator
+class SectionStreamParser:
+    """Versão incremental de ``_parse_sections``.
+
+    Recebe o texto em pedaços arbitrários (como chegam do ``stream=True``) e
+    devolve cada seção assim que o marcador seguinte aparece.
+    """
 
-class GeminiAgent:
     def __init__(self):
-        """Initialize the Gemini agent with API key"""
-        if not Config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
+        self.sections = {name: '' for name in SECTION_MARKERS.values()}
+        self.current = None
+        self.buffer = []
+        self._pending = ''
+
+    def feed(self, chunk):
+        """Processa um pedaço de texto e retorna as seções concluídas como (nome, texto)"""
+        finished = []
+        lines = (self._pending + chunk).splitlines(True)
+        self._pending = ''
+        # A última linha pode estar incompleta; aguarda o próximo pedaço
+        if lines and lines[-1].splitlines()[0] == lines[-1]:
+            self._pending = lines.pop()
+        for line in lines:
+            self._feed_line(line, finished)
+        return finished
+
+    def close(self):
+        """Finaliza o fluxo e retorna as seções restantes"""
+        finished = []
+        if self._pending:
+            self._feed_line(self._pending, finished)
+            self._pending = ''
+        self._finish_current(finished)
+        self.current = None
+        return finished
+
+    def _feed_line(self, line, finished):
+        line = line.strip()
+        if not line:
+            return
+        if line in SECTION_MARKERS:
+            self._finish_current(finished)
+            self.current = SECTION_MARKERS[line]
+            self.buffer = []
+        elif self.current:
+            self.buffer.append(line)
+
+    def _finish_current(self, finished):
+        if self.current and self.buffer:
+            text = '\n'.join(self.buffer).strip()
+            self.sections[self.current] = text
+            finished.append((self.current, text))
+        self.buffer = []
+
+# Pede ao Gemini uma resposta em JSON puro (análise e revisão)
+JSON_GENERATION_CONFIG = {'response_mime_type': 'application/json'}
+
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def parse_json_response(text):
+    """Parse a JSON object answer, tolerating markdown fences or text around it"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        match = _JSON_OBJECT_RE.search(text)
+        if match is None:
+            raise ValueError("Gemini response is not JSON")
+        return json.loads(match.group(0))
+
+
+async def _optional(coro, name):
+    """Await an auxiliary pass, returning None (and logging) if it fails"""
+    try:
+        return await coro
+    except Exception as e:
+        logger.warning(f"Auxiliary {name} pass failed: {str(e)}")
+        return None
+
+
+async def first_success(tasks):
+    """Result and index of the first of ``tasks`` to succeed; the tasks still running are cancelled.
+
+    When every task fails, the error of the earliest one in ``tasks`` is raised.
+    """
+    pending = set(tasks)
+    errors = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Lê a exceção de todas as concluídas para o asyncio não avisar de erros não consultados
+            for task in done:
+                if task.exception() is not None:
+                    errors[tasks.index(task)] = task.exception()
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), tasks.index(task)
+        raise errors[min(errors)]
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class GeminiAgent:
+    def __init__(self, backend=None, citation_index=None, router=None):
+        """Initialize the agent with a model backend (by default the one selected in ``Config``).
+
+        With a ``citation_index`` the document prompt carries the statute
+        texts most relevant to the case (see :meth:`_references`). The
+        ``router`` picks the model of each call, its fallbacks and when to
+        hedge (see :mod:`agents.router`; by default the one from ``Config``).
+        """
+        self.backend = backend or create_backend(Config)
+        self.citation_index = citation_index
+        self.router = router or create_model_router(Config)
         self.logger = logging.getLogger(__name__)
+        # Um modelo por versão de template e nome de modelo: as instruções estáticas vão como system_instruction
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self.request_options = {'timeout': Config.GEMINI_TIMEOUT}
+        # Limite de concorrência AIMD compartilhado pelos caminhos síncrono e assíncrono
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial=Config.GEMINI_CONCURRENCY_INITIAL,
+            minimum=Config.GEMINI_CONCURRENCY_MIN,
+            maximum=Config.GEMINI_CONCURRENCY_MAX
+        )
+        self.loop = BackgroundLoop()
+
+    def model_for(self, template, model_name=None):
+        """Model carrying the static instructions of ``template``, built once per template version and model"""
+        key = (template.key, model_name)
+        model = self._models.get(key)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self._models[key] = self.backend.build_model(template, model_name)
+        return model
+
+    def _render_prompt(self, template, max_input_tokens=None, **fields):
+        """Fill ``template`` with the request fields, trimmed to the input token budget"""
+        prompt, trimmed = template.render(max_input_tokens or Config.PROMPT_MAX_INPUT_TOKENS, **fields)
+        if trimmed:
+            PROMPT_TRIMS.inc(template=template.key)
+            self.logger.warning(f"Prompt {template.key}: fields trimmed to the token budget: {', '.join(trimmed)}")
+        return prompt
 
-    @retry_on_failure(max_retries=3)
     def generate_document(self, case_type, parties, facts, legal_grounds, requests):
-        """Generate a legal document using the Gemini model and return sections separately"""
+        """Generate a legal document using the Gemini model and return sections separately.
+
+        Blocking wrapper of :meth:`generate_document_async`, so the call gets
+        the same routing, hedging and fallbacks as the asyncio path.
+        """
+        return self.run_async(self.generate_document_async(case_type, parties, facts, legal_grounds, requests))
+
+    async def _generate_text_async(self, template, prompt, stage_name='gemini', generation_config=None, case_type=None,
+                                   input_tokens=None):
+        """Call the routed model under the adaptive concurrency limit, retrying transient errors, and return the text.
+
+        A throttled (429/503) model hands the call to the next model of the
+        route's fallback chain right away; other transient errors, or a
+        whole chain throttled, are retried with backoff. ``input_tokens``
+        sizes the route (by default the estimated size of ``prompt``).
+        """
+        if input_tokens is None:
+            input_tokens = estimate_tokens(prompt)
+        route = self.router.route(template, case_type, input_tokens)
+        for attempt in range(Config.GEMINI_MAX_RETRIES):
+            tiers = self.router.targets(route)
+            for position, tier in enumerate(tiers):
+                try:
+                    with stage(stage_name):
+                        response = await self._call_hedged(route, tier, template, prompt, generation_config)
+                    record_usage(response, template.key)
+                    if not response or not response.text:
+                        raise ValueError("Empty response from Gemini API")
+                    return response.text
+                except Exception as e:
+                    error = e
+                    if not is_throttle(e):
+                        self.router.failed(route, tier)
+                        break
+                    self.router.throttled(route, tier)
+                    if position < len(tiers) - 1:
+                        self.logger.warning(
+                            f"Model {route.model(tier)} throttled; falling back to {route.model(tiers[position + 1])}"
+                        )
+            if not is_retryable(error) or attempt == Config.GEMINI_MAX_RETRIES - 1:
+                self.logger.error(f"Error generating {stage_name}: {str(error)}")
+                raise error
+            self.logger.warning(f"Attempt {attempt + 1} failed: {str(error)}")
+            await asyncio.sleep(backoff_delay(attempt, Config.GEMINI_BACKOFF_BASE, Config.GEMINI_BACKOFF_MAX))
+
+    async def _call_hedged(self, route, tier, template, prompt, generation_config):
+        """Call the model of ``tier``; once past the route's hedge delay, race a duplicate and keep the first answer.
+
+        The duplicate is only sent while the concurrency limit has a free
+        slot, so hedges never queue behind first attempts.
+        """
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(self._call_model(route, tier, template, prompt, generation_config))]
         try:
-            prompt = self._create_prompt(case_type, parties, facts, legal_grounds, requests)
-            response = self.model.generate_content(prompt)
-            if not response or not response.text:
-                raise ValueError("Empty response from Gemini API")
-            # Parse the response into sections
-            sections = self._parse_sections(response.text)
-            return sections
-        except Exception as e:
-            self.logger.error(f"Error generating document: {str(e)}")
+            delay = self.router.hedge_delay(route, tier)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.limiter.has_free_slot():
+                    tasks.append(asyncio.ensure_future(self._call_model(route, tier, template, prompt, generation_config)))
+            response, winner = await first_success(tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
             raise
+        self.router.record(route, tier, time.monotonic() - started, hedged=len(tasks) > 1, hedge_won=winner > 0)
+        return response
 
-    def _create_prompt(self, case_type, parties, facts, legal_grounds, requests):
-        """Prompt aprimorado para gerar peças jurídicas completas e profissionais."""
-        return f"""
-Gere o texto de uma peça jurídica do tipo {case_type} com as seguintes informações, retornando cada seção SEPARADAMENTE, SEM HTML, SEM formatação, apenas o texto puro de cada parte, usando os marcadores abaixo:
-
-[PARTIES]
-{parties}
-[FACTS]
-{facts}
-[LEGAL_GROUNDS]
-{legal_grounds}
-[REQUESTS]
-{requests}
-[VALUE_CAUSE]
-(Preencha com o valor da causa, ex: 'Dá-se à causa o valor de R$ 15.000,00 (quinze mil reais).')
-[CITY_DATE]
-(Preencha com cidade e data, ex: 'São Paulo, 14 de maio de 2025.')
-[LAWYER_NAME]
-(Preencha com o nome do advogado)
-[LAWYER_OAB]
-(Preencha com o número da OAB)
-
-Instruções:
-- Use linguagem jurídica formal, clara, objetiva e técnica.
-- Estruture cada seção conforme a tradição forense brasileira.
-- No preâmbulo e qualificação, detalhe nomes, documentos, endereços e representações.
-- Nos fatos, conte a história com contexto, datas, valores, consequências e impacto.
-- Na fundamentação, cite doutrina, jurisprudência e artigos de lei reais e relevantes, com trechos e explicações.
-- Nos pedidos, detalhe cada um, fundamente e numere, incluindo citação, condenação, custas, honorários, protesto por provas, etc.
-- Inclua protesto por provas, valor da causa, local/data e assinatura.
-- Parágrafos devem ser numerados e justificados.
-- Não repita informações entre seções.
-- Não gere tópicos vazios ou genéricos.
-- Cada pedido deve ser completo, objetivo e em frase única.
-- O texto deve ser compatível com o padrão de grandes escritórios de advocacia.
-"""
+    async def _call_model(self, route, tier, template, prompt, generation_config):
+        model = self.model_for(template, route.model(tier))
+        async with self.limiter.slot_async():
+            with metrics.span(GEMINI_SECONDS, template=template.key):
+                return await model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options=self.request_options
+                )
 
-    def _parse_sections(self, text):
-        """Extrai as seções do texto do Gemini usando marcadores."""
-        sections = {
-            'parties': '',
-            'facts': '',
-            'legal_grounds': '',
-            'requests': '',
-            'value_cause': '',
-            'city_date': '',
-            'lawyer_name': '',
-            'lawyer_oab': ''
-        }
-        current = None
-        buffer = []
-        marker_map = {
-            '[PARTIES]': 'parties',
-            '[FACTS]': 'facts',
-            '[LEGAL_GROUNDS]': 'legal_grounds',
-            '[REQUESTS]': 'requests',
-            '[VALUE_CAUSE]': 'value_cause',
-            '[CITY_DATE]': 'city_date',
-            '[LAWYER_NAME]': 'lawyer_name',
-            '[LAWYER_OAB]': 'lawyer_oab'
-        }
-        for line in text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line in marker_map:
-                if current and buffer:
-                    sections[current] = '\n'.join(buffer).strip()
-                current = marker_map[line]
-                buffer = []
-            else:
-                if current:
-                    buffer.append(line)
-        if current and buffer:
-            sections[current] = '\n'.join(buffer).strip()
-        return sections
+    async def generate_document_async(self, case_type, parties, facts, legal_grounds, requests):
+        """Asyncio version of :meth:`generate_document` under the adaptive concurrency limit.
 
-    def _format_document(self, document: str, case_type: str) -> str:
-        """Formata o documento gerado com HTML estruturado e limpo, títulos corretos e pedidos em lista."""
-        current_date = datetime.now().strftime("%d de %B de %Y")
-
-        # Remove blocos de código markdown e títulos duplicados
-        document = re.sub(r'```[a-zA-Z]*', '', document)
-        document = re.sub(r'Petição Inicial', '', document, count=1)
-
-        # Remove blocos de CSS e tags <style>
-        document = re.sub(r'<style.*?>.*?</style>', '', document, flags=re.DOTALL)
-        document = re.sub(r'body\s*{[^}]*}', '', document, flags=re.DOTALL)
-        document = re.sub(r'\{[^}]*\}', '', document, flags=re.DOTALL)
-
-        # Remove qualquer atributo style
-        document = re.sub(r'style="[^"]*"', '', document)
-
-        # Corrige títulos de seção (DOS FATOS, DA FUNDAMENTAÇÃO JURÍDICA, etc.)
-        def section_title_replacer(match):
-            artigo = match.group(1) or ''
-            texto = match.group(2).strip().title()
-            # Corrige palavras comuns do juridiquês para maiúsculas
-            texto = re.sub(r'\b(Da|Do|Dos|Das|E|A|O|As|Os|De|Em|No|Na|Nos|Nas|Por|Para|Com|Ao|À|Pelo|Pela|Pelos|Pelas)\b', lambda m: m.group(0).upper(), texto)
-            return f'<h2 class="section-title">D{artigo.upper()} {texto}</h2>'
-        document = re.sub(
-            r'(?<![\w>])D(A|O|OS|AS)?\s+([A-ZÇÃÕÉÊÍÓÚÂÔÛÀÈÌÒÙ\s]+)',
-            section_title_replacer,
-            document
+        Run it on ``self.loop`` (see :meth:`run_async`) so the SDK's async
+        channel is reused between calls.
+        """
+        prompt = self._create_prompt(case_type, parties, facts, legal_grounds, requests)
+        text = await self._generate_text_async(
+            document_template(case_type), prompt, case_type=case_type,
+            input_tokens=document_input_tokens(parties, facts, legal_grounds, requests)
         )
+        with stage('parse_sections'):
+            return self._parse_sections(text)
 
-        # Converte incisos romanos para <div class="legal-item">I - ...</div>
-        document = re.sub(r'(?m)^([IVX]+)\s*-\s*(.*)$', r'<div class="legal-item">\1 - \2</div>', document)
+    async def analyze_case_async(self, case_type, parties, facts, legal_grounds, requests):
+        """Strengths, weaknesses, risks, opportunities and suggestions for the case, as a dict"""
+        prompt = self._create_analysis_prompt(case_type, parties, facts, legal_grounds, requests)
+        text = await self._generate_text_async(ANALYSIS_TEMPLATE, prompt, 'gemini_analysis', JSON_GENERATION_CONFIG, case_type)
+        return parse_json_response(text)
 
-        # Converte alíneas para <div class="legal-subitem">a) ...</div>
-        document = re.sub(r'(?m)^([a-j])\)\s*(.*)$', r'<div class="legal-subitem">\1) \2</div>', document)
+    async def legal_basis_async(self, case_type, parties, facts, legal_grounds, requests):
+        """Plain text survey of the statutes, case law and doctrine applicable to the case"""
+        prompt = self._create_basis_prompt(case_type, facts, legal_grounds, requests)
+        return (await self._generate_text_async(BASIS_TEMPLATE, prompt, 'gemini_basis', case_type=case_type)).strip()
 
-        # Converte parágrafos numerados para <p class="document-paragraph"><span class="paragraph-number">§ n.</span> ...</p>
-        document = re.sub(r'§\s*(\d+)\.\s*(.*)', r'<p class="document-paragraph"><span class="paragraph-number">§ \1.</span> \2</p>', document)
+    async def review_document_async(self, case_type, sections):
+        """Structure, clarity and coherence review of a drafted document, as a dict"""
+        prompt = self._create_review_prompt(case_type, sections)
+        text = await self._generate_text_async(REVIEW_TEMPLATE, prompt, 'gemini_review', JSON_GENERATION_CONFIG, case_type)
+        return parse_json_response(text)
 
-        # Garante que linhas soltas virem parágrafos
-        lines = document.splitlines()
-        new_lines = []
-        for line in lines:
-            if (not line.strip().startswith('<') and line.strip()):
-                new_lines.append(f'<p class="document-paragraph">{line.strip()}</p>')
-            else:
-                new_lines.append(line)
-        document = '\n'.join(new_lines)
-
-        # Formata pedidos em lista numerada (ol/li)
-        # Procura "requer a Vossa Excelência:" e transforma os itens seguintes em <li>
-        def pedidos_replacer(match):
-            pre = match.group(1)
-            pedidos = match.group(2)
-            # Divide por ponto e vírgula ou quebra de linha
-            itens = re.split(r';|\n', pedidos)
-            lis = ''.join(f'<li>{item.strip()}</li>' for item in itens if item.strip())
-            return f'{pre}<ol>{lis}</ol>'
-        document = re.sub(r'(requer a Vossa Excelência:)(.*?)(<p|§|$)', pedidos_replacer, document, flags=re.DOTALL|re.IGNORECASE)
-
-        # Remove linhas em branco extras
-        document = re.sub(r'\n{2,}', '\n', document)
-
-        # Usa BeautifulSoup para garantir HTML válido e remover tags não permitidas
-        soup = BeautifulSoup(document, "html.parser")
-        allowed_tags = {'h1', 'h2', 'p', 'div', 'span', 'em', 'strong', 'ol', 'li'}
-        allowed_classes = {
-            "section-title", "document-paragraph", "highlight", "citation",
-            "legal-reference", "legal-item", "legal-subitem", "paragraph-number",
-            "article-number", "law-number", "code-reference", "court-reference"
-        }
-        for tag in soup.find_all(True):
-            if tag.name not in allowed_tags:
-                tag.unwrap()
-            if "class" in tag.attrs:
-                tag['class'] = [c for c in tag.get('class', []) if c in allowed_classes]
-                if not tag['class']:
-                    del tag['class']
-            # Remove qualquer atributo style remanescente
-            if 'style' in tag.attrs:
-                del tag['style']
-
-        # Limpeza agressiva de tópicos vazios ou irrelevantes
-        for tag in soup.find_all(['p', 'div', 'h2', 'li']):
-            text = tag.get_text(strip=True)
-            # Remove se não houver texto relevante (apenas pontuação, marcadores, números, etc)
-            if (
-                not text or
-                re.fullmatch(r'[-–—.·•§\\s]*', text) or
-                re.fullmatch(r'[0-9IVXivx]+[.\\-–—]*', text) or
-                re.fullmatch(r'(Art\\.?|§|I+\\s*-|[0-9]+\\.|\\[.*?\\]|\\.{2,}|-+|–+|—+|•+|·+|,|;|:|/|\\\\)+', text) or
-                text.lower() in ['...', '[]', 'art.', '§', 'i -', 'ii -', 'iii -', 'iv -', 'v -', 'vi -', 'vii -', 'viii -', 'ix -', 'x -']
-            ):
-                tag.decompose()
-            # Remove títulos de seção que não contenham palavras jurídicas relevantes
-            elif tag.name in ['h2', 'div'] and not re.search(r'(fato|pedido|fundamenta|qualifica|parte|conclus|requer|direito|dos|da|do|das|dos)', text, re.IGNORECASE):
-                tag.decompose()
-
-        html_template = f"""
-        <div class="legal-document">
-            <div class="document-header">
-                <h1 class="document-title">{case_type}</h1>
-                <p class="document-date">Data: {current_date}</p>
-            </div>
-            <div class="document-content">
-                {str(soup)}
-            </div>
-            <div class="document-signature">
-                <div class="signature-line"></div>
-                <p class="signature-name">Advogado(a)</p>
-                <p class="signature-oab">OAB/XX XXX.XXX</p>
-            </div>
-            <div class="document-footer">
-                <p class="footer-text">Documento gerado por LexGenius</p>
-                <p class="footer-date">Data de geração: {current_date}</p>
-            </div>
-        </div>
+    async def generate_with_insights_async(self, case_type, parties, facts, legal_grounds, requests, sections=None):
+        """Draft plus analysis, legal basis and review in one concurrent pipeline.
+
+        Analysis and basis depend only on the form, so they run alongside the
+        draft; the review needs the draft and starts as soon as it is ready.
+        All calls share ``self.limiter``, so the passes never exceed the
+        process budget. Pass ``sections`` to reuse an already generated
+        (cached) draft. A failed auxiliary pass is reported as ``None``
+        instead of failing the draft.
+        """
+        fields = dict(case_type=case_type, parties=parties, facts=facts, legal_grounds=legal_grounds, requests=requests)
+
+        async def draft_and_review():
+            draft = sections if sections is not None else await self.generate_document_async(**fields)
+            review = await _optional(self.review_document_async(case_type, draft), 'review')
+            return draft, review
+
+        (draft, review), analysis, basis = await asyncio.gather(
+            draft_and_review(),
+            _optional(self.analyze_case_async(**fields), 'analysis'),
+            _optional(self.legal_basis_async(**fields), 'basis'),
+        )
+        return {'sections': draft, 'analysis': analysis, 'basis': basis, 'review': review}
+
+    def generate_with_insights(self, case_type, parties, facts, legal_grounds, requests, sections=None):
+        """Blocking wrapper of :meth:`generate_with_insights_async` running on the background loop"""
+        return self.run_async(
+            self.generate_with_insights_async(case_type, parties, facts, legal_grounds, requests, sections=sections)
+        )
+
+    async def regenerate_section_async(self, document, section, case_type, parties, facts, legal_grounds, requests,
+                                       guidance=''):
+        """Rewrite one section of ``document`` with a prompt scoped to its marker; returns the new document"""
+        prompt = self._create_section_prompt(
+            document, section, case_type, parties, facts, legal_grounds, requests, guidance
+        )
+        text = await self._generate_text_async(SECTION_TEMPLATE, prompt, 'gemini_section', case_type=case_type)
+        with stage('parse_sections'):
+            # O modelo pode devolver outras seções por engano; só a pedida é aproveitada
+            parsed = self._parse_sections(text)
+            new_text = parsed[section] if any(parsed.values()) else text.strip()
+        if not new_text:
+            raise ValueError(f"Empty {section} section in the Gemini response")
+        return document.replace(**{section: new_text})
+
+    def regenerate_section(self, document, section, case_type, parties, facts, legal_grounds, requests, guidance=''):
+        """Blocking wrapper of :meth:`regenerate_section_async` running on the background loop"""
+        return self.run_async(self.regenerate_section_async(
+            document, section, case_type, parties, facts, legal_grounds, requests, guidance=guidance
+        ))
+
+    def run_async(self, coro, timeout=None):
+        """Run a coroutine of this agent on its background event loop and wait for the result"""
+        return self.loop.run(coro, timeout)
+
+    def stream_document(self, case_type, parties, facts, legal_grounds, requests):
+        """Gera o documento em streaming, produzindo (seção, texto) à medida que cada seção termina.
+
+        Usa a rota do documento; se o modelo responder 429/503 antes do
+        primeiro pedaço, passa para o próximo modelo da cadeia (sem hedge:
+        o texto já entregue não pode ser trocado).
         """
-        return html_template 
\ No newline at end of file
+        template = document_template(case_type)
+        prompt = self._create_prompt(case_type, parties, facts, legal_grounds, requests)
+        route = self.router.route(template, case_type, document_input_tokens(parties, facts, legal_grounds, requests))
+        tiers = self.router.targets(route)
+        for position, tier in enumerate(tiers):
+            model = self.model_for(template, route.model(tier))
+            parser = SectionStreamParser()
+            received = False
+            started = time.monotonic()
+            try:
+                # A vaga fica presa durante todo o streaming; 429/503 reduzem o limite como nas outras chamadas
+                with self.limiter.slot(timeout=Config.GEMINI_TIMEOUT), stage('gemini_stream'), \
+                        metrics.span(GEMINI_SECONDS, template=template.key):
+                    response = model.generate_content(prompt, stream=True, request_options=self.request_options)
+                    for chunk in response:
+                        text = getattr(chunk, 'text', '')
+                        if text:
+                            received = True
+                            yield from parser.feed(text)
+                    yield from parser.close()
+                record_usage(response, template.key)
+                self.router.record(route, tier, time.monotonic() - started)
+                break
+            except Exception as e:
+                if is_throttle(e) and not received:
+                    self.router.throttled(route, tier)
+                    if position < len(tiers) - 1:
+                        self.logger.warning(
+                            f"Model {route.model(tier)} throttled; streaming from {route.model(tiers[position + 1])}"
+                        )
+                        continue
+                else:
+                    self.router.failed(route, tier)
+                self.logger.error(f"Error streaming document: {str(e)}")
+                raise
+        if not any(parser.sections.values()):
+            raise ValueError("Empty response from Gemini API")
+
+    def _create_prompt(self, case_type, parties, facts, legal_grounds, requests):
+        """Corpo do prompt da peça; as instruções fixas do tipo de peça vão no modelo (ver model_for)."""
+        return self._render_prompt(
+            document_template(case_type),
+            case_type=case_type, parties=parties, facts=facts, legal_grounds=legal_grounds, requests=requests,
+            references=self._references(facts, legal_grounds, requests) or '(nenhum)'
+        )
+
+    def _references(self, facts, legal_grounds, requests):
+        """Dispositivos do índice local citados no formulário ou mais relevantes para o caso."""
+        if self.citation_index is None or not Config.CITATION_TOP_K:
+            return ''
+        try:
+            with stage('citation_search'):
+                return self.citation_index.references(
+                    '\n'.join((facts, legal_grounds, requests)), k=Config.CITATION_TOP_K
+                )
+        except Exception as e:
+            # Sem o índice a peça ainda pode ser gerada, só sem os dispositivos de referência
+            self.logger.warning(f"Citation index unavailable: {str(e)}")
+            return ''
+
+    def _create_analysis_prompt(self, case_type, parties, facts, legal_grounds, requests):
+        """Prompt da análise estratégica do caso (resposta em JSON)."""
+        return self._render_prompt(
+            ANALYSIS_TEMPLATE,
+            case_type=case_type, parties=parties, facts=facts, legal_grounds=legal_grounds, requests=requests
+        )
+
+    def _create_basis_prompt(self, case_type, facts, legal_grounds, requests):
+        """Prompt do levantamento da fundamentação legal (texto puro)."""
+        return self._render_prompt(
+            BASIS_TEMPLATE, case_type=case_type, facts=facts, legal_grounds=legal_grounds, requests=requests
+        )
+
+    def _create_review_prompt(self, case_type, sections):
+        """Prompt da revisão da minuta gerada (resposta em JSON)."""
+        draft = "\n\n".join(
+            f"{marker}\n{sections[name]}" for marker, name in SECTION_MARKERS.items() if sections.get(name)
+        )
+        return self._render_prompt(REVIEW_TEMPLATE, case_type=case_type, draft=draft)
+
+    def _create_section_prompt(self, document, section, case_type, parties, facts, legal_grounds, requests, guidance):
+        """Prompt de uma seção: o campo do formulário, as seções de que ela depende e o texto atual."""
+        if section not in SECTION_CONTEXT:
+            raise ValueError(f"Section cannot be regenerated: {section}")
+        markers = {name: marker for marker, name in SECTION_MARKERS.items()}
+        fields = dict(parties=parties, facts=facts, legal_grounds=legal_grounds, requests=requests)
+        context = "\n\n".join(
+            f"{markers[name]}\n{document[name]}" for name in SECTION_CONTEXT[section] if document[name]
+        )
+        return self._render_prompt(
+            SECTION_TEMPLATE,
+            max_input_tokens=Config.SECTION_PROMPT_MAX_INPUT_TOKENS,
+            case_type=case_type,
+            marker=markers[section],
+            field=fields.get(section) or '(sem informações específicas)',
+            context=context or '(nenhuma)',
+            current=document[section] or '(vazia)',
+            guidance=guidance or 'melhore a seção, mantendo os fatos e pedidos do caso.'
+        )
+
+    def _parse_sections(self, text):
+        """Extrai as seções do texto do Gemini usando marcadores."""
+        parser = SectionStreamParser()
+        parser.feed(text)
+        parser.close()
+        return LegalDocument(**parser.sections)
+
+    def _format_document(self, document: str, case_type: str) -> str:
+        """Formata o documento gerado com HTML estruturado e limpo, títulos corretos e pedidos em lista."""
+        return format_document(document, case_type) 
\ No newline at end of file
@@ -0,0 +1,242 @@
+import re
+import unicodedata
+
+# Estimativa local: ~4 caracteres por token em português (sem chamar count_tokens)
+CHARS_PER_TOKEN = 4
+TRIM_MARKER = ' [...] '
+# Fração do orçamento de um campo cortado que fica com o início do texto
+TRIM_HEAD_RATIO = 0.7
+
+
+def estimate_tokens(text):
+    """Cheap upper bound estimate of the tokens in ``text``"""
+    return -(-len(text or '') // CHARS_PER_TOKEN)
+
+
+def trim_text(text, max_tokens):
+    """Shorten ``text`` to about ``max_tokens``, keeping its beginning and end.
+
+    The cut points are moved to word boundaries and the removed middle is
+    replaced by ``TRIM_MARKER``.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    available = max_chars - len(TRIM_MARKER)
+    if available <= 0:
+        return text[:max(max_chars, 0)]
+    head = int(available * TRIM_HEAD_RATIO)
+    tail = available - head
+    head_end = text.rfind(' ', 0, head)
+    tail_start = text.find(' ', len(text) - tail)
+    head_text = text[:head_end if head_end > 0 else head]
+    tail_text = text[tail_start if tail_start >= 0 else len(text) - tail:]
+    return head_text.rstrip() + TRIM_MARKER + tail_text.lstrip()
+
+
+def fit_fields(fields, max_tokens):
+    """Trim the largest fields until their estimated total fits ``max_tokens``.
+
+    Small fields are kept whole and the remaining budget is split evenly
+    among the larger ones. Returns the fitted fields and the names of the
+    trimmed ones.
+    """
+    sizes = {name: estimate_tokens(text) for name, text in fields.items()}
+    if sum(sizes.values()) <= max_tokens:
+        return dict(fields), []
+    fitted = {}
+    trimmed = []
+    remaining = max_tokens
+    names = sorted(sizes, key=sizes.get)
+    for index, name in enumerate(names):
+        share = remaining // (len(names) - index)
+        if sizes[name] <= share:
+            fitted[name] = fields[name]
+        else:
+            fitted[name] = trim_text(fields[name], share)
+            trimmed.append(name)
+        remaining -= estimate_tokens(fitted[name])
+    return {name: fitted[name] for name in fields}, trimmed
+
+
+def _slug(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+class PromptTemplate:
+    """Versioned prompt split into static instructions and a per request body.
+
+    ``instructions`` never depend on the request, so they are sent as the
+    model's system instruction, built once per template; ``body`` is a
+    ``str.format`` template filled with the user fields. Bump ``version``
+    whenever either text changes: it is part of the document cache key and
+    of the token metrics labels.
+    """
+
+    def __init__(self, name, version, instructions, body, variant=None):
+        self.name = name
+        self.version = version
+        self.instructions = instructions.strip()
+        self.body = body
+        self.variant = variant
+        self.key = f"{name}/{_slug(variant)}@v{version}" if variant else f"{name}@v{version}"
+
+    def render(self, max_input_tokens=None, **fields):
+        """Fill the body, trimming the fields to ``max_input_tokens``; returns ``(prompt, trimmed)``"""
+        trimmed = []
+        if max_input_tokens:
+            fields, trimmed = fit_fields(fields, max_input_tokens)
+        return self.body.format(**fields), trimmed
+
+    def __repr__(self):
+        return f'<PromptTemplate {self.key}>'
+
+
+DOCUMENT_INSTRUCTIONS = """
+Você redige peças jurídicas completas e profissionais. A cada pedido você recebe o tipo da peça e as
+informações do caso organizadas por marcadores, e deve devolver o texto de cada seção SEPARADAMENTE,
+SEM HTML, SEM formatação, apenas o texto puro de cada parte, logo abaixo do respectivo marcador
+([PARTIES], [FACTS], [LEGAL_GROUNDS], [REQUESTS], [VALUE_CAUSE], [CITY_DATE], [LAWYER_NAME], [LAWYER_OAB]).
+
+Instruções:
+- Use linguagem jurídica formal, clara, objetiva e técnica.
+- Estruture cada seção conforme a tradição forense brasileira.
+- No preâmbulo e qualificação, detalhe nomes, documentos, endereços e representações.
+- Nos fatos, conte a história com contexto, datas, valores, consequências e impacto.
+- Na fundamentação, cite doutrina, jurisprudência e artigos de lei reais e relevantes, com trechos e explicações.
+- Nos pedidos, detalhe cada um, fundamente e numere, incluindo citação, condenação, custas, honorários, protesto por provas, etc.
+- Inclua protesto por provas, valor da causa, local/data e assinatura.
+- Parágrafos devem ser numerados e justificados.
+- Não repita informações entre seções.
+- Não gere tópicos vazios ou genéricos.
+- Cada pedido deve ser completo, objetivo e em frase única.
+- O texto deve ser compatível com o padrão de grandes escritórios de advocacia.
+- Trechos marcados com [...] foram resumidos por tamanho; não invente o conteúdo omitido.
+- Os dispositivos de referência enviados com o caso são transcrições literais; prefira citá-los quando
+  pertinentes e não atribua a eles conteúdo diferente do transcrito.
+"""
+
+DOCUMENT_BODY = """
+Gere o texto de uma peça jurídica do tipo {case_type} com as seguintes informações:
+
+[PARTIES]
+{parties}
+[FACTS]
+{facts}
+[LEGAL_GROUNDS]
+{legal_grounds}
+[REQUESTS]
+{requests}
+[VALUE_CAUSE]
+(Preencha com o valor da causa, ex: 'Dá-se à causa o valor de R$ 15.000,00 (quinze mil reais).')
+[CITY_DATE]
+(Preencha com cidade e data, ex: 'São Paulo, 14 de maio de 2025.')
+[LAWYER_NAME]
+(Preencha com o nome do advogado)
+[LAWYER_OAB]
+(Preencha com o número da OAB)
+
+Dispositivos de referência (não são seções da peça):
+{references}
+"""
+
+# Orientações específicas de cada tipo de peça: (versão, instruções adicionais)
+CASE_TYPE_INSTRUCTIONS = {
+    "Petição Inicial": ('2', """
+- Observe os requisitos do art. 319 do CPC: juízo, qualificação completa, fatos, fundamentos, pedidos
+  com suas especificações, valor da causa, provas e opção pela audiência de conciliação ou mediação.
+"""),
+    "Contestação": ('2', """
+- Concentre toda a matéria de defesa (art. 336 do CPC), alegando as preliminares do art. 337 antes do mérito.
+- Impugne especificamente cada fato narrado pelo autor (art. 341 do CPC).
+"""),
+    "Recurso": ('2', """
+- Demonstre o cabimento, a tempestividade e o preparo, e identifique com precisão a decisão recorrida.
+- Formule pedido expresso de reforma ou de anulação da decisão.
+"""),
+    "Agravo": ('2', """
+- Indique a decisão agravada e a hipótese de cabimento (art. 1.015 do CPC) e relacione as peças que instruem o recurso.
+- Se for o caso, requeira efeito suspensivo ou antecipação da tutela recursal (art. 1.019, I, do CPC).
+"""),
+    "Embargos": ('2', """
+- Identifique a espécie de embargos e demonstre seus requisitos de cabimento e tempestividade.
+- Aponte com precisão o vício ou a matéria impugnada e o resultado pretendido.
+"""),
+}
+
+GENERIC_DOCUMENT_TEMPLATE = PromptTemplate('document', '2', DOCUMENT_INSTRUCTIONS, DOCUMENT_BODY)
+DOCUMENT_TEMPLATES = {
+    case_type: PromptTemplate('document', version, DOCUMENT_INSTRUCTIONS + extra, DOCUMENT_BODY, variant=case_type)
+    for case_type, (version, extra) in CASE_TYPE_INSTRUCTIONS.items()
+}
+
+ANALYSIS_TEMPLATE = PromptTemplate('analysis', '1', """
+Você analisa casos jurídicos sob a ótica de um advogado experiente, antes da redação da peça.
+Responda apenas com um objeto JSON com as chaves "pontos_fortes", "pontos_fracos", "riscos",
+"oportunidades" e "sugestoes_melhoria", cada uma com uma lista de frases curtas e objetivas.
+""", """
+Analise o caso abaixo, que será objeto de uma peça do tipo {case_type}.
+
+Partes: {parties}
+Fatos: {facts}
+Fundamentos jurídicos: {legal_grounds}
+Pedidos: {requests}
+""")
+
+BASIS_TEMPLATE = PromptTemplate('basis', '1', """
+Você levanta a fundamentação legal de peças jurídicas. Para cada item, indique o dispositivo legal,
+súmula ou precedente real e relevante e explique em uma ou duas frases por que se aplica ao caso.
+Responda em texto puro, SEM HTML e SEM markdown, um item por linha.
+""", """
+Liste a fundamentação legal aplicável a uma peça do tipo {case_type} com os fatos, fundamentos e pedidos abaixo.
+
+Fatos: {facts}
+Fundamentos jurídicos: {legal_grounds}
+Pedidos: {requests}
+""")
+
+REVIEW_TEMPLATE = PromptTemplate('review', '1', """
+Você revisa minutas jurídicas como um revisor jurídico sênior.
+Responda apenas com um objeto JSON com as chaves "estrutura", "clareza" e "coerencia" (um parágrafo de
+avaliação cada) e "sugestoes_melhoria" (lista de frases curtas e objetivas).
+""", """
+Revise a minuta de {case_type} abaixo.
+
+{draft}
+""")
+
+SECTION_TEMPLATE = PromptTemplate('section', '1', """
+Você reescreve uma única seção de uma peça jurídica já redigida, mantendo-a coerente com as demais.
+Siga as mesmas regras da peça: linguagem jurídica formal, clara e técnica, parágrafos numerados,
+doutrina, jurisprudência e artigos de lei reais e relevantes. Responda apenas com o marcador da seção
+pedida seguido do novo texto, SEM HTML e SEM formatação, sem repetir as outras seções.
+Trechos marcados com [...] foram resumidos por tamanho; não invente o conteúdo omitido.
+""", """
+Reescreva a seção {marker} de uma peça do tipo {case_type}.
+
+Informações do caso para esta seção:
+{field}
+
+Seções já redigidas com que a nova seção deve ser coerente:
+{context}
+
+Texto atual da seção:
+{current}
+
+Orientação do advogado: {guidance}
+""")
+
+# Seções que podem ser refeitas sozinhas e as seções da minuta enviadas como contexto de cada uma
+SECTION_CONTEXT = {
+    'parties': (),
+    'facts': ('parties',),
+    'legal_grounds': ('facts',),
+    'requests': ('facts', 'legal_grounds'),
+    'value_cause': ('requests',),
+}
+
+
+def document_template(case_type):
+    """Prompt template of the main document for ``case_type`` (generic for unknown types)"""
+    return DOCUMENT_TEMPLATES.get(case_type, GENERIC_DOCUMENT_TEMPLATE)
@@ -0,0 +1,251 @@
+"""Model routing, fallback on throttling and hedged requests.
+
+Every model call goes through a *route*: the prompt template plus a tier
+(``fast``, ``default`` or ``strong``) chosen from the template, the case
+type and the estimated input size (the user's fields for documents, see
+:func:`document_input_tokens`, the whole prompt for the other passes). A route's chain is its tier followed
+by the fallback tiers; a model that answered 429/503 is skipped for
+``throttle_cooldown`` seconds while another model of the chain is free.
+
+Each route and tier keeps a window of recent latencies. Once the window
+holds ``hedge_min_samples`` calls, a call still running after the
+``hedge_percentile`` latency gets a duplicate request and the first answer
+wins (see ``GeminiAgent._call_hedged``). At most ``hedge_max_ratio`` of the
+calls in the window are hedged, so a slow upstream never doubles the load.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from utils.metrics import metrics
+from .prompts import estimate_tokens
+
+MODEL_ROUTE_SECONDS = metrics.histogram(
+    'lexgenius_model_route_seconds', 'Latency of answered model calls by route, hedges included', ['route', 'model']
+)
+MODEL_HEDGES = metrics.counter(
+    'lexgenius_model_hedges_total', 'Hedged model requests by route and result (sent, won)', ['route', 'result']
+)
+MODEL_THROTTLED = metrics.counter(
+    'lexgenius_model_throttled_total', 'Model calls throttled (429/503) by route and model', ['route', 'model']
+)
+
+
+def document_input_tokens(parties, facts, legal_grounds, requests):
+    """Estimated size of a document request, as routed; depends only on the form so it can key the cache"""
+    return estimate_tokens('\n'.join(field or '' for field in (parties, facts, legal_grounds, requests)))
+
+
+class RouteStats:
+    """Recent latencies and counters of one route tier; thread safe"""
+
+    def __init__(self, window=200):
+        # (segundos, com hedge) das últimas chamadas respondidas
+        self._window = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds, hedged=False, hedge_won=False):
+        with self._lock:
+            self._window.append((seconds, hedged))
+            self.calls += 1
+            self.hedges += hedged
+            self.hedge_wins += hedge_won
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def percentile(self, fraction, min_samples=1):
+        """Latency below which ``fraction`` of the recent calls answered, or None with too few samples"""
+        with self._lock:
+            samples = sorted(seconds for seconds, _ in self._window)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))]
+
+    def hedge_ratio(self):
+        with self._lock:
+            return sum(hedged for _, hedged in self._window) / len(self._window) if self._window else 0.0
+
+    def as_dict(self):
+        with self._lock:
+            counters = {
+                'calls': self.calls, 'errors': self.errors, 'throttled': self.throttled,
+                'hedges': self.hedges, 'hedge_wins': self.hedge_wins, 'samples': len(self._window),
+            }
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            value = self.percentile(fraction)
+            counters[f'{name}_ms'] = round(value * 1000, 1) if value is not None else None
+        return counters
+
+
+class Route:
+    """Where one call goes: the template, the chosen tier and the tiers to fall back to, in order"""
+
+    __slots__ = ('name', 'tier', 'chain', 'models')
+
+    def __init__(self, name, tier, chain, models):
+        self.name = name
+        self.tier = tier
+        self.chain = chain
+        self.models = models
+
+    def model(self, tier):
+        return self.models[tier]
+
+    def label(self, tier):
+        return f'{self.name}:{tier}'
+
+    def __repr__(self):
+        return f'<Route {self.label(self.tier)} chain={self.chain}>'
+
+
+class ModelRouter:
+    """Pick the model of each call, track route latencies and decide when to hedge.
+
+    ``models`` maps tiers to model names (tiers without a model are left
+    out); ``template_tiers`` pins a tier per template name (e.g. the
+    auxiliary passes on ``fast``). Documents of ``strong_case_types`` or
+    with at least ``strong_min_input_tokens`` go to ``strong``, those with
+    at most ``fast_max_input_tokens`` to ``fast``. With ``routing`` off
+    every call starts on ``default`` and only the fallbacks apply.
+    """
+
+    def __init__(self, models, fallbacks=None, template_tiers=None, strong_case_types=(),
+                 fast_max_input_tokens=0, strong_min_input_tokens=0, routing=True, hedging=True,
+                 hedge_percentile=0.95, hedge_min_samples=20, hedge_min_delay=0.5, hedge_max_ratio=0.1,
+                 throttle_cooldown=30.0, window=200):
+        self.models = {tier: name for tier, name in models.items() if name}
+        if 'default' not in self.models:
+            raise ValueError("ModelRouter needs a default model")
+        self.fallbacks = fallbacks or {}
+        self.template_tiers = template_tiers or {}
+        self.strong_case_types = frozenset(strong_case_types)
+        self.fast_max_input_tokens = fast_max_input_tokens
+        self.strong_min_input_tokens = strong_min_input_tokens
+        self.routing = routing
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.throttle_cooldown = throttle_cooldown
+        self.window = window
+        self._stats = {}
+        self._cooling = {}
+        self._lock = threading.Lock()
+
+    def tier_for(self, template, case_type=None, input_tokens=0):
+        if not self.routing:
+            return 'default'
+        tier = self.template_tiers.get(template.name)
+        if tier is None:
+            if case_type in self.strong_case_types or (
+                    self.strong_min_input_tokens and input_tokens >= self.strong_min_input_tokens):
+                tier = 'strong'
+            elif self.fast_max_input_tokens and input_tokens <= self.fast_max_input_tokens:
+                tier = 'fast'
+            else:
+                tier = 'default'
+        return tier if tier in self.models else 'default'
+
+    def first_model(self, template, case_type=None, input_tokens=0):
+        """Model a call is routed to before any fallback (part of the document cache key)"""
+        return self.models[self.tier_for(template, case_type, input_tokens)]
+
+    def route(self, template, case_type=None, input_tokens=0):
+        """Route of a call; ``input_tokens`` is the estimated size of its input"""
+        tier = self.tier_for(template, case_type, input_tokens)
+        chain = []
+        seen = set()
+        # Níveis com o mesmo modelo não entram duas vezes na cadeia
+        for candidate in (tier,) + tuple(self.fallbacks.get(tier, ())):
+            model = self.models.get(candidate)
+            if model is not None and model not in seen:
+                seen.add(model)
+                chain.append(candidate)
+        return Route(template.name, tier, tuple(chain), self.models)
+
+    def targets(self, route):
+        """Tiers of ``route`` to try in order: models still cooling down after a throttle go last"""
+        now = time.monotonic()
+        with self._lock:
+            cooling = {tier for tier in route.chain if self._cooling.get(route.model(tier), 0) > now}
+        return [tier for tier in route.chain if tier not in cooling] + [tier for tier in route.chain if tier in cooling]
+
+    def stats_for(self, route, tier):
+        label = route.label(tier)
+        stats = self._stats.get(label)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(label, RouteStats(self.window))
+        return stats
+
+    def hedge_delay(self, route, tier):
+        """Seconds to wait before hedging a call on ``tier``, or None when it should not be hedged"""
+        if not self.hedging:
+            return None
+        stats = self.stats_for(route, tier)
+        threshold = stats.percentile(self.hedge_percentile, self.hedge_min_samples)
+        if threshold is None or stats.hedge_ratio() >= self.hedge_max_ratio:
+            return None
+        return max(threshold, self.hedge_min_delay)
+
+    def record(self, route, tier, seconds, hedged=False, hedge_won=False):
+        self.stats_for(route, tier).record(seconds, hedged, hedge_won)
+        MODEL_ROUTE_SECONDS.observe(seconds, route=route.label(tier), model=route.model(tier))
+        if hedged:
+            MODEL_HEDGES.inc(route=route.label(tier), result='sent')
+        if hedge_won:
+            MODEL_HEDGES.inc(route=route.label(tier), result='won')
+
+    def failed(self, route, tier):
+        self.stats_for(route, tier).count('errors')
+
+    def throttled(self, route, tier):
+        """Take the model of ``tier`` out of the chains for ``throttle_cooldown`` seconds"""
+        model = route.model(tier)
+        with self._lock:
+            self._cooling[model] = time.monotonic() + self.throttle_cooldown
+        self.stats_for(route, tier).count('throttled')
+        MODEL_THROTTLED.inc(route=route.label(tier), model=model)
+
+    def stats(self):
+        """Latency percentiles, counters, model and current hedge delay of every route used so far"""
+        with self._lock:
+            items = sorted(self._stats.items())
+        result = {}
+        for label, stats in items:
+            name, tier = label.rsplit(':', 1)
+            route = Route(name, tier, (tier,), self.models)
+            delay = self.hedge_delay(route, tier)
+            result[label] = dict(
+                stats.as_dict(), model=self.models[tier],
+                hedge_delay_ms=round(delay * 1000, 1) if delay is not None else None
+            )
+        return result
+
+
+def create_model_router(config):
+    return ModelRouter(
+        {'fast': config.GEMINI_FAST_MODEL, 'default': config.GEMINI_MODEL, 'strong': config.GEMINI_STRONG_MODEL},
+        fallbacks=config.MODEL_FALLBACKS,
+        template_tiers=config.MODEL_TEMPLATE_TIERS,
+        strong_case_types=config.MODEL_STRONG_CASE_TYPES,
+        fast_max_input_tokens=config.MODEL_FAST_MAX_INPUT_TOKENS,
+        strong_min_input_tokens=config.MODEL_STRONG_MIN_INPUT_TOKENS,
+        routing=config.MODEL_ROUTING,
+        hedging=config.MODEL_HEDGING,
+        hedge_percentile=config.MODEL_HEDGE_PERCENTILE,
+        hedge_min_samples=config.MODEL_HEDGE_MIN_SAMPLES,
+        hedge_min_delay=config.MODEL_HEDGE_MIN_DELAY,
+        hedge_max_ratio=config.MODEL_HEDGE_MAX_RATIO,
+        throttle_cooldown=config.MODEL_THROTTLE_COOLDOWN,
+        window=config.MODEL_LATENCY_WINDOW,
+    )
@@ -0,0 +1,258 @@
+"""Deterministic stand-in for the Gemini API, for benchmarks and offline runs.
+
+The same prompt always yields the same marker formatted answer, so cache
+and formatter behaviour is reproducible; latency and transient errors are
+simulated with configurable rates, and ``tail_rate`` of the answers take
+``tail_factor`` times longer, like the stragglers of a real upstream. The
+stub runs in-process or as a small HTTP server shared by several app
+workers:
+
+    python -m agents.stub --port 8089 --latency 1.5 --error-rate 0.02 --tail-rate 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .document import SECTION_MARKERS
+from .prompts import estimate_tokens
+
+PARAGRAPHS = [
+    "Em {date}, as partes celebraram contrato de prestação de serviços no valor de R$ {value},00, com vigência de {months} meses.",
+    "A parte ré deixou de cumprir a obrigação assumida na cláusula {clause}ª, o que causou prejuízos materiais e morais à parte autora.",
+    "Foram enviadas {count} notificações extrajudiciais, todas sem resposta, conforme documentos anexos.",
+    "Nos termos do art. {article} do Código Civil, aquele que, por ação ou omissão voluntária, causar dano a outrem, fica obrigado a repará-lo.",
+    "A jurisprudência do Superior Tribunal de Justiça é pacífica no sentido de que o inadimplemento contratual gera o dever de indenizar (REsp {resp}/SP).",
+    "Aplica-se ao caso o Código de Defesa do Consumidor, em especial o art. {cdc}, diante da evidente relação de consumo entre as partes.",
+    "O dano moral, na hipótese, é presumido, dispensando prova específica do abalo sofrido, conforme entendimento consolidado.",
+    "Requer-se a inversão do ônus da prova, nos termos do art. 6º, VIII, do CDC, ante a hipossuficiência técnica da parte autora.",
+]
+REQUESTS = [
+    "A citação da parte ré para, querendo, apresentar resposta no prazo legal, sob pena de revelia.",
+    "A condenação da parte ré ao pagamento de indenização por danos materiais no valor de R$ {value},00.",
+    "A condenação da parte ré ao pagamento de indenização por danos morais em valor a ser arbitrado por Vossa Excelência.",
+    "A condenação da parte ré ao pagamento das custas processuais e dos honorários advocatícios, fixados em 20% do valor da condenação.",
+    "A produção de todas as provas admitidas em direito, especialmente a documental, a testemunhal e a pericial.",
+]
+JSON_KEYS = {
+    'analysis': ('pontos_fortes', 'pontos_fracos', 'riscos', 'oportunidades', 'sugestoes_melhoria'),
+    'review': ('estrutura', 'clareza', 'coerencia', 'sugestoes_melhoria'),
+}
+
+
+def _rng(template, prompt, seed):
+    digest = hashlib.sha256(f'{seed}:{template}:{prompt}'.encode('utf-8')).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def _sentence(rng, choices):
+    return rng.choice(choices).format(
+        date=f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/20{rng.randint(18, 24)}",
+        value=f"{rng.randint(1, 99)}.{rng.randint(0, 999):03d}",
+        months=rng.randint(6, 36), clause=rng.randint(2, 15), count=rng.randint(2, 5),
+        article=rng.choice((186, 389, 402, 927)), resp=f"{rng.randint(1, 2)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}",
+        cdc=rng.choice((14, 18, 20, 42)),
+    )
+
+
+def stub_text(template, prompt, seed=0, paragraphs=4):
+    """Deterministic answer for ``prompt`` in the format expected by the ``template`` key"""
+    rng = _rng(template, prompt, seed)
+    name = template.split('/')[0].split('@')[0]
+    if name in JSON_KEYS:
+        return json.dumps({
+            key: [_sentence(rng, PARAGRAPHS) for _ in range(rng.randint(2, 4))] if key == 'sugestoes_melhoria' or name == 'analysis'
+            else _sentence(rng, PARAGRAPHS)
+            for key in JSON_KEYS[name]
+        }, ensure_ascii=False)
+    if name == 'basis':
+        return '\n'.join(_sentence(rng, PARAGRAPHS[3:]) for _ in range(paragraphs))
+
+    count = max(1, paragraphs + rng.randint(-1, 2))
+    sections = {
+        'parties': "FULANO DE TAL, brasileiro, casado, empresário, portador do CPF nº 123.456.789-00, residente em São Paulo/SP, "
+                   "vem propor a presente ação em face de EMPRESA EXEMPLO LTDA., inscrita no CNPJ nº 12.345.678/0001-90.",
+        'facts': '\n'.join(_sentence(rng, PARAGRAPHS[:3] + PARAGRAPHS[6:]) for _ in range(count)),
+        'legal_grounds': '\n'.join(_sentence(rng, PARAGRAPHS[3:]) for _ in range(count)),
+        'requests': '\n'.join(_sentence(rng, REQUESTS) for _ in range(len(REQUESTS))),
+        'value_cause': f"Dá-se à causa o valor de R$ {rng.randint(5, 200)}.000,00.",
+        'city_date': f"São Paulo, {rng.randint(1, 28)} de maio de 2025.",
+        'lawyer_name': "Advogado Exemplo",
+        'lawyer_oab': f"OAB/SP {rng.randint(100000, 499999)}",
+    }
+    return '\n'.join(f"{marker}\n{sections[name]}" for marker, name in SECTION_MARKERS.items())
+
+
+class StubError(Exception):
+    """Simulated transient failure (used when ``google.api_core`` is not installed)"""
+
+
+def _transient_error(code, message):
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return StubError(message)
+    return exceptions.from_http_status(code, message)
+
+
+class _Usage:
+    __slots__ = ('prompt_token_count', 'candidates_token_count', 'cached_content_token_count')
+
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = completion_tokens
+        self.cached_content_token_count = 0
+
+
+class _Chunk:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubResponse:
+    """Mimics the parts of ``GenerateContentResponse`` used by the agent; iterates as a stream"""
+
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage_metadata = usage
+
+    def __iter__(self):
+        for start in range(0, len(self.text), 64):
+            yield _Chunk(self.text[start:start + 64])
+
+
+class StubEngine:
+    """Answers prompts with simulated latency, tail latency and error rate; thread safe"""
+
+    def __init__(self, latency=0.0, jitter=0.5, error_rate=0.0, seed=0, paragraphs=4, tail_rate=0.0, tail_factor=10.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.seed = seed
+        self.paragraphs = paragraphs
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            delay = self.latency * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+            if self._random.random() < self.tail_rate:
+                delay *= self.tail_factor
+        return failed, max(delay, 0.0)
+
+    def answer(self, template, instructions, prompt):
+        """Return ``(status, text, usage)`` after the simulated delay; status 503 for a simulated failure"""
+        failed, delay = self._draw()
+        time.sleep(delay)
+        if failed:
+            return 503, 'Stub: simulated overload', None
+        text = stub_text(template, prompt, self.seed, self.paragraphs)
+        return 200, text, _Usage(estimate_tokens(instructions) + estimate_tokens(prompt), estimate_tokens(text))
+
+
+class StubModel:
+    """Drop-in for ``genai.GenerativeModel`` bound to one prompt template.
+
+    Answers come from a local :class:`StubEngine` or, when ``url`` is set,
+    from a stub server started with ``python -m agents.stub``.
+    """
+
+    def __init__(self, template, engine=None, url=None, timeout=30):
+        self.template = template
+        self.engine = engine or StubEngine()
+        self.url = url.rstrip('/') if url else None
+        self.timeout = timeout
+
+    def _answer(self, prompt):
+        if self.url is None:
+            return self.engine.answer(self.template.key, self.template.instructions, prompt)
+        body = json.dumps({
+            'template': self.template.key, 'instructions': self.template.instructions, 'prompt': prompt
+        }).encode('utf-8')
+        request = urllib.request.Request(f'{self.url}/generate', data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace'), None
+        return 200, payload['text'], _Usage(**payload['usage'])
+
+    def generate_content(self, prompt, stream=False, generation_config=None, request_options=None):
+        status, text, usage = self._answer(prompt)
+        if status != 200:
+            raise _transient_error(status, text)
+        return StubResponse(text, usage)
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None):
+        return await asyncio.to_thread(self.generate_content, prompt, False, generation_config, request_options)
+
+
+def make_handler(engine):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/generate':
+                self.send_error(404)
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            status, text, usage = engine.answer(payload['template'], payload.get('instructions', ''), payload['prompt'])
+            if status == 200:
+                body = json.dumps({'text': text, 'usage': {
+                    'prompt_tokens': usage.prompt_token_count, 'completion_tokens': usage.candidates_token_count
+                }}, ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                body = text.encode('utf-8')
+                content_type = 'text/plain; charset=utf-8'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve(host='127.0.0.1', port=8089, **engine_options):
+    server = ThreadingHTTPServer((host, port), make_handler(StubEngine(**engine_options)))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=1.0, help='mean seconds per answer')
+    parser.add_argument('--jitter', type=float, default=0.5, help='latency spread, as a fraction of the mean')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of answers failing with 503')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='fraction of answers hitting the slow tail')
+    parser.add_argument('--tail-factor', type=float, default=10.0, help='latency multiplier of the slow tail')
+    parser.add_argument('--paragraphs', type=int, default=4, help='paragraphs per generated section')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate, seed=args.seed, paragraphs=args.paragraphs,
+                   tail_rate=args.tail_rate, tail_factor=args.tail_factor)
+    print(f"Stub Gemini em http://{args.host}:{args.port}/generate (Ctrl+C para sair)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
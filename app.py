@@ -1,79 +1,78 @@
-from flask import Flask, request, render_template, send_file, flash, redirect, url_for, session, jsonify, make_response
-from dotenv import load_dotenv
+from flask import Flask, Blueprint, current_app, g, request, render_template, send_file, flash, redirect, url_for, session, jsonify, make_response, Response, stream_with_context, copy_current_request_context
 import os
-import google.generativeai as genai
-import pdfkit
-import tempfile
 import logging
 from datetime import datetime, timedelta
 from functools import wraps
 import secrets
-from pytz import timezone
-import re
+import hmac
 import json
+import itertools
+import time
+import click
+import threading
+import sqlite3
+from functools import partial
 from config import Config
-from agents.gemini_agent import GeminiAgent
-from utils.cache_manager import init_cache, cache_document, get_cached_document, clear_document_cache, limiter, CacheManager
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from agents.document import LegalDocument
+from agents.prompts import SECTION_CONTEXT
+from utils.cache_manager import init_cache, cache_document, get_cached_document, limiter, login_throttle, cache_manager
+from utils.job_queue import QueueFullError, JOB_QUEUED, JOB_DONE
+from utils.services import Services
+from utils.metrics import configure as configure_metrics, stage, REQUEST_SECONDS
+from utils.http_cache import compress_response, etag_for
+from utils.logging_setup import configure_logging, start_request as start_request_log, end_request as end_request_log, fingerprint
+from utils.validation import create_generation_schema, GENERATION_FIELDS
+from utils.docx_export import DOCX_MIMETYPE
+from utils.batch import read_rows, detect_format, limit_rows, run_batch, stream_zip, BatchFormatError
+from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask_limiter.util import get_remote_address
 
-# Configuração de logging
-logging.basicConfig(
-    level=getattr(logging, Config.LOG_LEVEL),
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
-
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))  # Usa SECRET_KEY do .env ou gera uma nova
-load_dotenv()
-app.config.from_object(Config)
-
-# Configurações de segurança
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)  # Sessão expira em 1 hora
-app.config['SESSION_COOKIE_SECURE'] = True  # Cookie só é enviado via HTTPS
-app.config['SESSION_COOKIE_HTTPONLY'] = True  # Previne acesso via JavaScript
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Proteção contra CSRF
+# Rotas, hooks e comandos; registrados na aplicação por create_app()
+bp = Blueprint('main', __name__, cli_group=None)
 
 # Credenciais padrão
 DEFAULT_USERNAME = "admin"
 DEFAULT_PASSWORD = "admin123"
 
-# Configurações de validação
-MIN_TEXT_LENGTH = 50
-MAX_TEXT_LENGTH = 5000
-ALLOWED_CASE_TYPES = [
-    "Petição Inicial",
-    "Contestação",
-    "Recurso",
-    "Agravo",
-    "Embargos"
-]
-
-# Gemini API setup
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY não encontrada no arquivo .env")
-
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
-
-# Configuração do pdfkit
-pdfkit_config = pdfkit.configuration(wkhtmltopdf=Config.PDFKIT_PATH)
+# Schema de validação do formulário (limites do Config), compilado uma vez e servido ao navegador
+generation_schema = create_generation_schema(Config)
 
-# Inicializa o cache e rate limiter
-init_cache(app)
+# Agente Gemini, renderizador de PDF, PDFs gerados, fila de jobs e CSS de impressão:
+# criados no primeiro uso e compartilhados pelo processo (MODEL_BACKEND=stub dispensa a GEMINI_API_KEY)
+services = Services(Config)
 
-# Inicializa o agente Gemini
-gemini_agent = GeminiAgent()
+# Métricas: spans por etapa, tokens, cache e rate limiter, expostos em /metrics
+metrics = configure_metrics(Config)
+metrics.gauge_callback(
+    'lexgenius_document_cache_hit_ratio', 'Hit ratio of the generated document cache',
+    lambda: cache_manager.document_cache_stats()['hit_ratio']
+)
+metrics.gauge_callback(
+    'lexgenius_document_cache_lookups', 'Document cache lookups by result',
+    lambda: {k: v for k, v in cache_manager.document_cache_stats().items() if k in ('memory_hits', 'disk_hits', 'misses')},
+    labelname='result'
+)
+metrics.gauge_callback(
+    'lexgenius_gemini_concurrency', 'Adaptive Gemini concurrency limiter state',
+    lambda: services.gemini_agent.limiter.stats() if services.ready('gemini_agent') else {}, labelname='field'
+)
+metrics.gauge_callback(
+    'lexgenius_model_hedge_delay_seconds', 'Current hedge delay of each model route (routes still learning are left out)',
+    lambda: {
+        route: stats['hedge_delay_ms'] / 1000 for route, stats in services.gemini_agent.router.stats().items()
+        if stats['hedge_delay_ms'] is not None
+    } if services.ready('gemini_agent') else {},
+    labelname='route'
+)
+metrics.gauge_callback(
+    'lexgenius_pdf_render', 'PDF renderer counters and timings',
+    lambda: services.pdf_renderer.stats.as_dict() if services.ready('pdf_renderer') else {}, labelname='field'
+)
 
 # Configuração do Login Manager
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 
 # Classe de usuário para o Flask-Login
 class User(UserMixin):
@@ -82,335 +81,815 @@ class User(UserMixin):
         self.username = username
         self.password_hash = password_hash
 
-# Simulação de banco de dados de usuários (em produção, use um banco de dados real)
-users = {
-    'admin': User('1', 'admin', generate_password_hash('admin123'))
-}
+# Simulação de banco de dados de usuários (em produção, use um banco de dados real);
+# o hash da senha (~150 ms) é calculado uma única vez, no primeiro uso, e não na importação
+_users = None
+_users_lock = threading.Lock()
+
+def get_users():
+    global _users
+    if _users is None:
+        with _users_lock:
+            if _users is None:
+                _users = {
+                    'admin': User('1', 'admin', generate_password_hash('admin123'))
+                }
+    return _users
+
+access_logger = logging.getLogger('lexgenius.access')
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_id = start_request_log(request.headers.get('X-Request-ID'), Config.LOG_SAMPLE_RATE)
+    g.request_sampled = metrics.start_request()
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def record_request_metrics(response):
+    # Rejeições do rate limiter acontecem antes de start_request_metrics
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    if g.request_sampled:
+        REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or '', status=response.status_code)
+    response.headers['X-Request-ID'] = g.request_id
+    # Registro de acesso estruturado: sem cabeçalhos nem corpo, só metadados e tempos das etapas
+    timings = metrics.stage_timings()
+    access_logger.info('request', extra={
+        'method': request.method,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+        'stages_ms': {name: round(seconds * 1000, 1) for name, seconds in timings.items()} if timings else None,
+    })
+    return response
+
+@bp.after_app_request
+def compress_and_cache(response):
+    # Arquivos estáticos: cache imutável quando a URL traz o hash atual, compressão feita uma vez
+    if request.endpoint == 'static':
+        return services.static_assets.finalize(
+            response, request.view_args['filename'], request.args.get('v'), request.accept_encodings
+        )
+    return compress_response(
+        response, request.accept_encodings, min_size=Config.COMPRESSION_MIN_SIZE, level=Config.COMPRESSION_LEVEL
+    )
+
+@bp.app_url_defaults
+def add_static_fingerprint(endpoint, values):
+    """url_for('static', ...) ganha ?v=<hash do conteúdo>; o arquivo mudou, a URL muda"""
+    if endpoint == 'static' and 'v' not in values:
+        version = services.static_assets.fingerprint(values.get('filename', ''))
+        if version:
+            values['v'] = version
+
+@bp.teardown_app_request
+def clear_request_log_context(exc):
+    end_request_log()
 
 @login_manager.user_loader
 def load_user(user_id):
-    for user in users.values():
+    for user in get_users().values():
         if user.id == user_id:
             return user
     return None
 
 # Context processor para disponibilizar Config em todos os templates
-@app.context_processor
+@bp.app_context_processor
 def inject_config():
     return dict(Config=Config)
 
-# Função para obter data/hora atual com timezone
-def get_current_time():
-    return datetime.now(timezone('America/Sao_Paulo'))
-
 # Decorator para verificar se o usuário está logado
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
             flash('Por favor, faça login para acessar esta página.', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
-# Decorator para limitar tentativas de login
+# Decorator para limitar tentativas de login (contador no storage do rate limiter,
+# compartilhado entre workers e fora do alcance do cliente); a tentativa é contada
+# antes de conferir a senha, então requisições simultâneas não passam do limite
 def login_attempts(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'login_attempts' not in session:
-            session['login_attempts'] = 0
-            session['last_attempt'] = get_current_time().isoformat()
-        
-        last_attempt = datetime.fromisoformat(session['last_attempt'])
-        current_time = get_current_time()
-        
-        # Reset tentativas após 15 minutos
-        if (current_time - last_attempt) > timedelta(minutes=15):
-            session['login_attempts'] = 0
-        
-        if session['login_attempts'] >= 3:
+        if request.method == 'POST' and not login_throttle.attempt(get_remote_address()):
             flash('Muitas tentativas de login. Tente novamente em 15 minutos.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 @login_attempts
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         
-        session['last_attempt'] = get_current_time().isoformat()
-        session['login_attempts'] = session.get('login_attempts', 0) + 1
-        
-        user = users.get(username)
+        user = get_users().get(username)
         if user and check_password_hash(user.password_hash, password):
             login_user(user)
-            session['login_attempts'] = 0  # Reset tentativas após login bem-sucedido
+            login_throttle.reset(get_remote_address())  # Reset tentativas após login bem-sucedido
             session.permanent = True  # Mantém a sessão por 1 hora
             flash('Login realizado com sucesso!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Usuário ou senha incorretos.', 'error')
-            logging.warning(f'Tentativa de login falhou para usuário: {username}')
+            logging.warning(f'Tentativa de login falhou para usuário: {fingerprint(username)}')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('Você foi desconectado.', 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
-    return render_template('index.html')
+    return render_template('index.html', validation_schema=generation_schema.as_json())
 
-def validate_text(text, field_name):
-    """Valida o texto de entrada"""
-    if not text or not isinstance(text, str):
-        return False, f"O campo {field_name} não pode estar vazio"
-    
-    text = text.strip()
-    
-    # Validação específica para o campo parties
-    if field_name == 'parties':
-        if len(text) < 50:
-            return False, "O campo Partes Envolvidas deve ter pelo menos 50 caracteres. Descreva detalhadamente as partes envolvidas no processo."
-    
-    # Validação geral para outros campos
-    if len(text) < Config.MIN_TEXT_LENGTH:
-        return False, f"O campo {field_name} deve ter pelo menos {Config.MIN_TEXT_LENGTH} caracteres"
-    if len(text) > Config.MAX_TEXT_LENGTH:
-        return False, f"O campo {field_name} não pode ter mais que {Config.MAX_TEXT_LENGTH} caracteres"
-    
-    # Verifica caracteres especiais ou scripts maliciosos
-    if re.search(r'<script|javascript:|on\w+\s*=', text, re.IGNORECASE):
-        return False, f"O campo {field_name} contém caracteres não permitidos"
-    
-    return True, text
-
-def validate_case_type(case_type):
-    """Valida o tipo de peça"""
-    if case_type not in Config.ALLOWED_CASE_TYPES:
-        return False, "Tipo de peça inválido"
-    return True, case_type
-
-def sanitize_html(html_content):
-    """Sanitiza o conteúdo HTML"""
-    # Remove scripts e eventos
-    html_content = re.sub(r'<script.*?</script>', '', html_content, flags=re.DOTALL)
-    html_content = re.sub(r'on\w+\s*=\s*"[^"]*"', '', html_content)
-    
-    # Mantém apenas tags HTML seguras
-    allowed_tags = ['div', 'h1', 'h2', 'p', 'br', 'strong', 'em', 'ul', 'li', 'ol']
-    pattern = f'<(?!/?(?:{"|".join(allowed_tags)})\\b)[^>]*>'
-    html_content = re.sub(pattern, '', html_content)
-    
-    return html_content
+def validate_generation_form(form):
+    """Valida todos os campos numa passada; retorna (campos, None) ou (None, mensagem com todos os erros)"""
+    fields, errors = generation_schema.validate(form)
+    if errors:
+        return None, generation_schema.summary(errors)
+    return fields, None
 
-@app.route('/validate', methods=['POST'])
+@bp.route('/validate', methods=['POST'])
 @login_required
 @limiter.limit("30 per minute")
 def validate_form():
-    """Endpoint para validação do formulário via AJAX"""
+    """Validação do formulário para clientes da API; a página valida no navegador com o mesmo schema"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'valid': False, 'message': 'Dados inválidos', 'errors': {}})
+    _, errors = generation_schema.validate(data)
+    if errors:
+        return jsonify({'valid': False, 'message': generation_schema.summary(errors), 'errors': errors})
+    return jsonify({'valid': True, 'errors': {}})
+
+@bp.route('/validation-schema')
+@limiter.exempt
+def validation_schema():
+    """Schema de validação do formulário, para checar os campos no navegador sem ida ao servidor"""
+    response = jsonify(generation_schema.as_json())
+    response.set_etag(generation_schema.version)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def get_document_sections(fields):
+    """Retorna o LegalDocument, do cache ou gerado pelo agente Gemini"""
+    with stage('cache_lookup'):
+        sections = get_cached_document(**fields)
+    if sections is None:
+        sections = services.gemini_agent.generate_document(**fields)
+        cache_document(document=sections, **fields)
+    else:
+        logging.info("Documento recuperado do cache")
+    return sections
+
+def get_document_insights(fields):
+    """Minuta mais análise, fundamentação e revisão, do cache ou geradas em paralelo"""
+    with stage('cache_lookup'):
+        sections = get_cached_document(**fields)
+        insights = cache_manager.get_cached_insights(**fields)
+    if sections is not None and insights is not None:
+        logging.info("Documento e análises recuperados do cache")
+        return {'sections': sections, **insights}
+
+    result = services.gemini_agent.generate_with_insights(sections=sections, **fields)
+    if sections is None:
+        cache_document(document=result['sections'], **fields)
+    insights = {name: result[name] for name in ('analysis', 'basis', 'review')}
+    # Passes que falharam ficam fora do cache para serem refeitos na próxima vez
+    if all(value is not None for value in insights.values()):
+        cache_manager.cache_insights(insights=insights, **fields)
+    return result
+
+def wants_json():
+    """True quando o cliente pede JSON (Accept: application/json) em vez da página de preview"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+COURT_HEADER = "EXCELENTÍSSIMO(A) SENHOR(A) DOUTOR(A) JUIZ(A) DE DIREITO DA ____ª VARA CÍVEL DA COMARCA DE SÃO PAULO – SP"
+
+def build_preview_context(case_type, document, generation_date=None):
+    """Prepara as variáveis do template _legal_document.html a partir do LegalDocument"""
+    return dict(
+        case_type=case_type.upper(),
+        court_header=COURT_HEADER,
+        # Fragmentos HTML renderizados uma vez e guardados no próprio documento
+        parties=document.parties_html,
+        facts=document.facts_html,
+        legal_grounds=document.legal_grounds_html,
+        requests=document.requests_html,
+        value_cause=document.value_cause,
+        city_date=document.city_date,
+        lawyer_name=document.lawyer_name,
+        lawyer_oab=document.lawyer_oab,
+        generation_date=generation_date or datetime.now().strftime('%d de %B de %Y')
+    )
+
+def render_document(case_type, document, generation_date=None):
+    """Contexto dos templates com o corpo do documento já renderizado.
+
+    O corpo é renderizado uma única vez por documento (e data) e reaproveitado
+    pelo preview e pelo HTML do PDF.
+    """
+    context = build_preview_context(case_type, document, generation_date)
+    with stage('render_template'):
+        context['document_body'] = document.body(
+            (context['case_type'], context['generation_date']),
+            lambda: render_template('_legal_document.html', **context)
+        )
+    context['citations'] = check_citations(document)
+    return context
+
+def check_citations(document):
+    """Citações da peça conferidas no índice local (lista vazia se o índice não estiver disponível)"""
+    try:
+        with stage('check_citations'):
+            return services.citation_index.check(document)
+    except Exception as e:
+        logging.error(f"Erro na verificação das citações: {str(e)}")
+        return []
+
+def render_pdf_html(context):
+    """HTML standalone do PDF: mesmo corpo do preview, sem CDN nem fontes remotas"""
+    return render_template('print.html', print_css=services.print_assets.css, **context)
+
+def render_pdf_file(html):
+    """Renderiza o PDF uma única vez por conteúdo e retorna o digest do artefato (ou None)"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'valid': False, 'message': 'Dados inválidos'})
-
-        # Valida tipo de peça
-        is_valid, message = validate_case_type(data.get('case_type', ''))
-        if not is_valid:
-            return jsonify({'valid': False, 'message': message})
-
-        # Valida outros campos
-        fields = ['parties', 'facts', 'legal_grounds', 'requests']
-        for field in fields:
-            is_valid, message = validate_text(data.get(field, ''), field)
-            if not is_valid:
-                return jsonify({'valid': False, 'message': message})
-
-        return jsonify({'valid': True})
+        with stage('pdf'):
+            return services.artifact_store.get_or_create(html, services.pdf_renderer.render)
     except Exception as e:
-        logging.error(f"Erro na validação: {str(e)}")
-        return jsonify({'valid': False, 'message': 'Erro na validação dos dados'})
+        logging.error(f"Erro na geração do PDF: {str(e)}", exc_info=True)
+        return None
+
+def record_history(owner, fields, document, pdf_digest=None, generation_date=None):
+    """Guarda o documento no histórico do usuário; uma falha aqui não impede a entrega do documento"""
+    try:
+        with stage('history_write'):
+            services.document_history.record(
+                owner, cache_manager.document_key(**fields), fields, document.to_dict(), pdf_digest, generation_date
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Erro ao gravar o histórico: {str(e)}")
 
-@app.route('/generate', methods=['POST'])
+def history_entry(digest):
+    """Entrada do histórico do usuário atual para ``digest`` (None se não houver ou se a leitura falhar)"""
+    try:
+        return services.document_history.get(current_user.get_id(), digest)
+    except sqlite3.Error as e:
+        logging.error(f"Erro ao ler o histórico: {str(e)}")
+        return None
+
+def _generation_job(job, fields, render_in_request, owner):
+    """Pipeline completo executado na fila: geração, HTML do PDF e PDF"""
+    job.progress('generating')
+    document = get_document_sections(fields)
+    job.progress('rendering')
+    context, html_for_pdf = render_in_request(fields['case_type'], document)
+    pdf_path = render_pdf_file(html_for_pdf)
+    record_history(owner, fields, document, pdf_path, context['generation_date'])
+    return {
+        'case_type': fields['case_type'],
+        'sections': document.to_dict(),
+        'generation_date': context['generation_date'],
+        'pdf_path': pdf_path,
+        'document_key': cache_manager.document_key(**fields)
+    }
+
+def _enqueue_generation(fields):
+    """Enfileira a geração e responde imediatamente com o id do job"""
+    @copy_current_request_context
+    def render_in_request(case_type, document):
+        context = render_document(case_type, document)
+        return context, render_pdf_html(context)
+
+    try:
+        job_id = services.job_queue.submit(
+            _generation_job, fields, render_in_request, current_user.get_id(), owner=current_user.get_id()
+        )
+    except QueueFullError:
+        return jsonify({'status': 'error', 'error': 'Servidor ocupado. Tente novamente em instantes.'}), 503
+    return jsonify({
+        'status': JOB_QUEUED,
+        'job_id': job_id,
+        'status_url': url_for('main.job_status', job_id=job_id)
+    }), 202
+
+@bp.route('/generate', methods=['POST'])
 @login_required
 @limiter.limit("10 per minute")
 def generate_document():
     try:
-        # Logging detalhado do request
-        logging.info(f"Headers: {dict(request.headers)}")
-        logging.info(f"Form data: {request.form}")
-        logging.info(f"Files: {request.files}")
-
         # Verifica se é uma requisição POST
         if request.method != 'POST':
             raise ValueError("Método não permitido")
 
         # Obtém e valida os dados do formulário
-        case_type = request.form.get('case_type', '').strip()
-        parties = request.form.get('parties', '').strip()
-        facts = request.form.get('facts', '').strip()
-        legal_grounds = request.form.get('legal_grounds', '').strip()
-        requests = request.form.get('requests', '').strip()
-
-        # Valida o tipo de peça
-        is_valid, message = validate_case_type(case_type)
-        if not is_valid:
+        fields, message = validate_generation_form(request.form)
+        asynchronous = request.args.get('async') == '1'
+        if fields is None:
+            if asynchronous or wants_json():
+                return jsonify({'status': 'error', 'error': message}), 400
             flash(message, 'error')
-            return redirect(url_for('index'))
-
-        # Valida os outros campos
-        fields = {
-            'parties': parties,
-            'facts': facts,
-            'legal_grounds': legal_grounds,
-            'requests': requests
-        }
-
-        for field_name, field_value in fields.items():
-            is_valid, message = validate_text(field_value, field_name)
-            if not is_valid:
-                flash(message, 'error')
-                return redirect(url_for('index'))
-
-        # Gera o documento usando o agente Gemini
+            return redirect(url_for('main.index'))
+
+        # Modo assíncrono: devolve o id do job sem prender o worker
+        if asynchronous:
+            return _enqueue_generation(fields)
+
+        # Cliente JSON (abas do script.js): minuta, análise, fundamentação e revisão juntas
+        if wants_json():
+            return _generate_json(fields)
+
+        # Gera o documento usando o agente Gemini (ou reaproveita do cache)
         try:
-            sections = gemini_agent.generate_document(
-                case_type=case_type,
-                parties=parties,
-                facts=facts,
-                legal_grounds=legal_grounds,
-                requests=requests
-            )
+            document = get_document_sections(fields)
         except Exception as e:
             logging.error(f"Erro na geração do documento: {str(e)}")
             flash("Erro ao gerar o documento. Por favor, tente novamente.", 'error')
-            return redirect(url_for('index'))
-
-        # Prepara variáveis para o template
-        case_type_title = case_type.upper()
-        court_header = "EXCELENTÍSSIMO(A) SENHOR(A) DOUTOR(A) JUIZ(A) DE DIREITO DA ____ª VARA CÍVEL DA COMARCA DE SÃO PAULO – SP"
-        parties_html = '<p class="document-paragraph">' + sections.get('parties', '').replace('\n', '</p><p class="document-paragraph">') + '</p>' if sections.get('parties') else ''
-        facts_html = '<p class="document-paragraph">' + sections.get('facts', '').replace('\n', '</p><p class="document-paragraph">') + '</p>' if sections.get('facts') else ''
-        legal_grounds_html = '<p class="document-paragraph">' + sections.get('legal_grounds', '').replace('\n', '</p><p class="document-paragraph">') + '</p>' if sections.get('legal_grounds') else ''
-        # Pedidos: cada linha vira <li>
-        requests_html = ''.join(f'<li>{line.strip()}</li>' for line in sections.get('requests', '').split('\n') if line.strip())
-        value_cause = sections.get('value_cause', '')
-        city_date = sections.get('city_date', '')
-        lawyer_name = sections.get('lawyer_name', '')
-        lawyer_oab = sections.get('lawyer_oab', '')
-        generation_date = datetime.now().strftime('%d de %B de %Y')
-
-        # Monta o HTML final para o PDF
-        html_for_pdf = render_template(
-            'preview.html',
-            case_type=case_type_title,
-            court_header=court_header,
-            parties=parties_html,
-            facts=facts_html,
-            legal_grounds=legal_grounds_html,
-            requests=requests_html,
-            value_cause=value_cause,
-            city_date=city_date,
-            lawyer_name=lawyer_name,
-            lawyer_oab=lawyer_oab,
-            generation_date=generation_date,
-            pdf_path=None  # Não mostrar botão de download no PDF
-        )
+            return redirect(url_for('main.index'))
 
-        # Gera o PDF
-        try:
-            pdf_options = {
-                'page-size': 'A4',
-                'margin-top': '2.5cm',
-                'margin-right': '2.5cm',
-                'margin-bottom': '2.5cm',
-                'margin-left': '2.5cm',
-                'encoding': 'UTF-8',
-                'no-outline': None,
-                'quiet': '',
-                'print-media-type': '',
-                'enable-local-file-access': '',
-                'dpi': 300,
-                'image-quality': 100,
-                'enable-smart-shrinking': '',
-                'zoom': 1.0
-            }
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-                pdfkit.from_string(html_for_pdf, temp_pdf.name, configuration=pdfkit_config, options=pdf_options)
-                pdf_path = os.path.basename(temp_pdf.name)
-        except Exception as e:
-            logging.error(f"Erro na geração do PDF: {str(e)}", exc_info=True)
-            pdf_path = None
+        # Corpo do documento renderizado uma vez, compartilhado pelo PDF e pelo preview
+        context = render_document(fields['case_type'], document)
 
-        # Renderiza o template de preview com as seções separadas
-        return render_template(
-            'preview.html',
-            case_type=case_type_title,
-            court_header=court_header,
-            parties=parties_html,
-            facts=facts_html,
-            legal_grounds=legal_grounds_html,
-            requests=requests_html,
-            value_cause=value_cause,
-            city_date=city_date,
-            lawyer_name=lawyer_name,
-            lawyer_oab=lawyer_oab,
-            generation_date=generation_date,
-            pdf_path=pdf_path
-        )
+        # Gera o PDF
+        with stage('render_template'):
+            html_for_pdf = render_pdf_html(context)
+        pdf_path = render_pdf_file(html_for_pdf)
+        record_history(current_user.get_id(), fields, document, pdf_path, context['generation_date'])
+
+        # Renderiza a página de preview em volta do mesmo corpo
+        with stage('render_template'):
+            return render_template(
+                'preview.html', pdf_path=pdf_path, document_key=cache_manager.document_key(**fields), **context
+            )
 
     except Exception as e:
         logging.error(f"Erro na geração do documento: {str(e)}")
         flash("Ocorreu um erro ao processar sua solicitação.", 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
-@app.route('/download/<path:filename>')
-@login_required
-def download_file(filename):
-    """Download do arquivo PDF gerado."""
+def _generate_json(fields):
+    """Resposta JSON do /generate com a minuta e as passadas auxiliares"""
     try:
-        # Configurações do PDF
-        options = {
-            'page-size': 'A4',
-            'margin-top': '2.5cm',
-            'margin-right': '2.5cm',
-            'margin-bottom': '2.5cm',
-            'margin-left': '2.5cm',
-            'encoding': 'UTF-8',
-            'no-outline': None,
-            'quiet': '',
-            'print-media-type': '',
-            'enable-local-file-access': '',
-            'dpi': 300,
-            'image-quality': 100,
-            'enable-smart-shrinking': '',
-            'zoom': 1.0
-        }
-        # Gera o PDF com as configurações
-        pdf = pdfkit.from_file(
-            os.path.join(app.config['UPLOAD_FOLDER'], filename),
-            False,
-            options=options,
-            configuration=pdfkit_config
+        result = get_document_insights(fields)
+    except Exception as e:
+        logging.error(f"Erro na geração do documento: {str(e)}")
+        return jsonify({'status': 'error', 'error': 'Erro ao gerar o documento. Por favor, tente novamente.'}), 500
+
+    document = result['sections']
+    context = render_document(fields['case_type'], document)
+    with stage('render_template'):
+        html_for_pdf = render_pdf_html(context)
+    digest = render_pdf_file(html_for_pdf)
+    record_history(current_user.get_id(), fields, document, digest, context['generation_date'])
+    document_key = cache_manager.document_key(**fields)
+    return jsonify({
+        'status': 'success',
+        'document': document.text(),
+        'sections': document.to_dict(),
+        'analysis': result['analysis'],
+        'basis': result['basis'],
+        'review': result['review'],
+        'citations': context['citations'],
+        'document_key': document_key,
+        'download_url': url_for('main.download_file', digest=digest) if digest else None,
+        'docx_url': url_for('main.download_docx', digest=document_key)
+    })
+
+def _get_own_job(job_id):
+    """Retorna o job se ele pertencer ao usuário atual"""
+    job = services.job_queue.get(job_id)
+    if job is None or job.get('owner') != current_user.get_id():
+        return None
+    return job
+
+@bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Status e resultado de um job de geração"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'Job não encontrado'}), 404
+
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'error': job['error']
+    }
+    if job['status'] == JOB_DONE:
+        payload['result'] = job['result']
+        payload['preview_url'] = url_for('main.job_preview', job_id=job_id)
+    return jsonify(payload)
+
+@bp.route('/jobs/<job_id>/preview')
+@login_required
+def job_preview(job_id):
+    """Preview HTML de um job concluído"""
+    job = _get_own_job(job_id)
+    if job is None or job['status'] != JOB_DONE:
+        flash('Documento não encontrado ou ainda em processamento.', 'error')
+        return redirect(url_for('main.index'))
+
+    result = job['result']
+
+    def render():
+        document = LegalDocument.from_mapping(result['sections'])
+        context = render_document(result['case_type'], document, result['generation_date'])
+        return render_template(
+            'preview.html', pdf_path=result['pdf_path'], document_key=result.get('document_key'), **context
         )
-        # Configura o response para download
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
+
+    etag = etag_for(job_id, result, services.templates_version, services.citation_index.version)
+    return conditional_preview(etag, render)
+
+def conditional_preview(etag, render):
+    """304 quando o navegador já tem esta versão do preview; senão chama ``render``"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    # Página do usuário logado: fica no navegador, mas é sempre revalidada
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/documents/<digest>')
+@login_required
+def open_document(digest):
+    """Reabre o preview de um documento do histórico do usuário; sem mudanças, responde 304 sem renderizar nada"""
+    # Só o histórico do próprio usuário: o cache de documentos é compartilhado e não tem dono
+    entry = history_entry(digest)
+    if entry is None:
+        flash('Documento não encontrado ou expirado. Gere o documento novamente.', 'danger')
+        return redirect(url_for('main.index'))
+    return reopen_document(digest, entry)
+
+def reopen_document(digest, entry):
+    """Preview a partir das seções guardadas no histórico: sem chamar o modelo e, com o PDF ainda
+    no armazenamento de artefatos, sem renderizar o PDF de novo"""
+    document = LegalDocument.from_mapping(entry['sections'])
+    case_type = entry['case_type']
+    generation_date = entry['generation_date'] or datetime.now().strftime('%d de %B de %Y')
+
+    def render():
+        context = render_document(case_type, document, generation_date)
+        pdf_path = entry['pdf_digest']
+        if services.artifact_store.path(pdf_path) is None:
+            # O PDF foi coletado (ARTIFACT_TTL) ou o documento veio do streaming: renderiza e guarda o digest
+            with stage('render_template'):
+                html_for_pdf = render_pdf_html(context)
+            pdf_path = render_pdf_file(html_for_pdf)
+            if pdf_path is not None:
+                services.document_history.set_pdf(current_user.get_id(), digest, pdf_path)
+        return render_template('preview.html', pdf_path=pdf_path, document_key=digest, **context)
+
+    etag = etag_for(
+        digest, entry['sections'], generation_date, entry['pdf_digest'],
+        services.templates_version, services.citation_index.version
+    )
+    return conditional_preview(etag, render)
+
+@bp.route('/documents/<digest>/docx')
+@login_required
+def download_docx(digest):
+    """DOCX editável escrito direto das seções, em streaming: sem HTML, PDF nem wkhtmltopdf"""
+    entry = history_entry(digest)
+    if entry is None:
+        flash('Documento não encontrado ou expirado. Gere o documento novamente.', 'danger')
+        return redirect(url_for('main.index'))
+    case_type, sections = entry['case_type'], entry['sections']
+    generation_date = entry['generation_date'] or datetime.now().strftime('%d de %B de %Y')
+
+    etag = etag_for(digest, sections, generation_date, services.docx_exporter.version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            stream_with_context(services.docx_exporter.stream(sections, case_type, COURT_HEADER, generation_date)),
+            mimetype=DOCX_MIMETYPE
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename=documento-{digest[:12]}.docx'
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/history')
+@login_required
+def history():
+    """Documentos já gerados pelo usuário, com busca de texto completo nas seções"""
+    query = request.args.get('q', '').strip()[:200]
+    case_type = request.args.get('case_type') or None
+    if case_type not in Config.ALLOWED_CASE_TYPES:
+        case_type = None
+    page = request.args.get('page', 1, type=int)
+    try:
+        with stage('history_search'):
+            entries, has_more = services.document_history.search(
+                current_user.get_id(), query, case_type=case_type, page=page
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Erro na busca do histórico: {str(e)}")
+        if wants_json():
+            return jsonify({'status': 'error', 'error': 'Erro ao consultar o histórico.'}), 500
+        flash('Erro ao consultar o histórico. Tente novamente.', 'danger')
+        entries, has_more = [], False
+
+    for entry in entries:
+        entry['url'] = url_for('main.open_document', digest=entry['key'])
+        entry['date'] = datetime.fromtimestamp(entry['updated_at']).strftime('%d/%m/%Y %H:%M')
+    if wants_json():
+        return jsonify({'status': 'success', 'query': query, 'page': page, 'has_more': has_more, 'documents': entries})
+    return render_template(
+        'history.html', entries=entries, query=query, case_type=case_type, page=page, has_more=has_more
+    )
+
+def _sse_event(event, data):
+    """Serializa um evento no formato Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@bp.route('/generate/stream', methods=['POST'])
+@login_required
+@limiter.limit("10 per minute")
+def generate_document_stream():
+    """Gera o documento enviando cada seção ao navegador assim que fica pronta (SSE)"""
+    fields, message = validate_generation_form(request.form)
+    if fields is None:
+        return jsonify({'status': 'error', 'error': message}), 400
+
+    owner = current_user.get_id()
+
+    def events():
+        sections = get_cached_document(**fields)
+        if sections is not None:
+            logging.info("Documento recuperado do cache")
+            for name, text in sections.items():
+                if text:
+                    yield _sse_event('section', {'name': name, 'text': text})
+            yield _sse_event('done', {'cached': True, 'citations': check_citations(sections)})
+            return
+
+        sections = {}
+        try:
+            for name, text in services.gemini_agent.stream_document(**fields):
+                sections[name] = text
+                yield _sse_event('section', {'name': name, 'text': text})
+        except Exception as e:
+            logging.error(f"Erro na geração do documento em streaming: {str(e)}")
+            yield _sse_event('error', {'message': 'Erro ao gerar o documento. Por favor, tente novamente.'})
+            return
+
+        # Guarda o resultado completo para que o /generate seguinte seja servido do cache
+        document = LegalDocument(**sections)
+        cache_document(document=document, **fields)
+        record_history(owner, fields, document)
+        yield _sse_event('done', {'cached': False, 'citations': check_citations(document)})
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/download/<digest>')
+@login_required
+def download_file(digest):
+    """Download do PDF gerado, servido direto do disco (ETag, Range e GET condicional)."""
+    path = services.artifact_store.path(digest)
+    if path is None:
+        flash('Documento não encontrado ou expirado. Gere o documento novamente.', 'danger')
+        return redirect(url_for('main.index'))
+    response = send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'documento-{digest[:12]}.pdf',
+        conditional=True,
+        etag=digest
+    )
+    # Peça de um usuário logado: nunca em cache compartilhado; o navegador revalida pelo ETag
+    response.cache_control.public = False
+    response.cache_control.max_age = None
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/documents/<digest>/sections/<section>', methods=['POST'])
+@login_required
+@limiter.limit("20 per minute")
+def regenerate_section(digest, section):
+    """Refaz uma única seção de um documento do histórico do usuário e devolve o fragmento HTML e o novo PDF.
+
+    A versão refeita fica só na entrada do histórico do usuário (SQLite, a mesma para todos os
+    workers); o cache de documentos, compartilhado entre usuários, continua com a versão gerada.
+    """
+    if section not in SECTION_CONTEXT:
+        return jsonify({'status': 'error', 'error': 'Seção não pode ser refeita isoladamente'}), 400
+    entry = history_entry(digest)
+    if entry is None:
+        return jsonify({'status': 'error', 'error': 'Documento não encontrado ou expirado. Gere o documento novamente.'}), 404
+    fields, document = entry['inputs'], LegalDocument.from_mapping(entry['sections'])
+    payload = request.get_json(silent=True) or request.form
+    guidance = (payload.get('guidance') or '').strip()[:Config.SECTION_GUIDANCE_MAX_LENGTH]
+
+    try:
+        document = services.gemini_agent.regenerate_section(document, section, guidance=guidance, **fields)
     except Exception as e:
-        logging.error(f"Erro ao gerar PDF: {str(e)}", exc_info=True)
-        flash('Erro ao gerar o PDF. Por favor, tente novamente.', 'danger')
-        return redirect(url_for('index'))
+        logging.error(f"Erro ao refazer a seção {section}: {str(e)}")
+        return jsonify({'status': 'error', 'error': 'Erro ao refazer a seção. Por favor, tente novamente.'}), 502
+    owner = current_user.get_id()
+    try:
+        # Outra seção refeita no meio tempo (em qualquer worker) não é sobrescrita
+        updated = services.document_history.update_sections(owner, digest, document.to_dict(), entry['updated_at'])
+    except sqlite3.Error as e:
+        logging.error(f"Erro ao gravar o histórico: {str(e)}")
+        return jsonify({'status': 'error', 'error': 'Erro ao salvar a seção. Por favor, tente novamente.'}), 500
+    if not updated:
+        return jsonify({
+            'status': 'error',
+            'error': 'O documento foi alterado em outra janela. Recarregue a página e tente novamente.'
+        }), 409
+
+    # Só o fragmento da seção é renderizado de novo; os das outras seções vêm do documento anterior
+    context = render_document(fields['case_type'], document, entry['generation_date'])
+    with stage('render_template'):
+        html_for_pdf = render_pdf_html(context)
+    pdf_digest = render_pdf_file(html_for_pdf)
+    if pdf_digest is not None:
+        try:
+            services.document_history.set_pdf(owner, digest, pdf_digest)
+        except sqlite3.Error as e:
+            logging.error(f"Erro ao gravar o histórico: {str(e)}")
+    return jsonify({
+        'status': 'success',
+        'section': section,
+        'text': document[section],
+        'html': document.html(section),
+        'citations': context['citations'],
+        'citations_html': render_template('_citations.html', citations=context['citations']),
+        'pdf_path': pdf_digest,
+        'download_url': url_for('main.download_file', digest=pdf_digest) if pdf_digest else None
+    })
+
+def _batch_row_key(row):
+    """Chave de deduplicação das linhas do lote (a mesma do cache de documentos)"""
+    if row.get('error'):
+        return id(row)
+    return cache_manager.document_key(*(row.get(field, '') for field in ('case_type',) + GENERATION_FIELDS))
+
+def _batch_process_row(app, row):
+    """Processa uma linha do lote (em thread da pool): validação, geração (com cache) e PDF"""
+    if row.get('error'):
+        return {'status': row.get('status', 'invalid'), 'error': row['error']}
+    fields, message = validate_generation_form(row)
+    if fields is None:
+        return {'status': 'invalid', 'error': message}
+
+    document = get_document_sections(fields)
+    with app.app_context():
+        html_for_pdf = render_pdf_html(render_document(fields['case_type'], document))
+    digest = render_pdf_file(html_for_pdf)
+    if digest is None:
+        return {'status': 'error', 'error': 'Erro na geração do PDF'}
+    return {'status': 'ok', 'digest': digest, 'pdf_path': services.artifact_store.path(digest)}
+
+def _open_batch(stream, fmt, concurrency):
+    """Valida o cabeçalho do lote e retorna o gerador de blocos do ZIP"""
+    rows = read_rows(stream, fmt)
+    first = next(rows, None)
+    if first is None:
+        raise BatchFormatError("O arquivo do lote está vazio")
+    rows = limit_rows(itertools.chain([first], rows), Config.BATCH_MAX_ROWS)
+    process_row = partial(_batch_process_row, current_app._get_current_object())
+    return stream_zip(run_batch(rows, process_row, _batch_row_key, concurrency=concurrency))
+
+@bp.route('/batch', methods=['POST'])
+@login_required
+@limiter.limit("5 per hour")
+def batch_generate():
+    """Gera peças em lote a partir de um CSV/JSONL e devolve um ZIP com PDFs e manifesto"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'status': 'error', 'error': 'Envie o arquivo do lote no campo "file"'}), 400
+    fmt = request.form.get('format') or detect_format(upload.filename)
+    try:
+        chunks = _open_batch(upload.stream, fmt, Config.BATCH_CONCURRENCY)
+    except BatchFormatError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    response = Response(stream_with_context(chunks), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=lote.zip'
+    return response
+
+@bp.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    """Métricas no formato de exposição do Prometheus"""
+    if not metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/metrics/models')
+@limiter.exempt
+def model_routes():
+    """Latência (p50/p95/p99), hedges, fallbacks e atraso de hedge atual de cada rota de modelo, em JSON"""
+    if not metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    if not services.ready('gemini_agent'):
+        return jsonify({'status': 'success', 'routes': {}, 'concurrency': {}})
+    agent = services.gemini_agent
+    return jsonify({'status': 'success', 'routes': agent.router.stats(), 'concurrency': agent.limiter.stats()})
+
+LOOPBACK_ADDRESSES = frozenset(('127.0.0.1', '::1'))
+
+def metrics_authorized():
+    """Com METRICS_TOKEN exige o Bearer; sem ele, só atende o próprio host (scraper local, sem proxy no meio)"""
+    if Config.METRICS_TOKEN:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {Config.METRICS_TOKEN}')
+    # Requisições repassadas por um proxy chegam do loopback: o cabeçalho do proxy as denuncia
+    forwarded = 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers
+    return request.remote_addr in LOOPBACK_ADDRESSES and not forwarded
+
+@bp.cli.command('batch')
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_path', type=click.Path(dir_okay=False))
+@click.option('--concurrency', default=Config.BATCH_CONCURRENCY, show_default=True, help='Chamadas simultâneas ao Gemini')
+def batch_command(input_path, output_path, concurrency):
+    """Gera peças em lote a partir de INPUT_PATH (CSV/JSONL) e grava o ZIP em OUTPUT_PATH."""
+    fmt = detect_format(input_path)
+    with open(input_path, 'rb') as source, open(output_path, 'wb') as target:
+        try:
+            for chunk in _open_batch(source, fmt, concurrency):
+                target.write(chunk)
+        except BatchFormatError as e:
+            raise click.ClickException(str(e))
+    click.echo(f"Lote gravado em {output_path}")
+
+@bp.cli.command('build-citation-index')
+def build_citation_index_command():
+    """Compila as fontes de CITATION_SOURCES_DIR no índice de citações mapeado em memória (CITATION_INDEX_PATH)."""
+    size = services.citation_index.write()
+    click.echo(f"Índice de citações gravado em {Config.CITATION_INDEX_PATH} ({len(services.citation_index)} dispositivos, {size} bytes)")
+
+@bp.cli.command('optimize-history')
+def optimize_history_command():
+    """Compacta o índice de busca do histórico (útil depois de importações grandes)."""
+    services.document_history.optimize()
+    click.echo(f"Índice do histórico otimizado em {Config.HISTORY_PATH}")
+
+@bp.cli.command('build-print-assets')
+def build_print_assets_command():
+    """Compila o CSS de impressão (tree-shaking + fontes locais embutidas) em PRINT_BUNDLE_PATH."""
+    size = services.print_assets.write()
+    click.echo(f"Bundle de impressão gravado em {Config.PRINT_BUNDLE_PATH} ({size} bytes)")
+
+def create_app(config=Config):
+    """Cria a aplicação Flask.
+
+    Não abre conexões, não sobe processos nem threads: agente Gemini,
+    renderizador de PDF, fila de jobs, coleta de lixo dos PDFs e CSS de
+    impressão são criados no primeiro uso (ver ``utils/services.py``).
+    """
+    configure_logging(config)
+
+    app = Flask(__name__)
+    app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))  # Usa SECRET_KEY do .env ou gera uma nova
+    app.config.from_object(config)
+
+    # Configurações de segurança
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)  # Sessão expira em 1 hora
+    app.config['SESSION_COOKIE_SECURE'] = True  # Cookie só é enviado via HTTPS
+    app.config['SESSION_COOKIE_HTTPONLY'] = True  # Previne acesso via JavaScript
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Proteção contra CSRF
+
+    # Inicializa o cache e rate limiter
+    init_cache(app)
+    login_manager.init_app(app)
+    services.init_app(app)
+    cache_manager.citation_version = services.citation_version
+    app.register_blueprint(bp)
+    return app
+
+def __getattr__(name):
+    # `gunicorn app:app` e `from app import app` continuam funcionando: a
+    # aplicação padrão é criada no primeiro acesso, nunca na importação
+    if name == 'app':
+        application = globals()['app'] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    create_app().run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""Microbenchmark of the document formatter.
+
+Compares the single-pass sanitizer with the BeautifulSoup reference on
+synthetic petitions of 5k to 50k characters and checks that both produce
+the same HTML.
+
+    python benchmarks/bench_formatter.py --sizes 5000 20000 50000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.formatter import sanitize, sanitize_with_soup, structure_document  # noqa: E402
+
+TITLES = [
+    'DOS FATOS', 'DA FUNDAMENTAÇÃO JURÍDICA', 'DO DIREITO', 'DA TUTELA DE URGÊNCIA',
+    'DAS PROVAS', 'DO VALOR DA CAUSA', 'DOS PEDIDOS',
+]
+SENTENCES = [
+    'A autora adquiriu um produto eletrônico em 10/01/2024 pelo valor de R$ 3.500,00.',
+    'Conforme o art. 14 do Código de Defesa do Consumidor, o fornecedor responde objetivamente.',
+    'Nesse sentido, a jurisprudência do STJ é pacífica (REsp 1.234.567/SP).',
+    'O réu, devidamente notificado, quedou-se inerte.',
+    'Há <strong>dano moral</strong> in re ipsa, vide <em>Súmula 479</em> do STJ.',
+    'Aplica-se o <span class="citation">art. 300 do CPC</span> ao caso.',
+]
+
+
+def make_petition(size, seed=0):
+    """Build a petition-like text of roughly ``size`` characters"""
+    rnd = random.Random(seed)
+    lines = ['Petição Inicial']
+    length = 0
+    while length < size:
+        roll = rnd.random()
+        if roll < 0.08:
+            line = rnd.choice(TITLES)
+        elif roll < 0.16:
+            line = f"{rnd.choice(['I', 'II', 'III', 'IV'])} - {rnd.choice(SENTENCES)}"
+        elif roll < 0.24:
+            line = f"{rnd.choice('abcdef')}) {rnd.choice(SENTENCES)}"
+        elif roll < 0.30:
+            line = f"§ {rnd.randint(1, 9)}. {rnd.choice(SENTENCES)}"
+        else:
+            line = ' '.join(rnd.choice(SENTENCES) for _ in range(rnd.randint(1, 4)))
+        lines.append(line)
+        length += len(line) + 1
+    lines += ['Diante do exposto, requer a Vossa Excelência:', 'a citação do réu;', 'a procedência do pedido.']
+    return '\n'.join(lines)
+
+
+def timed(func, arg, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 10000, 20000, 50000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'chars':>8} {'structure ms':>13} {'soup ms':>9} {'single-pass ms':>15} {'speedup':>8}")
+    for size in args.sizes:
+        markup = structure_document(make_petition(size, seed=size))
+        structure, _ = timed(structure_document, make_petition(size, seed=size), args.repeat)
+        reference, expected = timed(sanitize_with_soup, markup, args.repeat)
+        single_pass, result = timed(sanitize, markup, args.repeat)
+        if result != expected:
+            raise SystemExit(f"Saída divergente para {size} caracteres")
+        print(
+            f"{size:>8} {structure * 1000:>13.2f} {reference * 1000:>9.2f} "
+            f"{single_pass * 1000:>15.2f} {reference / single_pass:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
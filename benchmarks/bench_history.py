@@ -0,0 +1,87 @@
+"""Search latency of the document history (SQLite FTS5).
+
+Fills a temporary history with synthetic petitions spread over a few users
+and times full-text searches, with and without a case type filter, and
+the plain newest-first listing.
+
+    python benchmarks/bench_history.py --documents 50000 --users 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_history import DocumentHistory  # noqa: E402
+
+CASE_TYPES = ['Petição Inicial', 'Contestação', 'Recurso', 'Agravo', 'Embargos']
+SUBJECTS = [
+    'cobrança de tarifas bancárias não contratadas', 'negativação indevida no SPC', 'atraso na entrega do imóvel',
+    'cancelamento de voo sem assistência', 'reajuste abusivo do plano de saúde', 'defeito em veículo zero quilômetro',
+    'despejo por falta de pagamento', 'rescisão indireta do contrato de trabalho', 'vício oculto em eletrodoméstico',
+]
+SENTENCES = [
+    'O autor foi surpreendido por {subject}, conforme documentos anexos.',
+    'A ré, devidamente notificada, quedou-se inerte quanto à {subject}.',
+    'Aplica-se o art. 14 do Código de Defesa do Consumidor à {subject}.',
+    'Nesse sentido, a jurisprudência do STJ reconhece o dano moral decorrente de {subject}.',
+    'Requer a tutela de urgência do art. 300 do CPC para fazer cessar a {subject}.',
+]
+QUERIES = ['tarifa bancaria', 'agravo plano saude', 'negativacao', 'despejo pagamento', 'voo cancel', 'inexistente']
+
+
+def make_sections(rnd):
+    subject = rnd.choice(SUBJECTS)
+    text = lambda n: '\n'.join(rnd.choice(SENTENCES).format(subject=subject) for _ in range(n))  # noqa: E731
+    return {
+        'parties': 'FULANO DE TAL, brasileiro, em face de EMPRESA EXEMPLO LTDA.',
+        'facts': text(8), 'legal_grounds': text(10), 'requests': text(4),
+        'value_cause': 'R$ 10.000,00', 'city_date': 'São Paulo, 1 de março de 2024',
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        history = DocumentHistory(os.path.join(directory, 'history.db'))
+        conn = history._connect()
+        started = time.perf_counter()
+        conn.execute('BEGIN')
+        for number in range(args.documents):
+            case_type = rnd.choice(CASE_TYPES)
+            inputs = {'case_type': case_type, 'parties': 'Fulano x Empresa', 'facts': '', 'legal_grounds': '', 'requests': ''}
+            history.record(str(number % args.users), f'{number:064x}', inputs, make_sections(rnd), pdf_digest=f'{number:064x}')
+        conn.execute('COMMIT')
+        history.optimize()
+        size = os.path.getsize(os.path.join(directory, 'history.db'))
+        print(f"{args.documents} documentos em {time.perf_counter() - started:.1f}s ({size / 1e6:.1f} MB)")
+
+        print(f"{'busca':<24} {'tipo':<10} {'resultados':>10} {'p50 ms':>8} {'max ms':>8}")
+        for query in QUERIES + ['']:
+            for case_type in (None, 'Agravo'):
+                entries, _ = history.search('0', query, case_type=case_type)
+                p50, worst = timed(lambda: history.search('0', query, case_type=case_type), args.repeat)
+                print(f"{query or '(recentes)':<24} {case_type or '-':<10} {len(entries):>10} {p50 * 1000:>8.2f} {worst * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Offline load test of LexGenius with the stub model backend.
+
+Drives ``/generate`` and ``/validate`` through the Flask test client at a
+given concurrency, plus the ``_parse_sections``, ``_format_document``,
+PDF rendering and DOCX export stages in isolation. No API quota is used: the app runs
+with ``MODEL_BACKEND=stub`` (in-process, or a stub server started with
+``python -m agents.stub``). Each run is appended to a JSONL file tagged
+with the git commit and compared with the latest run of another commit.
+
+    python benchmarks/bench_load.py --concurrency 8 --requests 200 --latency 0.5
+    python benchmarks/bench_load.py --suites parse format --fail-on-regression
+    python benchmarks/bench_load.py --suites pdf docx
+    python benchmarks/bench_load.py --suites generate --tail-rate 0.05 --no-hedging
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SUITES = ('generate', 'validate', 'parse', 'format', 'pdf', 'docx')
+FORM = {
+    'case_type': 'Petição Inicial',
+    'parties': 'FULANO DE TAL, brasileiro, casado, em face de EMPRESA EXEMPLO LTDA., pessoa jurídica de direito privado.',
+    'facts': 'O autor adquiriu um produto que apresentou defeito em 10/01/2024 e a ré se recusou a trocá-lo. ' * 3,
+    'legal_grounds': 'Aplicam-se os arts. 14 e 18 do Código de Defesa do Consumidor e o art. 186 do Código Civil. ' * 2,
+    'requests': 'A condenação da ré à restituição do valor pago e ao pagamento de indenização por danos morais. ' * 2,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'per_second': (len(latencies) + errors) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_concurrently(func, total, concurrency):
+    """Call ``func(index)`` ``total`` times on ``concurrency`` threads; ``func`` returns True on success"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(index):
+        nonlocal errors
+        started = time.perf_counter()
+        ok = func(index)
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(total)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def configure_environment(args, directory):
+    """Point the app at the stub backend and throwaway storage; must run before importing it"""
+    os.environ.update({
+        'MODEL_BACKEND': 'stub',
+        'STUB_LATENCY': str(args.latency),
+        'STUB_ERROR_RATE': str(args.error_rate),
+        'STUB_TAIL_RATE': str(args.tail_rate),
+        'MODEL_HEDGING': 'false' if args.no_hedging else 'true',
+        'DOCUMENT_CACHE_PATH': os.path.join(directory, 'documents.db'),
+        'ARTIFACT_DIR': os.path.join(directory, 'artifacts'),
+        'RATELIMIT_STORAGE_URL': 'memory://',
+        'JOB_QUEUE_BACKEND': 'memory',
+    })
+    if args.stub_url:
+        os.environ['STUB_URL'] = args.stub_url
+
+
+def http_suites(args, suites):
+    import app as lexgenius
+
+    app = lexgenius.create_app()
+    app.config.update(TESTING=True, SESSION_COOKIE_SECURE=False)
+    lexgenius.limiter.enabled = False
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            with local.client.session_transaction() as session:
+                session['_user_id'] = '1'
+                session['_fresh'] = True
+        return local.client
+
+    def form(index):
+        # Uma fração das requisições repete a entrada e é servida pelo cache de documentos
+        if (index % 100) < args.cache_hit_ratio * 100:
+            return FORM
+        return dict(FORM, facts=f"{FORM['facts']} Requisição {index}.")
+
+    calls = {
+        'generate': lambda index: client().post('/generate', data=form(index)).status_code == 200,
+        'validate': lambda index: client().post('/validate', json=form(index)).get_json().get('valid') is True,
+    }
+    results = {}
+    for name in suites:
+        # Aquecimento fora da medição: recursos preguiçosos (agente, PDF, usuários) nascem aqui
+        for index in range(args.warmup):
+            calls[name](-1 - index)
+        results[name] = run_concurrently(calls[name], args.requests, args.concurrency)
+    if 'generate' in suites:
+        print_routes(lexgenius.services.gemini_agent.router.stats())
+    return results
+
+
+def print_routes(routes):
+    """Latency and hedging of each model route used by the run (see /metrics/models)"""
+    print(f"{'rota':<24} {'chamadas':>8} {'hedges':>7} {'ganhos':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in routes.items():
+        print(
+            f"{name:<24} {stats['calls']:>8} {stats['hedges']:>7} {stats['hedge_wins']:>7} "
+            f"{stats['p50_ms'] or 0:>9.1f} {stats['p95_ms'] or 0:>9.1f} {stats['p99_ms'] or 0:>9.1f}"
+        )
+    print()
+
+
+def stage_suites(args, suites):
+    from agents.formatter import format_document
+    from agents.gemini_agent import GeminiAgent
+    from agents.backends import StubBackend
+    from agents.prompts import document_template
+    from agents.stub import stub_text
+
+    agent = GeminiAgent(backend=StubBackend())
+    texts = [stub_text(document_template(FORM['case_type']).key, str(index), paragraphs=args.paragraphs) for index in range(64)]
+    documents = [agent._parse_sections(text).text() for text in texts]
+    calls = {
+        'parse': lambda index: bool(agent._parse_sections(texts[index % len(texts)])),
+        'format': lambda index: bool(format_document(documents[index % len(documents)], FORM['case_type'])),
+    }
+    results = {}
+    for name in suites:
+        if name == 'pdf':
+            results[name] = pdf_suite(args, agent, texts)
+        elif name == 'docx':
+            results[name] = docx_suite(args, agent, texts)
+        else:
+            results[name] = run_concurrently(calls[name], args.requests * 10, 1)
+    return results
+
+
+def pdf_suite(args, agent, texts):
+    import app as lexgenius
+
+    renderer = lexgenius.services.pdf_renderer
+    with lexgenius.create_app().app_context():
+        pages = [
+            lexgenius.render_pdf_html(lexgenius.render_document(FORM['case_type'], agent._parse_sections(text)))
+            for text in texts[:8]
+        ]
+    try:
+        renderer.render(pages[0])
+    except Exception as e:
+        print(f"pdf: ignorado ({str(e).splitlines()[0]})", file=sys.stderr)
+        return None
+    return run_concurrently(
+        lambda index: bool(renderer.render(pages[index % len(pages)])),
+        args.requests, min(args.concurrency, lexgenius.Config.PDF_RENDER_MAX_CONCURRENCY)
+    )
+
+
+def docx_suite(args, agent, texts):
+    """The DOCX export from the same sections as the pdf suite, at the same concurrency"""
+    import app as lexgenius
+
+    with lexgenius.create_app().app_context():
+        exporter = lexgenius.services.docx_exporter
+    documents = [agent._parse_sections(text) for text in texts[:8]]
+    return run_concurrently(
+        lambda index: bool(exporter.render(
+            documents[index % len(documents)], FORM['case_type'], lexgenius.COURT_HEADER, '1 de março de 2024'
+        )),
+        args.requests, min(args.concurrency, lexgenius.Config.PDF_RENDER_MAX_CONCURRENCY)
+    )
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def load_previous(path, commit):
+    """Latest stored run of a different commit, or None"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['commit'] != commit:
+                previous = record
+    return previous
+
+
+def compare(results, previous, threshold):
+    """Print the deltas against ``previous`` and return the regressed suites"""
+    regressions = []
+    if previous is None:
+        return regressions
+    print(f"\nComparação com {previous['commit']} ({previous['timestamp']}):")
+    for name, stats in results.items():
+        before = previous['results'].get(name)
+        if not stats or not before:
+            continue
+        p95 = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        rps = (stats['per_second'] - before['per_second']) / before['per_second'] if before['per_second'] else 0.0
+        flag = p95 > threshold or rps < -threshold
+        if flag:
+            regressions.append(name)
+        print(f"{name:<10} p95 {p95:+7.1%}  req/s {rps:+7.1%}{'  REGRESSÃO' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='requests per HTTP suite (x10 for the stage suites)')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub model latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='stub 503 rate (retried by the agent)')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='fraction of stub answers 10x slower than --latency')
+    parser.add_argument('--no-hedging', action='store_true', help='disable hedged model requests (MODEL_HEDGING=false)')
+    parser.add_argument('--stub-url', default=None, help='use a stub server (python -m agents.stub) instead of the in-process stub')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed requests per HTTP suite before measuring')
+    parser.add_argument('--cache-hit-ratio', type=float, default=0.0, help='fraction of /generate requests with repeated input')
+    parser.add_argument('--paragraphs', type=int, default=4, help='paragraphs per section in the stage suites')
+    parser.add_argument('--results', default=os.path.join(ROOT, 'cache', 'benchmarks.jsonl'), help='JSONL file with the stored runs')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative p95/throughput change reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='keep the app logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory:
+        configure_environment(args, directory)
+        results = {}
+        http = [name for name in args.suites if name in ('generate', 'validate')]
+        if http:
+            results.update(http_suites(args, http))
+        stages = [name for name in args.suites if name in ('parse', 'format', 'pdf', 'docx')]
+        if stages:
+            results.update(stage_suites(args, stages))
+
+    print(f"{'suite':<10} {'req':>6} {'erros':>6} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results.items():
+        if stats:
+            print(
+                f"{name:<10} {stats['requests']:>6} {stats['errors']:>6} {stats['per_second']:>10.1f} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+            )
+
+    commit = git_commit()
+    regressions = compare(results, load_previous(args.results, commit), args.threshold)
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'settings': {key: value for key, value in vars(args).items() if key not in ('results', 'verbose')},
+            'results': results,
+        }) + '\n')
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
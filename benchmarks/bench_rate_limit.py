@@ -0,0 +1,106 @@
+"""Contention benchmark of the shared rate limit storage.
+
+Several processes (standing in for gunicorn workers), each with a few
+threads, hit the same limits through Flask-Limiter's fixed window
+strategy. The script reports throughput and latency percentiles, and
+checks that the shared storage counted every hit exactly once.
+
+    python benchmarks/bench_rate_limit.py --workers 4 --threads 8 --hits 2000
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+
+import utils.rate_limit_store  # noqa: E402,F401  (registra sqlite://)
+
+LIMITS = [parse(item) for item in ("200 per day", "50 per hour", "10 per minute")]
+
+
+def _worker(uri, threads, hits, keys, results):
+    storage = storage_from_string(uri)
+    limiter = FixedWindowRateLimiter(storage)
+    latencies = []
+    lock = threading.Lock()
+
+    def run(thread_index):
+        local = []
+        for i in range(hits):
+            key = f'client-{(thread_index + i) % keys}'
+            started = time.perf_counter()
+            for item in LIMITS:
+                limiter.hit(item, key)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(latencies)
+
+
+def run(uri, workers, threads, hits, keys):
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(uri, threads, hits, keys, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    storage = storage_from_string(uri)
+    counted = sum(storage.get(item.key_for(f'client-{k}')) for k in range(keys) for item in LIMITS[:1])
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'counted': counted,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--hits', type=int, default=1000, help='requests per thread')
+    parser.add_argument('--keys', type=int, default=16, help='distinct clients')
+    parser.add_argument('--storage', nargs='+', default=None, help='storage URIs (default: memory:// and a temp sqlite)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        uris = args.storage or ['memory://', 'sqlite:///' + os.path.join(directory, 'ratelimit.db')]
+        expected = args.workers * args.threads * args.hits
+        print(f"{'storage':<12} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'counted':>9} {'expected':>9}")
+        for uri in uris:
+            stats = run(uri, args.workers, args.threads, args.hits, args.keys)
+            # memory:// conta por processo: o processo pai não vê nenhum hit
+            print(
+                f"{uri.split('://')[0]:<12} {stats['per_second']:>10.0f} {stats['p50_ms']:>8.3f} "
+                f"{stats['p99_ms']:>8.3f} {stats['counted']:>9} {expected:>9}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Cold start benchmark of the application factory.
+
+Each run imports ``app`` and calls ``create_app()`` in a fresh interpreter
+and reports both times, plus the share of the import spent in third party
+packages (Flask and friends) versus LexGenius' own modules. It also checks
+that startup stays side effect free: no extra threads, no child
+processes, no sockets and no Gemini SDK import.
+
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 100
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, socket, sys, threading, time
+sys.path.insert(0, ROOT)
+opened = []
+_socket_init = socket.socket.__init__
+def _tracking_init(self, *args, **kwargs):
+    opened.append(args)
+    _socket_init(self, *args, **kwargs)
+socket.socket.__init__ = _tracking_init
+
+started = time.perf_counter()
+import flask, flask_login, flask_limiter, flask_caching, limits, dotenv  # noqa: E401
+deps = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+
+import multiprocessing
+print(json.dumps({
+    'deps_ms': (deps - started) * 1000,
+    'import_ms': (imported - deps) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'threads': threading.active_count(),
+    'children': len(multiprocessing.active_children()),
+    'sockets': len(opened),
+    'gemini_sdk_loaded': 'google.generativeai' in sys.modules,
+}))
+"""
+
+
+def probe(env):
+    code = f'ROOT = {ROOT!r}\n' + PROBE
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=100.0, help='maximum median of import + create_app (own modules)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            MODEL_BACKEND=os.environ.get('MODEL_BACKEND', 'gemini'),
+            GEMINI_API_KEY=os.environ.get('GEMINI_API_KEY', 'startup-benchmark'),
+            DOCUMENT_CACHE_PATH=os.path.join(directory, 'documents.db'),
+            ARTIFACT_DIR=os.path.join(directory, 'artifacts'),
+        )
+        runs = [probe(env) for _ in range(args.runs)]
+
+    medians = {key: statistics.median(run[key] for run in runs) for key in ('deps_ms', 'import_ms', 'create_app_ms')}
+    own = medians['import_ms'] + medians['create_app_ms']
+    print(f"dependências (Flask etc.): {medians['deps_ms']:8.1f} ms")
+    print(f"import app:                {medians['import_ms']:8.1f} ms")
+    print(f"create_app():              {medians['create_app_ms']:8.1f} ms")
+    print(f"total LexGenius:           {own:8.1f} ms (orçamento {args.budget_ms:.0f} ms)")
+
+    last = runs[-1]
+    problems = []
+    if own > args.budget_ms:
+        problems.append(f"startup acima do orçamento ({own:.1f} ms)")
+    if last['threads'] != 1:
+        problems.append(f"{last['threads'] - 1} thread(s) extra na inicialização")
+    if last['children']:
+        problems.append(f"{last['children']} processo(s) filho na inicialização")
+    if last['sockets']:
+        problems.append(f"{last['sockets']} socket(s) aberto(s) na inicialização")
+    if last['gemini_sdk_loaded']:
+        problems.append("SDK do Gemini importado na inicialização")
+    for problem in problems:
+        print(f"FALHA: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import shutil
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -32,24 +33,165 @@ class Config:
         "Embargos"
     ]
     
+    # Backend do modelo: 'gemini' (API real) ou 'stub' (respostas sintéticas, para benchmarks e uso offline)
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'gemini')
+    STUB_URL = os.getenv('STUB_URL')  # servidor do stub (python -m agents.stub); vazio = stub no processo
+    STUB_LATENCY = float(os.getenv('STUB_LATENCY', 0))  # segundos por resposta (stub no processo)
+    STUB_ERROR_RATE = float(os.getenv('STUB_ERROR_RATE', 0))
+    STUB_SEED = int(os.getenv('STUB_SEED', 0))
+    STUB_TAIL_RATE = float(os.getenv('STUB_TAIL_RATE', 0))  # fração das respostas 10x mais lentas
+
     # Configurações da API Gemini
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     GEMINI_MODEL = 'gemini-2.0-flash'
     GEMINI_MAX_RETRIES = 3
     GEMINI_TIMEOUT = 30
-    
+    GEMINI_BACKOFF_BASE = 0.5  # segundos; dobra a cada tentativa, com jitter
+    GEMINI_BACKOFF_MAX = 8
+    # Limite adaptativo (AIMD) de chamadas simultâneas ao Gemini por processo
+    GEMINI_CONCURRENCY_INITIAL = 4
+    GEMINI_CONCURRENCY_MIN = 1
+    GEMINI_CONCURRENCY_MAX = 16
+    # Incrementar para invalidar todo o cache de documentos; mudanças de prompt
+    # são versionadas por template em agents/prompts.py
+    GEMINI_PROMPT_VERSION = '1'
+    # Orçamento estimado de tokens dos campos do usuário por prompt; acima disso os maiores são resumidos
+    PROMPT_MAX_INPUT_TOKENS = int(os.getenv('PROMPT_MAX_INPUT_TOKENS', 4000))
+    # Orçamento menor ao refazer uma seção: o campo, a seção atual e as seções de que ela depende
+    SECTION_PROMPT_MAX_INPUT_TOKENS = int(os.getenv('SECTION_PROMPT_MAX_INPUT_TOKENS', 1500))
+
+    # Roteamento por nível de modelo (agents/router.py): 'fast', 'default' (GEMINI_MODEL) e 'strong'
+    MODEL_ROUTING = os.getenv('MODEL_ROUTING', 'true').lower() in ('1', 'true', 'yes')
+    GEMINI_FAST_MODEL = os.getenv('GEMINI_FAST_MODEL', 'gemini-2.0-flash-lite')  # vazio desativa o nível
+    GEMINI_STRONG_MODEL = os.getenv('GEMINI_STRONG_MODEL', 'gemini-2.5-flash')
+    # Só os passes auxiliares (JSON curto ou levantamento) vão para o modelo rápido
+    MODEL_TEMPLATE_TIERS = {'analysis': 'fast', 'basis': 'fast', 'review': 'fast'}
+    # Peças que vão para o modelo forte (ex.: 'Recurso,Agravo,Embargos') e tamanho dos campos (tokens
+    # estimados) a partir do qual um pedido vai para ele; vazio e 0 (padrão) nunca promovem uma peça
+    MODEL_STRONG_CASE_TYPES = [
+        name.strip() for name in os.getenv('MODEL_STRONG_CASE_TYPES', '').split(',') if name.strip()
+    ]
+    MODEL_STRONG_MIN_INPUT_TOKENS = int(os.getenv('MODEL_STRONG_MIN_INPUT_TOKENS', 0))
+    # Peças com campos até este tamanho no modelo rápido; 0 (padrão) nunca rebaixa uma peça
+    MODEL_FAST_MAX_INPUT_TOKENS = int(os.getenv('MODEL_FAST_MAX_INPUT_TOKENS', 0))
+    # Níveis tentados, em ordem, quando o modelo do nível escolhido responde 429/503
+    MODEL_FALLBACKS = {'strong': ['default', 'fast'], 'default': ['fast'], 'fast': ['default']}
+    MODEL_THROTTLE_COOLDOWN = 30  # segundos fora da cadeia depois de um 429/503
+    # Requisição duplicada (hedge) quando a chamada passa do percentil de latência recente da rota
+    MODEL_HEDGING = os.getenv('MODEL_HEDGING', 'true').lower() in ('1', 'true', 'yes')
+    MODEL_HEDGE_PERCENTILE = 0.95
+    MODEL_HEDGE_MIN_SAMPLES = 20  # chamadas na janela antes do primeiro hedge
+    MODEL_HEDGE_MIN_DELAY = float(os.getenv('MODEL_HEDGE_MIN_DELAY', 0.5))  # segundos
+    MODEL_HEDGE_MAX_RATIO = 0.1  # no máximo 10% das chamadas recentes com hedge
+    MODEL_LATENCY_WINDOW = 200  # chamadas por rota usadas nos percentis
+
     # Configurações de cache
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
     
+    # Cache de documentos gerados (LRU em memória + SQLite compartilhado entre workers)
+    DOCUMENT_CACHE_PATH = os.getenv('DOCUMENT_CACHE_PATH', os.path.join('cache', 'documents.db'))
+    DOCUMENT_CACHE_TTL = int(os.getenv('DOCUMENT_CACHE_TTL', 7 * 24 * 3600))  # 7 dias
+    DOCUMENT_CACHE_MEMORY_ENTRIES = 256
+    DOCUMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+    # Reaproveita documentos de entradas que só diferem em nomes, CPF/CNPJ, datas e valores
+    # (desligado por padrão; só modelos sem nenhum número ou nome não rastreado são usados)
+    TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', 'false').lower() in ('1', 'true', 'yes')
+    # Orientação do advogado ao refazer uma seção (POST /documents/<digest>/sections/<seção>)
+    SECTION_GUIDANCE_MAX_LENGTH = 1000
+    
+    # Histórico de documentos por usuário, com busca de texto completo (SQLite FTS5)
+    HISTORY_PATH = os.getenv('HISTORY_PATH', os.path.join('cache', 'history.db'))
+    HISTORY_PAGE_SIZE = 20
+    
+    # Fila de jobs assíncronos (geração + PDF)
+    # 'sqlite' (padrão, visto por todos os workers) ou 'memory' (só para um único processo)
+    JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join('cache', 'jobs.db'))
+    JOB_API_WORKERS = int(os.getenv('JOB_API_WORKERS', 4))
+    JOB_MAX_PENDING = 32
+    JOB_RESULT_TTL = 3600  # 1 hora
+    # Cada worker renova seus jobs a cada JOB_LEASE/3 s; sem renovação por JOB_LEASE s, o job é dado como falho
+    JOB_LEASE = int(os.getenv('JOB_LEASE', 60))
+    
+    # Geração em lote (/batch e `flask batch`)
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+    BATCH_MAX_ROWS = 1000
+    
+    # Métricas Prometheus em /metrics; com METRICS_TOKEN definido, exige "Authorization: Bearer <token>",
+    # sem ele só responde a requisições do próprio host que não passaram por proxy
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))  # fração das requisições cronometradas
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    
     # Configurações de logging
-    LOG_LEVEL = 'INFO'
-    LOG_FILE = 'app.log'
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.getenv('LOG_FILE', '')  # vazio: só stderr; rotação do arquivo fica com o logrotate
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' (uma linha por registro) ou 'text'
+    LOG_QUEUE_SIZE = 10000  # registros pendentes antes de descartar (o log nunca bloqueia a requisição)
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))  # fração das requisições com logs INFO/DEBUG
     
+    # Compressão (gzip, ou brotli com o pacote instalado) de HTML/JSON e cache dos arquivos estáticos
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 500))  # bytes; respostas menores vão sem compressão
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))  # respostas dinâmicas, comprimidas a cada requisição
+    STATIC_COMPRESSION_LEVEL = 9  # arquivos estáticos, comprimidos uma vez por versão
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 3600))  # URLs com ?v=<hash> são imutáveis
+
+    # Índice local de citações (artigos de lei e súmulas) para verificar as citações e embasar o prompt
+    CITATION_SOURCES_DIR = os.path.join('data', 'citations')
+    CITATION_INDEX_PATH = os.getenv('CITATION_INDEX_PATH', os.path.join('cache', 'citations.idx'))
+    CITATION_TOP_K = int(os.getenv('CITATION_TOP_K', 5))  # dispositivos enviados no prompt; 0 desativa
+
     # Configurações de rate limiting
     RATELIMIT_DEFAULT = "200 per day;50 per hour;10 per minute"
-    RATELIMIT_STORAGE_URL = "memory://"
+    # sqlite:/// é compartilhado por todos os workers do host; memory:// vale por processo
+    RATELIMIT_STORAGE_URL = os.getenv(
+        'RATELIMIT_STORAGE_URL', 'sqlite:///' + os.path.join('cache', 'ratelimit.db')
+    )
+    LOGIN_MAX_ATTEMPTS = 3
+    LOGIN_LOCKOUT_SECONDS = 15 * 60
+    
+    # Exportação DOCX editável, escrita direto das seções com o template de estilos de data/docx
+    DOCX_TEMPLATE_DIR = os.path.join('data', 'docx')
+    DOCX_COMPRESSION_LEVEL = 6
     
     # Configurações de PDF
-    PDFKIT_PATH = 'C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe'
-    PDF_TEMPLATE_DIR = 'templates/pdf' 
\ No newline at end of file
+    PDFKIT_PATH = (
+        os.getenv('WKHTMLTOPDF_PATH')
+        or shutil.which('wkhtmltopdf')
+        or 'C:\\Program Files\\wkhtmltopdf\\bin\\wkhtmltopdf.exe'
+    )
+    PDF_BACKEND = os.getenv('PDF_BACKEND', 'wkhtmltopdf')  # 'wkhtmltopdf' ou 'weasyprint'
+    # Processos renderizadores (weasyprint) ou renderizações simultâneas do wkhtmltopdf
+    PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_MAX_CONCURRENCY = 8  # renderizações na fila + em execução (weasyprint)
+    PDF_RENDER_TIMEOUT = 60
+    # Perfil único de impressão usado em todas as renderizações
+    PDF_OPTIONS = {
+        'page-size': 'A4',
+        'margin-top': '2.5cm',
+        'margin-right': '2.5cm',
+        'margin-bottom': '2.5cm',
+        'margin-left': '2.5cm',
+        'encoding': 'UTF-8',
+        'no-outline': None,
+        'quiet': '',
+        'print-media-type': '',
+        'enable-local-file-access': '',
+        'dpi': 300,
+        'image-quality': 100,
+        'enable-smart-shrinking': '',
+        'zoom': 1.0
+    }
+    PDF_TEMPLATE_DIR = 'templates/pdf'
+    # Pacote de impressão autocontido (CSS enxuto + fontes locais embutidas), sem rede no render
+    PRINT_STYLESHEETS = [os.path.join('static', 'css', 'document.css')]
+    PRINT_TEMPLATES = [os.path.join('templates', 'print.html'), os.path.join('templates', '_legal_document.html')]
+    PRINT_FONT_DIR = os.path.join('static', 'fonts')
+    PRINT_BUNDLE_PATH = os.path.join('cache', 'print.bundle.css')
+    
+    # PDFs renderidos, endereçados pelo digest do HTML
+    ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', os.path.join('cache', 'artifacts'))
+    ARTIFACT_TTL = int(os.getenv('ARTIFACT_TTL', 7 * 24 * 3600))  # 7 dias
+    ARTIFACT_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+    ARTIFACT_GC_INTERVAL = 600  # 10 minutos 
\ No newline at end of file
@@ -1,6 +1,96 @@
+// Títulos das seções na ordem em que aparecem na peça
+const SECTION_TITLES = {
+    parties: '',
+    facts: 'DOS FATOS',
+    legal_grounds: 'DA FUNDAMENTAÇÃO JURÍDICA',
+    requests: 'DOS PEDIDOS',
+    value_cause: '',
+    city_date: '',
+    lawyer_name: '',
+    lawyer_oab: ''
+};
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Converte o texto puro de uma seção no mesmo HTML usado em preview.html
+function renderSection(name, text) {
+    const lines = text.split('\n').map(line => line.trim()).filter(Boolean);
+    const title = SECTION_TITLES[name] ? `<h2 class="section-title">${SECTION_TITLES[name]}</h2>` : '';
+    if (name === 'requests') {
+        return `${title}<ol class="document-requests">${lines.map(line => `<li>${escapeHtml(line)}</li>`).join('')}</ol>`;
+    }
+    return title + lines.map(line => `<p class="document-paragraph">${escapeHtml(line)}</p>`).join('');
+}
+
+// Envia o formulário para /generate/stream e renderiza cada seção assim que o
+// servidor a envia (Server-Sent Events sobre fetch, pois o EventSource só faz GET)
+async function streamGeneration(formData, container, handlers = {}) {
+    const response = await fetch('/generate/stream', {
+        method: 'POST',
+        body: formData,
+        headers: { 'Accept': 'text/event-stream' }
+    });
+    if (!response.ok || !response.body) {
+        let message = 'Erro ao gerar o documento.';
+        try {
+            message = (await response.json()).error || message;
+        } catch (err) {}
+        throw new Error(message);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const dispatch = (rawEvent) => {
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        });
+        const payload = data ? JSON.parse(data) : {};
+        if (event === 'section') {
+            const slot = container.querySelector(`[data-section="${payload.name}"]`);
+            if (slot) {
+                slot.innerHTML = renderSection(payload.name, payload.text);
+            }
+            if (handlers.onSection) handlers.onSection(payload);
+        } else if (event === 'done') {
+            if (handlers.onDone) handlers.onDone(payload);
+        } else if (event === 'error') {
+            throw new Error(payload.message);
+        }
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            dispatch(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+        }
+    }
+}
+
+window.streamGeneration = streamGeneration;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Get all required elements
     const form = document.getElementById('legalForm');
+    if (!form) {
+        // Página sem o formulário em abas (ex.: index.html usa apenas streamGeneration)
+        return;
+    }
     const documentTab = document.getElementById('document-tab');
     const loadingIndicator = document.getElementById('loadingIndicator');
     const documentContent = document.getElementById('documentContent');
@@ -92,7 +182,8 @@ document.addEventListener('DOMContentLoaded', function() {
             const formData = new FormData(form);
             const response = await fetch('/generate', {
                 method: 'POST',
-                body: formData
+                body: formData,
+                headers: { 'Accept': 'application/json' }
             });
 
             const result = await response.json();
@@ -127,7 +218,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Helper functions to format content
     function formatDocument(document) {
-        return `<pre class="document-text">${document}</pre>`;
+        return `<pre class="document-text">${escapeHtml(document || '')}</pre>`;
     }
 
     function formatAnalysis(analysis) {
@@ -158,7 +249,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function formatBasis(basis) {
-        return `<pre class="basis-text">${basis}</pre>`;
+        if (!basis) {
+            return '<p class="text-danger">Fundamentação indisponível no momento.</p>';
+        }
+        return `<pre class="basis-text">${escapeHtml(basis)}</pre>`;
     }
 
     function formatReview(review) {
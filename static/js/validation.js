@@ -0,0 +1,89 @@
+// Validação do formulário no navegador com o mesmo schema do servidor (utils/validation.py,
+// servido em /validation-schema e embutido na página): nenhuma requisição por tecla digitada
+
+function validationMessage(schema, name, rule) {
+    const spec = schema.fields[name];
+    let message = schema.messages[rule].replace(/\{(\w+)\}/g, (_, key) => spec[key] ?? '');
+    if (rule === 'min_length' && spec.hint) {
+        message += '. ' + spec.hint;
+    }
+    return message;
+}
+
+// Mesma ordem de regras do Schema.check do servidor; devolve a mensagem ou null
+function checkField(schema, name, value) {
+    const spec = schema.fields[name];
+    value = typeof value === 'string' ? value.trim() : '';
+    if (!value) {
+        return spec.required ? validationMessage(schema, name, 'required') : null;
+    }
+    if (spec.choices && !spec.choices.includes(value)) {
+        return validationMessage(schema, name, 'choices');
+    }
+    if (value.length < (spec.min_length || 0)) {
+        return validationMessage(schema, name, 'min_length');
+    }
+    if (spec.max_length && value.length > spec.max_length) {
+        return validationMessage(schema, name, 'max_length');
+    }
+    if (spec.forbidden && new RegExp(spec.forbidden, 'i').test(value)) {
+        return validationMessage(schema, name, 'forbidden');
+    }
+    return null;
+}
+
+function validateData(schema, data) {
+    const errors = {};
+    schema.order.forEach(name => {
+        const error = checkField(schema, name, data[name]);
+        if (error) {
+            errors[name] = error;
+        }
+    });
+    return errors;
+}
+
+function showFieldError(input, error) {
+    let feedback = input.parentElement.querySelector('.invalid-feedback');
+    if (!feedback) {
+        feedback = document.createElement('div');
+        feedback.className = 'invalid-feedback';
+        input.insertAdjacentElement('afterend', feedback);
+    }
+    feedback.textContent = error || '';
+    input.classList.toggle('is-invalid', Boolean(error));
+}
+
+// Valida o formulário inteiro e marca todos os campos com erro; devolve o objeto de erros
+function validateForm(form, schema) {
+    const errors = validateData(schema, Object.fromEntries(new FormData(form).entries()));
+    schema.order.forEach(name => {
+        if (form.elements[name]) {
+            showFieldError(form.elements[name], errors[name]);
+        }
+    });
+    return errors;
+}
+
+// Checa cada campo enquanto o usuário digita (só depois da primeira saída do campo, para não incomodar)
+function bindValidation(form, schema) {
+    schema.order.forEach(name => {
+        const input = form.elements[name];
+        if (!input) {
+            return;
+        }
+        const check = () => showFieldError(input, checkField(schema, name, input.value));
+        input.addEventListener('blur', () => {
+            input.dataset.touched = '1';
+            check();
+        });
+        input.addEventListener('input', () => {
+            if (input.dataset.touched) {
+                check();
+            }
+        });
+        input.addEventListener('change', check);
+    });
+}
+
+window.formValidation = { checkField, validateData, validateForm, bindValidation };
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config lê o ambiente na importação: backend stub e armazenamento descartável antes de qualquer import do app
+_DATA_DIR = tempfile.mkdtemp(prefix='lexgenius-tests-')
+os.environ.update({
+    'MODEL_BACKEND': 'stub',
+    'DOCUMENT_CACHE_PATH': os.path.join(_DATA_DIR, 'documents.db'),
+    'HISTORY_PATH': os.path.join(_DATA_DIR, 'history.db'),
+    'ARTIFACT_DIR': os.path.join(_DATA_DIR, 'artifacts'),
+    'JOB_QUEUE_PATH': os.path.join(_DATA_DIR, 'jobs.db'),
+    'CITATION_INDEX_PATH': os.path.join(_DATA_DIR, 'citations.idx'),
+    'LOG_FILE': os.path.join(_DATA_DIR, 'app.log'),
+    'RATELIMIT_STORAGE_URL': 'memory://',
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as lexgenius
+
+    app = lexgenius.create_app()
+    app.config.update(TESTING=True, SESSION_COOKIE_SECURE=False)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,191 @@
+def test_pdf_download_is_private(client):
+    from app import services
+
+    digest = services.artifact_store.digest(b'%PDF-1.4 teste')
+    services.artifact_store.put(digest, b'%PDF-1.4 teste')
+
+    response = client.get(f'/download/{digest}')
+    assert response.status_code == 200
+    cache_control = response.headers['Cache-Control']
+    assert 'private' in cache_control and 'no-cache' in cache_control
+    assert 'public' not in cache_control and 'max-age' not in cache_control
+
+    revalidated = client.get(f'/download/{digest}', headers={'If-None-Match': f'"{digest}"'})
+    assert revalidated.status_code == 304
+
+
+def test_failed_job_hides_the_exception(client):
+    import time
+    from app import services
+    from utils.job_queue import JOB_ERROR_MESSAGE, JOB_FAILED
+
+    def failing(job):
+        raise RuntimeError('segredo interno: /srv/chave.json')
+
+    job_id = services.job_queue.submit(failing, owner='1')
+    for _ in range(100):
+        job = services.job_queue.get(job_id)
+        if job['status'] == JOB_FAILED:
+            break
+        time.sleep(0.01)
+    payload = client.get(f'/jobs/{job_id}').get_json()
+    assert payload['status'] == JOB_FAILED
+    assert payload['error'] == JOB_ERROR_MESSAGE
+
+
+def test_jobs_are_shared_between_processes_by_default(app):
+    from config import Config
+    from utils.job_queue import SQLiteJobStore, create_job_queue
+
+    assert Config.JOB_QUEUE_BACKEND == 'sqlite'
+    assert isinstance(create_job_queue(Config).store, SQLiteJobStore)
+
+
+def test_module_level_app_is_created_on_first_access():
+    import os
+    import subprocess
+    import sys
+
+    script = (
+        "import app as lexgenius; "
+        "assert 'app' not in vars(lexgenius); "
+        "from app import app; "
+        "assert app.name == 'app' and lexgenius.app is app and 'main' in app.blueprints"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=root, check=True, timeout=60)
+
+
+FORM = dict(case_type='Agravo', parties='P' * 60, facts='F' * 60, legal_grounds='L' * 60, requests='R' * 60)
+
+
+def generate(client, **overrides):
+    from app import cache_manager
+
+    form = dict(FORM, **overrides)
+    response = client.post('/generate', data=form, headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    return cache_manager.document_key(**form)
+
+
+def test_regenerated_section_stays_in_the_owners_history(client):
+    from app import cache_manager, services
+
+    key = generate(client, facts='Fatos da regeneração. ' + 'F' * 60)
+    shared = cache_manager.get_cached_document(**dict(FORM, facts='Fatos da regeneração. ' + 'F' * 60)).to_dict()
+
+    response = client.post(f'/documents/{key}/sections/facts', json={'guidance': 'mais objetivo'})
+    assert response.status_code == 200
+    text = response.get_json()['text']
+    assert text != shared['facts']
+    assert services.document_history.get('1', key)['sections']['facts'] == text
+    # O cache compartilhado, usado por outros usuários com as mesmas entradas, não muda
+    assert cache_manager.get_cached_document(**dict(FORM, facts='Fatos da regeneração. ' + 'F' * 60)).to_dict() == shared
+
+
+def test_section_regeneration_does_not_overwrite_a_concurrent_one(client, monkeypatch):
+    from app import services
+
+    key = generate(client, facts='Fatos concorrentes. ' + 'F' * 60)
+    agent = services.gemini_agent
+    original = agent.regenerate_section
+
+    def regenerate_while_another_worker_writes(document, section, **kwargs):
+        entry = services.document_history.get('1', key)
+        services.document_history.update_sections(
+            '1', key, dict(entry['sections'], legal_grounds='Versão do outro worker.'), entry['updated_at']
+        )
+        return original(document, section, **kwargs)
+
+    monkeypatch.setattr(agent, 'regenerate_section', regenerate_while_another_worker_writes)
+    response = client.post(f'/documents/{key}/sections/facts', json={})
+
+    assert response.status_code == 409
+    assert services.document_history.get('1', key)['sections']['legal_grounds'] == 'Versão do outro worker.'
+
+
+def test_documents_of_other_users_are_not_served(client):
+    from app import services
+
+    services.document_history.record('2', 'alheio', FORM, {'facts': 'Fatos de outro usuário.'})
+
+    assert client.get('/documents/alheio').status_code == 302
+    assert client.get('/documents/alheio/docx').status_code == 302
+    assert client.post('/documents/alheio/sections/facts', json={}).status_code == 404
+    assert services.document_history.get('2', 'alheio')['sections'] == {'facts': 'Fatos de outro usuário.'}
+
+
+def sse_events(response):
+    """(event, data) of each Server-Sent Event of ``response``, checking the framing"""
+    import json
+
+    body = response.get_data(as_text=True)
+    assert body.endswith('\n\n')
+    events = []
+    for block in body[:-2].split('\n\n'):
+        event, data = block.split('\n')
+        assert event.startswith('event: ') and data.startswith('data: ')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_stream_sends_one_event_per_section_then_done(client):
+    from agents.document import SECTION_NAMES
+
+    form = dict(FORM, case_type='Petição Inicial', facts='Fatos do streaming. ' + 'F' * 60)
+    response = client.post('/generate/stream', data=form)
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = sse_events(response)
+    assert [name for name, _ in events] == ['section'] * len(SECTION_NAMES) + ['done']
+    assert [data['name'] for _, data in events[:-1]] == list(SECTION_NAMES)
+    assert all('\n' in data['text'] for _, data in events if data.get('name') == 'facts')
+    assert events[-1][1]['cached'] is False
+
+    cached = sse_events(client.post('/generate/stream', data=form))
+    assert cached[-1][1]['cached'] is True
+    assert cached[:-1] == events[:-1]
+
+
+def test_stream_failure_sends_a_generic_error_event(client, monkeypatch):
+    from app import services
+
+    def failing(**fields):
+        yield 'parties', 'Partes.'
+        raise RuntimeError('segredo interno: /srv/chave.json')
+
+    monkeypatch.setattr(services.gemini_agent, 'stream_document', failing)
+    events = sse_events(client.post('/generate/stream', data=dict(FORM, facts='Fatos com falha. ' + 'F' * 60)))
+
+    assert events == [
+        ('section', {'name': 'parties', 'text': 'Partes.'}),
+        ('error', {'message': 'Erro ao gerar o documento. Por favor, tente novamente.'}),
+    ]
+
+
+def test_generate_json_carries_the_insights_and_caches_them(client, monkeypatch):
+    from app import services
+
+    form = dict(FORM, facts='Fatos com análises. ' + 'F' * 60)
+    agent = services.gemini_agent
+    original = agent.generate_with_insights
+    calls = []
+
+    def without_analysis(**fields):
+        calls.append(fields['sections'])
+        return dict(original(**fields), analysis=None)
+
+    monkeypatch.setattr(agent, 'generate_with_insights', without_analysis)
+    first = client.post('/generate', data=form, headers={'Accept': 'application/json'}).get_json()
+    assert first['analysis'] is None and first['review']['clareza'] and first['basis']
+
+    # A passada que falhou não entra no cache: a próxima requisição a refaz sobre a minuta já gerada
+    monkeypatch.setattr(agent, 'generate_with_insights', original)
+    second = client.post('/generate', data=form, headers={'Accept': 'application/json'}).get_json()
+    assert second['analysis']['riscos'] and second['document'] == first['document']
+
+    monkeypatch.setattr(agent, 'generate_with_insights', without_analysis)
+    third = client.post('/generate', data=form, headers={'Accept': 'application/json'}).get_json()
+    assert third['analysis'] == second['analysis'] and third['review'] == second['review']
+    assert calls == [None]
@@ -0,0 +1,144 @@
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+from utils.batch import (
+    ROW_ERROR, BatchFormatError, detect_format, limit_rows, read_rows, run_batch, stream_zip
+)
+
+ROW = dict(case_type='Petição Inicial', parties='A x B', facts='Fatos.', legal_grounds='Art. 186.', requests='Pedidos.')
+
+
+def csv_bytes(*rows, header='case_type,parties,facts,legal_grounds,requests'):
+    return ('\ufeff' + header + '\n' + ''.join(','.join(row) + '\n' for row in rows)).encode('utf-8')
+
+
+def read_zip(chunks):
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    manifest = [json.loads(line) for line in archive.read('manifest.jsonl').decode('utf-8').splitlines()]
+    return archive, manifest
+
+
+def test_csv_rows_are_read_lazily_with_every_column():
+    rows = read_rows(io.BytesIO(csv_bytes(('Agravo', '"A, B"', 'F', 'L', 'R'), ('Recurso', 'C', '', '', ''))), 'csv')
+
+    assert next(rows) == dict(case_type='Agravo', parties='A, B', facts='F', legal_grounds='L', requests='R')
+    assert next(rows) == dict(case_type='Recurso', parties='C', facts='', legal_grounds='', requests='')
+    assert next(rows, None) is None
+
+
+def test_csv_without_the_required_columns_is_rejected():
+    with pytest.raises(BatchFormatError, match='facts, legal_grounds'):
+        next(read_rows(io.BytesIO(csv_bytes(('Agravo', 'A', 'R'), header='case_type,parties,requests')), 'csv'))
+
+
+def test_bad_jsonl_lines_become_row_errors():
+    lines = [json.dumps(ROW, ensure_ascii=False), '', '{quebrado', '[1, 2]', json.dumps({'case_type': 'Agravo'})]
+
+    rows = list(read_rows(io.BytesIO('\n'.join(lines).encode('utf-8')), 'jsonl'))
+
+    assert rows == [
+        ROW,
+        {'error': 'JSON inválido na linha 3'},
+        {'error': 'JSON inválido na linha 4'},
+        dict(case_type='Agravo', parties='', facts='', legal_grounds='', requests=''),
+    ]
+
+
+def test_unknown_format_is_rejected():
+    assert detect_format('lote.NDJSON') == 'jsonl'
+    assert detect_format('lote.xlsx') is None
+    with pytest.raises(BatchFormatError):
+        next(read_rows(io.BytesIO(b''), None))
+
+
+def test_long_batches_end_with_a_truncation_marker():
+    consumed = []
+
+    def rows():
+        for index in range(10):
+            consumed.append(index)
+            yield {'index': index}
+
+    limited = list(limit_rows(rows(), 3))
+
+    assert limited[:3] == [{'index': 0}, {'index': 1}, {'index': 2}]
+    assert limited[3]['status'] == 'truncated' and '3 linhas' in limited[3]['error']
+    assert consumed == [0, 1, 2, 3]
+    assert list(limit_rows(iter([{'index': 0}]), 1)) == [{'index': 0}]
+
+
+def test_results_keep_input_order_and_duplicates_share_one_call():
+    calls = []
+    lock = threading.Lock()
+
+    def process(row):
+        with lock:
+            calls.append(row['key'])
+        return {'status': 'ok', 'key': row['key']}
+
+    rows = [{'key': key} for key in 'abacbd']
+    results = list(run_batch(rows, process, lambda row: row['key'], concurrency=2))
+
+    assert [(index, result['key']) for index, _, result in results] == list(enumerate('abacbd', start=1))
+    assert sorted(calls) == ['a', 'b', 'c', 'd']
+
+
+def test_a_failing_row_gets_a_generic_error(caplog):
+    def process(row):
+        if row['key'] == 'b':
+            raise RuntimeError('segredo interno: /srv/chave.json')
+        return {'status': 'ok'}
+
+    results = list(run_batch([{'key': 'a'}, {'key': 'b'}], process, lambda row: row['key']))
+
+    assert results[1][2] == {'status': 'error', 'error': ROW_ERROR}
+    assert 'segredo interno' in caplog.text
+
+
+def test_zip_streams_pdfs_and_the_manifest(tmp_path):
+    pdf = tmp_path / 'peca.pdf'
+    pdf.write_bytes(b'%PDF-1.4 ' + b'x' * 200000)
+    results = [
+        (1, ROW, {'status': 'ok', 'digest': 'abc', 'pdf_path': str(pdf)}),
+        (2, {'error': 'JSON inválido na linha 2'}, {'status': 'invalid', 'error': 'JSON inválido na linha 2'}),
+    ]
+
+    chunks = list(stream_zip(iter(results)))
+    archive, manifest = read_zip(chunks)
+
+    assert len(chunks) > 2
+    assert archive.read('00001.pdf') == pdf.read_bytes()
+    assert manifest == [
+        {'row': 1, 'case_type': 'Petição Inicial', 'status': 'ok', 'digest': 'abc', 'file': '00001.pdf'},
+        {'row': 2, 'case_type': '', 'status': 'invalid', 'error': 'JSON inválido na linha 2'},
+    ]
+
+
+def test_batch_endpoint_marks_truncated_uploads(client, monkeypatch):
+    import app as lexgenius
+    from config import Config
+
+    digest = lexgenius.services.artifact_store.digest(b'%PDF-1.4 lote')
+    lexgenius.services.artifact_store.put(digest, b'%PDF-1.4 lote')
+    monkeypatch.setattr(lexgenius, 'render_pdf_file', lambda html: digest)
+    monkeypatch.setattr(Config, 'BATCH_MAX_ROWS', 2)
+    form = ('Petição Inicial', 'P' * 60, 'F' * 60, 'L' * 60, 'R' * 60)
+    upload = csv_bytes(form, form, form)
+
+    response = client.post('/batch', data={'file': (io.BytesIO(upload), 'lote.csv')})
+
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    archive, manifest = read_zip([response.data])
+    assert [entry['status'] for entry in manifest] == ['ok', 'ok', 'truncated']
+    assert archive.read('00002.pdf') == b'%PDF-1.4 lote'
+
+
+def test_empty_batch_upload_is_rejected(client):
+    response = client.post('/batch', data={'file': (io.BytesIO(csv_bytes()), 'lote.csv')})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'O arquivo do lote está vazio'
@@ -0,0 +1,136 @@
+import json
+import os
+import time
+
+import pytest
+
+from utils.citation_index import INVALID, NOT_FOUND, UNCHECKED, VERIFIED, CitationIndex, terms
+
+CC = {
+    'code': 'CC', 'name': 'Código Civil', 'aliases': ['CC', 'Código Civil'], 'last': 2046, 'complete': False,
+    'entries': [
+        {'number': '186', 'text': 'Aquele que, por ação ou omissão voluntária, negligência ou imprudência, violar direito '
+                                  'e causar dano a outrem, ainda que exclusivamente moral, comete ato ilícito.'},
+        {'number': '927', 'text': 'Aquele que, por ato ilícito, causar dano a outrem, fica obrigado a repará-lo.'},
+        {'number': '1.015', 'text': 'No silêncio do contrato, os administradores podem praticar todos os atos de gestão.'},
+        {'number': '2', 'text': 'A personalidade civil da pessoa começa do nascimento com vida.'},
+    ],
+}
+CPC = {
+    'code': 'CPC', 'name': 'Código de Processo Civil', 'aliases': ['CPC', 'CPC/2015'], 'last': 1072, 'complete': True,
+    'entries': [
+        {'number': '300', 'text': 'A tutela de urgência será concedida quando houver elementos que evidenciem a '
+                                  'probabilidade do direito e o perigo de dano.'},
+        {'number': '1.015', 'text': 'Cabe agravo de instrumento contra as decisões interlocutórias que versarem sobre '
+                                    'tutelas provisórias.'},
+    ],
+}
+STJ = {
+    'code': 'STJ', 'name': 'Súmulas do STJ', 'kind': 'sumula', 'aliases': ['STJ'], 'preposition': 'do',
+    'last': None, 'complete': False,
+    'entries': [{'number': '385', 'text': 'Da anotação irregular em cadastro de proteção ao crédito, não cabe '
+                                          'indenização por dano moral, quando preexistente legítima inscrição.'}],
+}
+
+
+def write_sources(directory, *sources):
+    directory.mkdir(exist_ok=True)
+    for source in sources:
+        (directory / f"{source['code'].lower()}.json").write_text(json.dumps(source, ensure_ascii=False), encoding='utf-8')
+    return str(directory)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return CitationIndex(str(tmp_path / 'citations.idx'), write_sources(tmp_path / 'sources', CC, CPC, STJ))
+
+
+def test_terms_drop_accents_stopwords_and_suffixes():
+    assert terms('A Indenização por danos MORAIS e o art. 186') == ['indeni', 'danos', 'morais']
+    assert terms('Responsabilidade responsável') == ['respon', 'respon']
+
+
+@pytest.mark.parametrize('code, number, expected', [
+    ('CC', '2', 'art. 2º do CC'),
+    ('CC', '186', 'art. 186 do CC'),
+    ('CPC', '1015', 'art. 1.015 do CPC'),
+    ('CPC', '1015-A', 'art. 1.015-A do CPC'),
+    ('CC', 'único', 'art. único do CC'),
+    ('CC', 'XV-A', 'art. XV-A do CC'),
+    ('STJ', '385', 'Súmula 385 do STJ'),
+    ('STJ', 'vinculante 4', 'Súmula vinculante 4 do STJ'),
+])
+def test_label(index, code, number, expected):
+    assert index.label(code, number) == expected
+
+
+def test_citations_in_text_are_found_and_checked(index):
+    text = ('Nos termos dos arts. 186 e 927 do Código Civil, do art. 1.015, § 1º, do CPC/2015 e da Súmula 385 do STJ; '
+            'ver ainda art. 3.000 do CC e art. 1.050 do CPC e art. 10 do CC.')
+
+    found = [(code, number) for _, code, number in index.find_citations(text)]
+    report = {item['id']: item['status'] for item in index.check({'legal_grounds': text})}
+
+    assert found[:4] == [('CC', '186'), ('CC', '927'), ('CPC', '1015'), ('CC', '3000')]
+    assert ('STJ', '385') in found
+    assert report == {
+        'art. 186 do CC': VERIFIED, 'art. 927 do CC': VERIFIED, 'art. 1.015 do CPC': VERIFIED,
+        'art. 3.000 do CC': INVALID, 'art. 1.050 do CPC': NOT_FOUND, 'art. 10 do CC': UNCHECKED,
+        'Súmula 385 do STJ': VERIFIED,
+    }
+    assert index.status('CC', 'único') == UNCHECKED
+
+
+def test_lookups_by_identifier(index):
+    assert index.get('CPC', '1.015')['text'].startswith('Cabe agravo')
+    assert index.get('CPC', '999') is None
+    assert [entry['id'] for entry in index.prefix('cc 1')] == ['art. 1.015 do CC', 'art. 186 do CC']
+    assert [entry['id'] for entry in index.prefix('art. 300 do CPC')] == ['art. 300 do CPC']
+
+
+def test_search_ranks_the_entries_sharing_the_rarest_terms_first(index):
+    results = index.search('Pedido de tutela de urgência pelo perigo de dano', k=2)
+
+    assert [entry['id'] for entry in results] == ['art. 300 do CPC', 'art. 1.015 do CPC']
+    assert len(index.search('dano', k=10)) == 4
+    assert index.search('dano', k=0) == []
+    assert index.search('palavras inexistentes no índice') == []
+
+
+def test_references_put_cited_entries_before_the_ranked_ones(index):
+    block = index.references('Tutela de urgência com base no art. 927 do Código Civil.', k=2)
+
+    assert block.splitlines()[0].startswith('- art. 927 do CC: ')
+    assert block.splitlines()[1].startswith('- art. 300 do CPC: ')
+    assert index.references('qualquer texto', k=0) == ''
+
+
+def test_written_index_is_mapped_and_versioned_by_its_sources(tmp_path):
+    sources = write_sources(tmp_path / 'sources', CC, CPC)
+    index = CitationIndex(str(tmp_path / 'citations.idx'), sources)
+    size = index.write()
+    version = index.version
+
+    mapped = CitationIndex(str(tmp_path / 'citations.idx'), sources)
+    assert (tmp_path / 'citations.idx').stat().st_size == size
+    assert mapped.version == version and len(mapped) == 6
+
+    write_sources(tmp_path / 'sources', STJ)
+    later = time.time() + 10
+    os.utime(tmp_path / 'sources' / 'stj.json', (later, later))
+    assert CitationIndex(str(tmp_path / 'citations.idx'), sources).version != version
+
+
+def test_document_key_follows_the_citation_index_version():
+    from utils.cache_manager import cache_manager
+
+    form = dict(case_type='Petição Inicial', parties='A x B', facts='Fatos.', legal_grounds='Art. 186.', requests='Pedidos.')
+    citation_version = cache_manager.citation_version
+    try:
+        cache_manager.citation_version = lambda: 'v1'
+        key = cache_manager.document_key(**form)
+        assert cache_manager.document_key(**form) == key
+        cache_manager.citation_version = lambda: 'v2'
+        assert cache_manager.document_key(**form) != key
+    finally:
+        cache_manager.citation_version = citation_version
@@ -0,0 +1,53 @@
+import asyncio
+
+from agents.concurrency import AdaptiveConcurrencyLimiter
+
+
+def test_cancelled_waiter_does_not_swallow_a_wakeup():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+        await limiter.acquire_async()  # A
+        b = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        b.cancel()
+        c = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.wait_for(c, timeout=1)
+        assert b.cancelled()
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {'limit': 1.0, 'in_flight': 1, 'waiting': 0}
+
+
+def test_wakeup_passes_on_when_the_woken_waiter_is_cancelled():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+        await limiter.acquire_async()
+        b = asyncio.ensure_future(limiter.acquire_async())
+        c = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        # B recebe a vaga, mas é cancelado antes de voltar a rodar
+        limiter.release()
+        b.cancel()
+        await asyncio.wait_for(c, timeout=1)
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {'limit': 1.0, 'in_flight': 1, 'waiting': 0}
+
+
+def test_cancelled_slot_is_released_without_changing_the_limit():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial=2, minimum=1, maximum=4)
+
+        async def call():
+            async with limiter.slot_async():
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.stats()
+
+    assert asyncio.run(scenario()) == {'limit': 2.0, 'in_flight': 0, 'waiting': 0}
@@ -0,0 +1,62 @@
+import pytest
+
+from utils.document_cache import DocumentCache, LRUCache
+
+
+class Clock:
+    """Manually advanced clock injected into the caches"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_disk_hit_keeps_its_expiry_in_memory(tmp_path, clock):
+    path = str(tmp_path / 'documents.db')
+    writer = DocumentCache(path, ttl=60, clock=clock)
+    # TTL maior no leitor: se a promoção usasse um TTL novo, a entrada sobreviveria na memória
+    reader = DocumentCache(path, ttl=600, clock=clock)
+    writer.set('chave', {'facts': 'Fatos.'})
+
+    clock.now += 30
+    assert reader.get('chave') == {'facts': 'Fatos.'}
+    assert reader.get('chave') == {'facts': 'Fatos.'}
+    assert (reader.stats()['disk_hits'], reader.stats()['memory_hits']) == (1, 1)
+
+    clock.now += 30
+    assert reader.get('chave') is None
+    assert reader.stats()['misses'] == 1
+
+
+def test_entries_expire_after_the_configured_ttl(tmp_path, clock):
+    cache = DocumentCache(str(tmp_path / 'documents.db'), ttl=60, clock=clock)
+    cache.set('chave', {'facts': 'Fatos.'})
+
+    clock.now += 59
+    assert cache.get('chave') == {'facts': 'Fatos.'}
+    assert cache.stats()['memory_hits'] == 1
+
+    clock.now += 1
+    assert cache.get('chave') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_memory_tier_evicts_the_least_recently_used(clock):
+    cache = LRUCache(max_entries=2, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+
+    assert cache.set('c', 3) == 1
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+    assert cache.set('d', 4, expires_at=clock.now + 5) == 1
+    clock.now += 5
+    assert cache.get('d') is None and len(cache) == 1
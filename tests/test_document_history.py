@@ -0,0 +1,103 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from utils import document_history
+from utils.document_history import DocumentHistory, highlight, match_query
+
+INPUTS = dict(case_type='Agravo', parties='Autor', facts='Fatos', legal_grounds='Direito', requests='Pedidos')
+
+
+def make_history(tmp_path):
+    return DocumentHistory(str(tmp_path / 'history.db'), page_size=2)
+
+
+def test_update_sections_is_a_compare_and_set(tmp_path):
+    history = make_history(tmp_path)
+    history.record('1', 'k', INPUTS, {'facts': 'original'}, pdf_digest='pdf')
+    read = history.get('1', 'k')
+
+    assert history.update_sections('1', 'k', {'facts': 'primeira'}, read['updated_at'])
+    assert not history.update_sections('1', 'k', {'facts': 'segunda'}, read['updated_at'])
+    entry = history.get('1', 'k')
+    assert entry['sections'] == {'facts': 'primeira'}
+    # O PDF antigo não corresponde mais às seções
+    assert entry['pdf_digest'] is None
+    assert not history.update_sections('2', 'k', {'facts': 'alheio'}, entry['updated_at'])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(document_history, 'time', SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def record(history, key, facts, owner='1', case_type='Agravo'):
+    history.record(owner, key, dict(INPUTS, case_type=case_type), {'facts': facts, 'lawyer_name': 'Advogado Exemplo'})
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('agrav tarifa', '"agrav"* "tarifa"*'),
+    ('  "tarifa" OR bancária* -juros NEAR(a b)', '"tarifa"* "OR"* "bancária"* "juros"* "NEAR"* "a"* "b"*'),
+    ('"\'()*:^-', ''),
+    (None, ''),
+])
+def test_match_query_keeps_only_words(text, expected):
+    assert match_query(text) == expected
+
+
+def test_search_ignores_accents_and_fts_syntax_in_the_input(tmp_path, clock):
+    history = make_history(tmp_path)
+    record(history, 'a', 'Cobrança indevida de tarifas bancárias.')
+    record(history, 'b', 'Contrato de locação residencial.')
+
+    entries, _ = history.search('1', 'tarifa BANCARIA')
+    assert [entry['key'] for entry in entries] == ['a']
+    for text in ('"tarifa', 'tarifa)', '(tarifa', '^tarifa:*', "bancária' -"):
+        entries, _ = history.search('1', text)
+        assert [entry['key'] for entry in entries] == ['a']
+    assert history.search('1', 'tarifa OR locação') == ([], False)
+    # Nome do advogado fica fora do índice
+    assert history.search('1', 'Exemplo') == ([], False)
+
+
+def test_snippet_escapes_the_document_and_marks_the_matches(tmp_path, clock):
+    history = make_history(tmp_path)
+    record(history, 'a', 'A ré cobrou <b>tarifas</b> & juros <script>alert(1)</script> sem contrato.')
+
+    entry, = history.search('1', 'tarifa')[0]
+
+    assert entry['snippet'] == (
+        'A ré cobrou &lt;b&gt;<mark>tarifas</mark>&lt;/b&gt; &amp; juros &lt;script&gt;alert(1)&lt;/script&gt; sem contrato.'
+    )
+    assert highlight('\x02x\x03 <i>') == '<mark>x</mark> &lt;i&gt;'
+
+
+def test_search_is_scoped_to_the_owner_filtered_and_paged(tmp_path, clock):
+    history = make_history(tmp_path)
+    for key in 'abc':
+        record(history, key, f'Fatos comuns do documento {key}.')
+    record(history, 'd', 'Fatos comuns de outro tipo.', case_type='Recurso')
+    record(history, 'x', 'Fatos comuns de outro usuário.', owner='2')
+
+    first, more = history.search('1')
+    second, last = history.search('1', page=2)
+    assert [entry['key'] for entry in first + second] == ['d', 'c', 'b', 'a']
+    assert more and not last
+    assert [entry['key'] for entry in history.search('1', 'comuns', case_type='Recurso')[0]] == ['d']
+    assert history.count('1') == 4 and history.count('2') == 1
+
+
+def test_index_follows_updates_and_deletes(tmp_path, clock):
+    history = make_history(tmp_path)
+    record(history, 'a', 'Contrato de locação.')
+    entry = history.get('1', 'a')
+
+    history.update_sections('1', 'a', {'facts': 'Contrato de empreitada.'}, entry['updated_at'])
+    assert history.search('1', 'locação') == ([], False)
+    assert [entry['key'] for entry in history.search('1', 'empreitada')[0]] == ['a']
+
+    assert history.delete('1', 'a') and not history.delete('1', 'a')
+    history.optimize()
+    assert history.search('1', 'empreitada') == ([], False)
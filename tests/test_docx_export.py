@@ -0,0 +1,132 @@
+import io
+import os
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+from utils.docx_export import DocxExporter
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'docx')
+
+DOCUMENT = dict(
+    parties='FULANO DE TAL, brasileiro, vem propor ação em face de <strong>EMPRESA LTDA.</strong>',
+    facts='§ 1. A ré deixou de entregar o produto.\n\nI - pagamento em 10/01/2025\na) valor de R$ 1.000,00\n'
+          'Texto com <em>ênfase</em> & <span class="x">marcação</span> e controle\x07.',
+    legal_grounds='Nos termos do art. 186 do Código Civil.',
+    requests='A citação da ré.\nA condenação ao pagamento de <b>danos morais</b>.',
+    value_cause='Dá-se à causa o valor de R$ 1.000,00.',
+    city_date='São Paulo, 14 de maio de 2025.',
+    lawyer_name='',
+    lawyer_oab='OAB/SP 123456',
+)
+
+
+def paragraphs(document_xml):
+    """(paragraph style, [(text, run style, bold, italic)]) of each paragraph of ``word/document.xml``"""
+    result = []
+    for p in ElementTree.fromstring(document_xml).iter(f'{W}p'):
+        style = p.find(f'{W}pPr/{W}pStyle').get(f'{W}val')
+        runs = []
+        for r in p.iter(f'{W}r'):
+            properties = r.find(f'{W}rPr')
+            run_style = properties.find(f'{W}rStyle') if properties is not None else None
+            runs.append((
+                r.find(f'{W}t').text,
+                run_style.get(f'{W}val') if run_style is not None else None,
+                properties is not None and properties.find(f'{W}b') is not None,
+                properties is not None and properties.find(f'{W}i') is not None,
+            ))
+        result.append((style, runs))
+    return result
+
+
+@pytest.fixture(scope='module')
+def package():
+    chunks = list(DocxExporter(TEMPLATE_DIR).stream(DOCUMENT, 'Petição Inicial', 'EXCELENTÍSSIMO SENHOR JUIZ', '14/05/2025'))
+    return chunks, zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_package_parts(package):
+    chunks, archive = package
+
+    assert len(chunks) > 1
+    assert archive.testzip() is None
+    assert archive.namelist()[0] == '[Content_Types].xml'
+    assert set(archive.namelist()) == {
+        '[Content_Types].xml', '_rels/.rels', 'docProps/core.xml', 'word/_rels/document.xml.rels',
+        'word/styles.xml', 'word/numbering.xml', 'word/document.xml',
+    }
+    for name in archive.namelist():
+        ElementTree.fromstring(archive.read(name))
+    with open(os.path.join(TEMPLATE_DIR, 'styles.xml'), 'rb') as f:
+        assert archive.read('word/styles.xml') == f.read()
+
+
+def test_every_style_used_is_defined(package):
+    _, archive = package
+    defined = {style.get(f'{W}styleId') for style in ElementTree.fromstring(archive.read('word/styles.xml')).iter(f'{W}style')}
+
+    used = set()
+    for style, runs in paragraphs(archive.read('word/document.xml')):
+        used.add(style)
+        used.update(run_style for _, run_style, _, _ in runs if run_style)
+    assert used <= defined
+
+
+def test_lines_become_styled_paragraphs(package):
+    _, archive = package
+    body = paragraphs(archive.read('word/document.xml'))
+    texts = [(style, ''.join(text for text, *_ in runs)) for style, runs in body]
+
+    assert texts[:3] == [
+        ('DocumentTitle', 'PETIÇÃO INICIAL'),
+        ('CourtHeader', 'EXCELENTÍSSIMO SENHOR JUIZ'),
+        ('DocumentParagraph', 'FULANO DE TAL, brasileiro, vem propor ação em face de EMPRESA LTDA.'),
+    ]
+    facts = texts[texts.index(('SectionTitle', 'DOS FATOS')) + 1:texts.index(('SectionTitle', 'DA FUNDAMENTAÇÃO JURÍDICA'))]
+    assert facts == [
+        ('NumberedParagraph', '§ 1. A ré deixou de entregar o produto.'),
+        ('LegalItem', 'I - pagamento em 10/01/2025'),
+        ('LegalSubitem', 'a) valor de R$ 1.000,00'),
+        ('DocumentParagraph', 'Texto com ênfase & marcação e controle.'),
+    ]
+    requests = texts[texts.index(('SectionTitle', 'DOS PEDIDOS')) + 1:][:2]
+    assert requests == [('RequestItem', 'A citação da ré.'), ('RequestItem', 'A condenação ao pagamento de danos morais.')]
+    assert ('SignatureName', '[Nome do Advogado]') in texts
+    assert texts[-1] == ('DocumentFooter', 'Data de geração: 14/05/2025')
+
+
+def test_bold_italic_and_number_runs(package):
+    _, archive = package
+    body = dict((''.join(text for text, *_ in runs), runs) for _, runs in paragraphs(archive.read('word/document.xml')))
+
+    assert body['FULANO DE TAL, brasileiro, vem propor ação em face de EMPRESA LTDA.'] == [
+        ('FULANO DE TAL, brasileiro, vem propor ação em face de ', None, False, False),
+        ('EMPRESA LTDA.', None, True, False),
+    ]
+    assert body['Texto com ênfase & marcação e controle.'] == [
+        ('Texto com ', None, False, False),
+        ('ênfase', None, False, True),
+        (' & ', None, False, False),
+        ('marcação', None, False, False),
+        (' e controle.', None, False, False),
+    ]
+    assert body['A condenação ao pagamento de danos morais.'][1] == ('danos morais', None, True, False)
+    assert body['§ 1. A ré deixou de entregar o produto.'][0] == ('§ 1.', 'ParagraphNumber', False, False)
+
+
+def test_download_is_conditional(client):
+    from app import services
+
+    services.document_history.record('1', 'docx-teste', dict(case_type='Agravo'), DOCUMENT, generation_date='14/05/2025')
+
+    response = client.get('/documents/docx-teste/docx')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert paragraphs(archive.read('word/document.xml'))[0][1][0][0] == 'AGRAVO'
+
+    revalidated = client.get('/documents/docx-teste/docx', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
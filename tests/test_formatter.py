@@ -0,0 +1,88 @@
+import os
+import re
+
+import pytest
+
+from agents.document import LegalDocument, items_html, paragraphs_html
+from agents.formatter import format_document, sanitize, sanitize_with_soup, structure_document
+
+# Saídas de referência geradas pelo formatador anterior (regex + BeautifulSoup)
+# com a data fixa abaixo; o formatador atual deve reproduzi-las byte a byte.
+# Única diferença intencional: só o atributo class sobrevive (data-x, on*...)
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'golden', 'formatter')
+GOLDEN_DATE = '1 de janeiro de 2025'
+GOLDEN_CASES = {
+    'petition_5k': 'Ação de Indenização',
+    'petition_20k': 'Ação de Cobrança',
+    'edge_cases': 'Petição Inicial',
+    'edge_cases_fast': 'Petição Inicial',
+}
+
+
+def read_golden(name, extension):
+    with open(os.path.join(GOLDEN_DIR, f'{name}.{extension}'), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', sorted(GOLDEN_CASES))
+def test_format_document_matches_golden_output(name):
+    document = read_golden(name, 'txt')
+    expected = read_golden(name, 'html')
+
+    assert format_document(document, GOLDEN_CASES[name], current_date=GOLDEN_DATE) == expected
+
+
+@pytest.mark.parametrize('name', sorted(GOLDEN_CASES))
+def test_single_pass_sanitizer_matches_soup(name):
+    markup = structure_document(read_golden(name, 'txt'))
+
+    assert sanitize(markup) == sanitize_with_soup(markup)
+
+
+def test_section_fragments_are_sanitized():
+    facts = 'O réu <script>alert(1)</script>descumpriu o contrato.\n\n...\nVide <b onclick="x()">art. 5º</b> & seguintes.'
+
+    assert paragraphs_html(facts) == (
+        '<p class="document-paragraph">O réu alert(1)descumpriu o contrato.</p>'
+        '<p class="document-paragraph">Vide art. 5º &amp; seguintes.</p>'
+    )
+    assert items_html('A citação do réu.\n<img src=x onerror=alert(1)>A condenação.') == (
+        '<li>A citação do réu.</li><li>A condenação.</li>'
+    )
+    assert LegalDocument(facts=facts).facts_html == paragraphs_html(facts)
+
+
+@pytest.mark.parametrize('markup', [
+    '<p class="document-paragraph"><span onmouseover=alert(1)>texto</span></p>',
+    '<p class="document-paragraph"><span class="citation" onclick="alert(1)" ONERROR=\'x\'>texto</span></p>',
+    '<p class="document-paragraph"><em onfocus="alert(1)" tabindex=1 autofocus>texto</em> &amp;</p>',
+    '<p class="document-paragraph"><strong style="x" id="y" title=\'"><script>\'>texto</strong><!-- c --></p>',
+])
+def test_only_allowed_classes_survive_as_attributes(markup):
+    for result in (sanitize(markup), sanitize_with_soup(markup)):
+        attributes = {attrs for _, attrs in re.findall(r'<([a-z0-9]+)([^>]*)>', result)}
+        assert attributes <= {'', ' class="document-paragraph"', ' class="citation"'}
+        assert 'texto' in result
+    assert sanitize(markup) == sanitize_with_soup(markup)
+
+
+def test_event_handlers_do_not_reach_the_preview():
+    document = LegalDocument(
+        facts='<span onmouseover=alert(1)>texto</span>',
+        requests='<li onclick="alert(1)">pedido</li>',
+        value_cause='<img src=x onerror=alert(1)>',
+        city_date='<b onclick=x>São Paulo</b>',
+    )
+
+    assert document.facts_html == '<p class="document-paragraph"><span>texto</span></p>'
+    assert document.requests_html == '<li><li>pedido</li></li>'
+    assert document.html('value_cause') == '&lt;img src=x onerror=alert(1)&gt;'
+    assert document.html('city_date') == '&lt;b onclick=x&gt;São Paulo&lt;/b&gt;'
+
+
+def test_lines_with_only_a_number_or_numeral_are_kept():
+    assert paragraphs_html('10\nI.\nIV\n...') == (
+        '<p class="document-paragraph">10</p>'
+        '<p class="document-paragraph">I.</p>'
+        '<p class="document-paragraph">IV</p>'
+    )
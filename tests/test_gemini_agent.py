@@ -0,0 +1,239 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.api_core import exceptions
+
+from agents.backends import StubBackend
+from agents.document import SECTION_NAMES
+from agents.gemini_agent import GeminiAgent, SectionStreamParser, parse_json_response
+from agents.prompts import document_template
+from agents.router import ModelRouter
+from agents.stub import stub_text
+
+FIELDS = dict(
+    case_type='Petição Inicial',
+    parties='FULANO DE TAL em face de EMPRESA EXEMPLO LTDA.',
+    facts='A ré deixou de entregar o produto comprado e pago pelo autor há mais de sessenta dias.',
+    legal_grounds='Arts. 18 e 35 do Código de Defesa do Consumidor.',
+    requests='Restituição do valor pago e indenização por danos morais.',
+)
+
+
+def make_agent(error_rate=0.0):
+    router = ModelRouter({'default': 'default-model'}, hedging=False)
+    return GeminiAgent(backend=StubBackend(error_rate=error_rate), router=router)
+
+
+def test_stream_holds_a_limiter_slot():
+    agent = make_agent()
+    stream = agent.stream_document(**FIELDS)
+    next(stream)
+    assert agent.limiter.stats()['in_flight'] == 1
+    sections = dict(stream)
+    assert sections
+    assert agent.limiter.stats()['in_flight'] == 0
+
+
+def test_throttled_stream_lowers_the_limit():
+    agent = make_agent(error_rate=1.0)
+    limit = agent.limiter.stats()['limit']
+    try:
+        list(agent.stream_document(**FIELDS))
+    except Exception:
+        pass
+    assert agent.limiter.stats() == {'limit': limit / 2, 'in_flight': 0, 'waiting': 0}
+
+
+def test_abandoned_stream_releases_its_slot():
+    agent = make_agent()
+    limit = agent.limiter.stats()['limit']
+    stream = agent.stream_document(**FIELDS)
+    next(stream)
+    stream.close()
+    assert agent.limiter.stats() == {'limit': limit, 'in_flight': 0, 'waiting': 0}
+
+
+class ScriptedBackend(StubBackend):
+    """Stub answers, but the models named in ``failing`` answer 503 and each call first waits the next of ``delays``"""
+
+    def __init__(self, failing=(), delays=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.delays = list(delays)
+        self.calls = []
+
+    def build_model(self, template, model_name=None):
+        model = super().build_model(template, model_name)
+        backend = self
+
+        class ScriptedModel:
+            async def generate_content_async(self, prompt, **options):
+                backend.calls.append(model_name)
+                await asyncio.sleep(backend.delays.pop(0) if backend.delays else 0)
+                if model_name in backend.failing:
+                    raise exceptions.ServiceUnavailable('overloaded')
+                return model.generate_content(prompt)
+
+        return ScriptedModel()
+
+
+def routed_agent(backend, **options):
+    router = ModelRouter(
+        {'fast': 'fast-model', 'default': 'default-model', 'strong': 'strong-model'},
+        fallbacks={'strong': ['default', 'fast'], 'default': ['fast']},
+        strong_case_types=['Agravo'], **options
+    )
+    return GeminiAgent(backend=backend, router=router)
+
+
+def test_throttled_strong_model_falls_back_to_default():
+    backend = ScriptedBackend(failing={'strong-model'})
+    agent = routed_agent(backend, hedging=False)
+
+    sections = agent.generate_document(**dict(FIELDS, case_type='Agravo'))
+    agent.generate_document(**dict(FIELDS, case_type='Agravo', facts=FIELDS['facts'] + ' Outra vez.'))
+
+    assert sections['parties']
+    # O modelo forte fica no fim da fila enquanto esfria
+    assert backend.calls == ['strong-model', 'default-model', 'default-model']
+    stats = agent.router.stats()
+    assert stats['document:strong']['throttled'] == 1
+    assert stats['document:default']['calls'] == 2
+
+
+def test_slow_call_is_hedged_and_the_first_answer_wins():
+    backend = ScriptedBackend(delays=[5, 0])
+    agent = routed_agent(backend, hedge_min_samples=1, hedge_min_delay=0.05, hedge_max_ratio=1.0)
+    route = agent.router.route(document_template('Petição Inicial'), 'Petição Inicial')
+    agent.router.record(route, 'default', 0.01)
+
+    started = time.monotonic()
+    sections = agent.generate_document(**FIELDS)
+
+    assert sections['parties']
+    assert time.monotonic() - started < 2
+    assert backend.calls == ['default-model', 'default-model']
+    stats = agent.router.stats()['document:default']
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
+
+
+def test_no_hedge_before_the_route_has_enough_samples():
+    backend = ScriptedBackend(delays=[0.2])
+    agent = routed_agent(backend, hedge_min_samples=5, hedge_min_delay=0.05, hedge_max_ratio=1.0)
+
+    agent.generate_document(**FIELDS)
+
+    assert backend.calls == ['default-model']
+    assert agent.router.stats()['document:default']['hedges'] == 0
+
+
+def feed_in_chunks(text, size):
+    parser = SectionStreamParser()
+    finished = []
+    for start in range(0, len(text), size):
+        finished += parser.feed(text[start:start + size])
+    return finished + parser.close()
+
+
+def test_stream_parser_does_not_depend_on_chunk_boundaries():
+    text = stub_text('document@v2', 'prompt de teste')
+    whole = feed_in_chunks(text, len(text))
+
+    assert [name for name, _ in whole] == list(SECTION_NAMES)
+    for size in (1, 2, 3, 7, 64):
+        assert feed_in_chunks(text, size) == whole
+
+
+def test_section_is_emitted_once_the_next_marker_is_complete():
+    parser = SectionStreamParser()
+
+    assert parser.feed('Texto antes do primeiro marcador\n[FAC') == []
+    assert parser.feed('TS]\nPrimeira linha\r') == []
+    assert parser.feed('\nSegunda linha\n\n[LEGAL_') == []
+    assert parser.feed('GROUNDS]') == []
+    assert parser.feed('\nArt. 186 do CC') == [('facts', 'Primeira linha\nSegunda linha')]
+    assert parser.close() == [('legal_grounds', 'Art. 186 do CC')]
+    assert parser.sections['parties'] == ''
+
+
+def test_empty_sections_and_unknown_markers_are_not_emitted():
+    parser = SectionStreamParser()
+    finished = parser.feed('[PARTIES]\n\n[FACTS]\n[OUTRO]\nfatos\n') + parser.close()
+
+    assert finished == [('facts', '[OUTRO]\nfatos')]
+
+
+class SlowBackend(StubBackend):
+    """Stub answers after ``delay`` seconds; the templates named in ``broken`` answer text that is not JSON"""
+
+    def __init__(self, delay=0.0, broken=()):
+        super().__init__()
+        self.delay = delay
+        self.broken = set(broken)
+        self.calls = []
+
+    def build_model(self, template, model_name=None):
+        model = super().build_model(template, model_name)
+        backend = self
+
+        class SlowModel:
+            async def generate_content_async(self, prompt, **options):
+                backend.calls.append(template.name)
+                await asyncio.sleep(backend.delay)
+                if template.name in backend.broken:
+                    return SimpleNamespace(text='Não consegui analisar o caso.', usage_metadata=None)
+                return model.generate_content(prompt)
+
+        return SlowModel()
+
+
+def test_parse_json_response_tolerates_fences_and_text_around():
+    assert parse_json_response('{"riscos": []}') == {'riscos': []}
+    assert parse_json_response('Segue:\n```json\n{"clareza": "boa"}\n```') == {'clareza': 'boa'}
+    with pytest.raises(ValueError):
+        parse_json_response('sem objeto')
+
+
+def test_insight_passes_overlap_with_the_draft():
+    backend = SlowBackend(delay=0.3)
+    agent = make_agent()
+    agent.backend = backend
+
+    started = time.monotonic()
+    result = agent.generate_with_insights(**FIELDS)
+    elapsed = time.monotonic() - started
+
+    # Minuta e revisão em série; análise e fundamentação em paralelo com elas (soma seria 1,2 s)
+    assert 0.6 <= elapsed < 1.0
+    assert sorted(backend.calls) == ['analysis', 'basis', 'document', 'review']
+    assert backend.calls[-1] == 'review'
+    assert set(result['analysis']) == {'pontos_fortes', 'pontos_fracos', 'riscos', 'oportunidades', 'sugestoes_melhoria'}
+    assert set(result['review']) == {'estrutura', 'clareza', 'coerencia', 'sugestoes_melhoria'}
+    assert result['basis'] and result['sections']['facts']
+    assert agent.limiter.stats()['in_flight'] == 0
+
+
+def test_failed_insight_pass_does_not_fail_the_draft():
+    backend = SlowBackend(broken={'analysis'})
+    agent = make_agent()
+    agent.backend = backend
+
+    result = agent.generate_with_insights(**FIELDS)
+
+    assert result['analysis'] is None
+    assert result['review'] is not None and result['sections']['parties']
+
+
+def test_cached_draft_is_only_reviewed():
+    backend = SlowBackend()
+    agent = make_agent()
+    agent.backend = backend
+    draft = agent.generate_document(**FIELDS)
+    backend.calls.clear()
+
+    result = agent.generate_with_insights(sections=draft, **FIELDS)
+
+    assert result['sections'] is draft
+    assert sorted(backend.calls) == ['analysis', 'basis', 'review']
@@ -0,0 +1,124 @@
+import gzip
+import os
+import re
+
+import pytest
+from flask import Response
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from utils import http_cache
+from utils.http_cache import StaticAssets, choose_encoding, compress, compress_response, etag_for
+
+BODY = '{"texto": "' + 'Dá-se à causa o valor de R$ 15.000,00. ' * 40 + '"}'
+
+
+def accept(header):
+    return parse_accept_header(header, Accept)
+
+
+@pytest.mark.parametrize('header, with_brotli, expected', [
+    ('gzip, deflate, br', True, 'br'),
+    ('gzip, deflate, br', False, 'gzip'),
+    ('br', False, None),
+    ('gzip;q=0, identity', True, None),
+    ('identity', False, None),
+    ('', False, None),
+    ('*', False, 'gzip'),
+])
+def test_encoding_negotiation(monkeypatch, header, with_brotli, expected):
+    monkeypatch.setattr(http_cache, 'brotli', object() if with_brotli else None)
+    assert choose_encoding(accept(header)) == expected
+
+
+def test_brotli_body_round_trips():
+    brotli = pytest.importorskip('brotli')
+    assert brotli.decompress(compress(BODY.encode('utf-8'), 'br')) == BODY.encode('utf-8')
+
+
+def test_gzip_is_deterministic():
+    data = BODY.encode('utf-8')
+    assert compress(data, 'gzip') == compress(data, 'gzip')
+    assert gzip.decompress(compress(data, 'gzip')) == data
+
+
+def test_response_is_compressed_and_its_etag_weakened(monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    response = Response(BODY, mimetype='application/json')
+    response.set_etag('abc')
+
+    compress_response(response, accept('gzip, br'))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert response.get_etag() == ('abc', True)
+    assert gzip.decompress(response.get_data()).decode('utf-8') == BODY
+
+
+@pytest.mark.parametrize('response', [
+    Response('curto', mimetype='text/html'),
+    Response(BODY, mimetype='application/pdf'),
+    Response(BODY, status=404, mimetype='text/html'),
+    Response(BODY, mimetype='text/html', headers={'Content-Encoding': 'gzip'}),
+    Response(iter([BODY]), mimetype='text/event-stream'),
+])
+def test_small_binary_error_encoded_and_streamed_responses_are_left_alone(response):
+    before = response.get_data() if not response.is_streamed else None
+    encoding = response.headers.get('Content-Encoding')
+
+    compress_response(response, accept('gzip'))
+
+    assert response.headers.get('Content-Encoding') == encoding
+    if before is not None:
+        assert response.get_data() == before
+
+
+def test_identity_clients_get_the_plain_body_with_vary():
+    response = compress_response(Response(BODY, mimetype='text/html'), accept('identity'))
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.vary.as_set() == {'accept-encoding'}
+    assert response.get_data(as_text=True) == BODY
+
+
+def test_etag_follows_every_part():
+    assert etag_for('k', {'a': 1, 'b': 2}) == etag_for('k', {'b': 2, 'a': 1})
+    assert etag_for('k', {'a': 1}) != etag_for('k', {'a': 2})
+
+
+def test_fingerprint_changes_with_the_content(tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'site.css').write_text('body{color:red}')
+    (tmp_path / 'secret.txt').write_text('fora da pasta')
+    assets = StaticAssets(str(static))
+
+    first = assets.fingerprint('site.css')
+    assert first == assets.fingerprint('site.css') and len(first) == 12
+    (static / 'site.css').write_text('body{color:blue}')
+    os.utime(static / 'site.css', ns=(0, 10 ** 18))
+    assert assets.fingerprint('site.css') not in (None, first)
+    assert assets.fingerprint('missing.css') is None
+    assert assets.fingerprint('../secret.txt') is None
+
+
+def test_static_url_has_the_fingerprint_and_is_cached_for_good(client):
+    from app import services
+
+    page = client.get('/login').get_data(as_text=True)
+    url = re.search(r'/static/css/[\w.-]+\.css\?v=\w+', page).group(0)
+    filename, version = url[len('/static/'):].split('?v=')
+    assert version == services.static_assets.fingerprint(filename)
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.cache_control.immutable and response.cache_control.public
+    assert response.cache_control.max_age == services.static_assets.max_age
+    with open(os.path.join(services.static_assets.folder, filename), 'rb') as f:
+        assert gzip.decompress(response.data) == f.read()
+
+    stale = client.get(f'/static/{filename}?v=antigo')
+    assert not stale.cache_control.immutable and not stale.cache_control.max_age
+
+    revalidated = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
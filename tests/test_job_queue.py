@@ -0,0 +1,75 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.job_queue import (
+    JOB_DONE, JOB_ERROR_MESSAGE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobQueue, MemoryJobStore, SQLiteJobStore,
+    create_job_queue
+)
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobStore(str(tmp_path / 'jobs.db'))
+    return MemoryJobStore()
+
+
+def abandoned(store, job_id, status=JOB_RUNNING, age=120):
+    """Job left behind by a worker that died ``age`` seconds ago"""
+    updated_at = time.time() - age
+    store.create({'id': job_id, 'owner': '1', 'status': status, 'stage': 'gemini', 'result': None, 'error': None,
+                  'created_at': updated_at, 'updated_at': updated_at})
+
+
+def wait_for(queue, job_id, status):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} is {job["status"]}')
+
+
+def test_abandoned_job_is_failed_when_read(store):
+    queue = JobQueue(store, lease=60)
+    abandoned(store, 'morto')
+    abandoned(store, 'recente', age=1)
+
+    job = queue.get('morto')
+
+    assert (job['status'], job['error'], job['stage']) == (JOB_FAILED, JOB_ERROR_MESSAGE, 'gemini')
+    assert queue.get('recente')['status'] == JOB_RUNNING
+
+
+def test_startup_sweep_fails_every_abandoned_job(tmp_path):
+    config = SimpleNamespace(JOB_QUEUE_BACKEND='sqlite', JOB_QUEUE_PATH=str(tmp_path / 'jobs.db'), JOB_RESULT_TTL=3600,
+                             JOB_API_WORKERS=1, JOB_MAX_PENDING=4, JOB_LEASE=60)
+    store = SQLiteJobStore(config.JOB_QUEUE_PATH)
+    abandoned(store, 'rodando')
+    abandoned(store, 'na-fila', status=JOB_QUEUED)
+    abandoned(store, 'recente', age=1)
+
+    create_job_queue(config)
+
+    assert [store.get(job_id)['status'] for job_id in ('rodando', 'na-fila', 'recente')] == [
+        JOB_FAILED, JOB_FAILED, JOB_RUNNING
+    ]
+
+
+def test_running_jobs_renew_their_lease(store):
+    queue = JobQueue(store, lease=0.3)
+    release = threading.Event()
+    try:
+        job_id = queue.submit(lambda job: release.wait(5) and 'ok')
+        wait_for(queue, job_id, JOB_RUNNING)
+        # Dura mais que o lease: só o heartbeat impede que seja dado como perdido
+        time.sleep(0.6)
+        assert queue.get(job_id)['status'] == JOB_RUNNING
+        release.set()
+        assert wait_for(queue, job_id, JOB_DONE)['result'] == 'ok'
+    finally:
+        release.set()
+        queue.shutdown()
@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from utils.logging_setup import AsyncQueueHandler, StderrHandler, configure_logging
+
+
+def logging_config(**overrides):
+    return SimpleNamespace(**dict(
+        LOG_FILE='', LOG_FORMAT='json', LOG_QUEUE_SIZE=100, LOG_SAMPLE_RATE=1.0, LOG_LEVEL='INFO'
+    ) | overrides)
+
+
+@pytest.fixture
+def root_logger(monkeypatch):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, 'handlers', [])
+    monkeypatch.setattr(root, 'level', root.level)
+    return root
+
+
+def queue_handler(root):
+    handler, = root.handlers
+    assert isinstance(handler, AsyncQueueHandler)
+    return handler
+
+
+def test_logs_go_to_stderr_only_by_default(root_logger, monkeypatch):
+    configure_logging(logging_config())
+    handler = queue_handler(root_logger)
+    stderr = io.StringIO()
+    monkeypatch.setattr(sys, 'stderr', stderr)
+
+    logging.getLogger('lexgenius.test').info('documento gerado')
+    handler.flush_and_stop()
+
+    assert [type(h) for h in handler.handlers] == [StderrHandler]
+    assert json.loads(stderr.getvalue())['message'] == 'documento gerado'
+
+
+def test_log_file_is_reopened_after_external_rotation(root_logger, tmp_path):
+    path = tmp_path / 'app.log'
+    configure_logging(logging_config(LOG_FILE=str(path)))
+    handler = queue_handler(root_logger)
+    file_handler = handler.handlers[1]
+    logger = logging.getLogger('lexgenius.test')
+
+    logger.warning('antes da rotação')
+    handler.flush_and_stop()
+    os.rename(path, tmp_path / 'app.log.1')
+    file_handler.handle(logging.makeLogRecord({'msg': 'depois da rotação', 'levelno': logging.WARNING}))
+
+    assert isinstance(file_handler, logging.handlers.WatchedFileHandler)
+    assert 'antes da rotação' in (tmp_path / 'app.log.1').read_text(encoding='utf-8')
+    assert 'depois da rotação' in path.read_text(encoding='utf-8')
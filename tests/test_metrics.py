@@ -0,0 +1,96 @@
+import pytest
+
+from utils.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_exposition_escapes_the_labels(registry):
+    counter = registry.counter('lexgenius_test_total', 'Test counter', ['template', 'outcome'])
+    counter.inc(template='peticao:v2', outcome='ok')
+    counter.inc(2, template='peticao:v2', outcome='ok')
+    counter.inc(outcome='erro "grave"\\\nfim')
+
+    assert registry.expose().splitlines() == [
+        '# HELP lexgenius_test_total Test counter',
+        '# TYPE lexgenius_test_total counter',
+        'lexgenius_test_total{template="peticao:v2",outcome="ok"} 3',
+        'lexgenius_test_total{template="",outcome="erro \\"grave\\"\\\\\\nfim"} 1',
+    ]
+    assert counter.value(template='peticao:v2', outcome='ok') == 3
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf(registry):
+    histogram = registry.histogram('lexgenius_test_seconds', 'Test histogram', ['stage'], buckets=(0.5, 0.1))
+    for value in (0.05, 0.1, 0.3, 2):
+        histogram.observe(value, stage='pdf')
+
+    assert registry.expose().splitlines()[2:] == [
+        'lexgenius_test_seconds_bucket{stage="pdf",le="0.1"} 2',
+        'lexgenius_test_seconds_bucket{stage="pdf",le="0.5"} 3',
+        'lexgenius_test_seconds_bucket{stage="pdf",le="+Inf"} 4',
+        'lexgenius_test_seconds_sum{stage="pdf"} 2.45',
+        'lexgenius_test_seconds_count{stage="pdf"} 4',
+    ]
+
+
+def test_gauges_are_read_at_scrape_time(registry):
+    sizes = {'memory': 1}
+    registry.gauge_callback('lexgenius_test_entries', 'Test gauge', lambda: sizes, 'tier')
+    registry.gauge_callback('lexgenius_test_ratio', 'Test gauge', lambda: 0.25)
+    sizes['disk'] = 2.0
+
+    lines = registry.expose().splitlines()
+
+    assert 'lexgenius_test_entries{tier="memory"} 1' in lines
+    assert 'lexgenius_test_entries{tier="disk"} 2' in lines
+    assert 'lexgenius_test_ratio 0.25' in lines
+    assert registry.expose().endswith('\n')
+
+
+def test_unsampled_requests_skip_the_spans_but_not_the_counters(registry):
+    histogram = registry.histogram('lexgenius_test_seconds', 'Test histogram')
+    counter = registry.counter('lexgenius_test_total', 'Test counter')
+    registry.sample_rate = 0.0
+
+    assert registry.start_request() is False
+    with registry.span(histogram):
+        counter.inc()
+
+    assert counter.value() == 1
+    assert 'lexgenius_test_seconds_count' not in registry.expose()
+
+
+def test_metrics_are_served_to_local_scrapers_without_a_token(client):
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    assert '# TYPE lexgenius_stage_seconds histogram' in response.get_data(as_text=True)
+    assert client.get('/metrics/models').get_json()['status'] == 'success'
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/metrics/models'])
+@pytest.mark.parametrize('options', [
+    dict(environ_base={'REMOTE_ADDR': '10.0.0.5'}),
+    dict(headers={'X-Forwarded-For': '203.0.113.7'}),
+    dict(headers={'Forwarded': 'for=203.0.113.7'}),
+])
+def test_remote_or_proxied_scrapers_need_the_token(client, path, options):
+    assert client.get(path, **options).status_code == 401
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/metrics/models'])
+def test_token_is_required_once_configured(client, monkeypatch, path):
+    from config import Config
+
+    monkeypatch.setattr(Config, 'METRICS_TOKEN', 's3cr3t')
+
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer errado'}).status_code == 401
+    remote = client.get(path, headers={'Authorization': 'Bearer s3cr3t', 'X-Forwarded-For': '203.0.113.7'},
+                        environ_base={'REMOTE_ADDR': '10.0.0.5'})
+    assert remote.status_code == 200
@@ -0,0 +1,65 @@
+import os
+import stat
+import time
+
+import pytest
+
+from utils.pdf_renderer import BACKENDS, PdfBackend, PdfRenderError, PdfRenderer
+
+
+class SlowBackend(PdfBackend):
+    name = 'slow-test'
+
+    def render(self, html):
+        time.sleep(float(html))
+        return b'%PDF-slow'
+
+
+def fake_wkhtmltopdf(tmp_path, body):
+    path = tmp_path / 'wkhtmltopdf'
+    path.write_text(f'#!/bin/sh\n{body}\n')
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def slow_backend():
+    BACKENDS[SlowBackend.name] = SlowBackend
+    yield SlowBackend.name
+    del BACKENDS[SlowBackend.name]
+
+
+def test_wkhtmltopdf_renders_without_process_pool(tmp_path):
+    renderer = PdfRenderer(options={'quiet': ''}, wkhtmltopdf_path=fake_wkhtmltopdf(tmp_path, 'cat'))
+
+    assert renderer.render('<p>peça</p>') == '<p>peça</p>'.encode('utf-8')
+    assert renderer._pool is None
+    assert renderer.stats.as_dict()['renders'] == 1
+
+
+def test_wkhtmltopdf_process_is_killed_on_timeout(tmp_path):
+    renderer = PdfRenderer(
+        options={'quiet': ''}, timeout=0.3, wkhtmltopdf_path=fake_wkhtmltopdf(tmp_path, 'exec sleep 5')
+    )
+
+    started = time.perf_counter()
+    with pytest.raises(PdfRenderError):
+        renderer.render('<p>peça</p>')
+
+    assert time.perf_counter() - started < 2
+    assert renderer._slots.acquire(blocking=False)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='depends on fork to share the test backend')
+def test_pool_slot_is_held_until_a_timed_out_render_finishes(slow_backend):
+    renderer = PdfRenderer(backend=slow_backend, workers=1, max_concurrency=1, timeout=0.3)
+    try:
+        assert renderer.render('0') == b'%PDF-slow'
+        with pytest.raises(PdfRenderError):
+            renderer.render('1.5')
+
+        assert not renderer._slots.acquire(blocking=False)
+        assert renderer._slots.acquire(timeout=5)
+        renderer._slots.release()
+    finally:
+        renderer.shutdown()
@@ -0,0 +1,40 @@
+import base64
+
+from utils.print_assets import build_print_bundle, font_faces
+
+
+def write(path, content):
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+def test_bundle_keeps_used_rules_and_drops_remote_imports(tmp_path):
+    css = write(tmp_path / 'document.css', (
+        "@import url('https://fonts.googleapis.com/css2?family=Playfair+Display');\n"
+        ".legal-document { font-family: 'Times New Roman', serif; }\n"
+        ".unused { color: red; }\n"
+        "@media screen { .legal-document { margin: 2rem; } }\n"
+        "@media print { .legal-document { box-shadow: none; } }\n"
+    ))
+    template = write(tmp_path / 'print.html', '<div class="legal-document"></div>')
+
+    bundle = build_print_bundle([css], [template])
+
+    assert 'googleapis' not in bundle and '@import' not in bundle
+    assert '.unused' not in bundle and 'margin' not in bundle
+    assert bundle == ".legal-document{font-family:'Times New Roman',serif}\n.legal-document{box-shadow:none}"
+
+
+def test_local_fonts_are_embedded_as_data_uris(tmp_path):
+    fonts = tmp_path / 'fonts'
+    fonts.mkdir()
+    (fonts / 'Times New Roman-Bold.ttf').write_bytes(b'bold')
+    (fonts / 'Other-Regular.ttf').write_bytes(b'other')
+
+    faces = font_faces(str(fonts), {'Times New Roman', 'serif'})
+
+    assert faces == [('@font-face', (
+        "font-family:'Times New Roman';font-style:normal;font-weight:700;"
+        f"src:url(data:font/ttf;base64,{base64.b64encode(b'bold').decode('ascii')}) format('truetype')"
+    ))]
+    assert font_faces(str(tmp_path / 'missing'), {'Times New Roman'}) == []
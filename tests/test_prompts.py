@@ -0,0 +1,76 @@
+import pytest
+
+from agents.prompts import (
+    CHARS_PER_TOKEN, TRIM_MARKER, PromptTemplate, estimate_tokens, fit_fields, trim_text
+)
+
+WORDS = ' '.join(f'palavra{i:03d}' for i in range(200))
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens('') == estimate_tokens(None) == 0
+    assert estimate_tokens('a') == 1
+    assert estimate_tokens('a' * CHARS_PER_TOKEN) == 1
+    assert estimate_tokens('a' * (CHARS_PER_TOKEN + 1)) == 2
+
+
+def test_short_text_is_not_trimmed():
+    assert trim_text('Fatos breves.', 10) == 'Fatos breves.'
+
+
+def test_trimmed_text_keeps_whole_words_at_both_ends():
+    trimmed = trim_text(WORDS, 100)
+
+    head, tail = trimmed.split(TRIM_MARKER)
+    assert len(trimmed) <= 100 * CHARS_PER_TOKEN
+    assert WORDS.startswith(head) and WORDS.endswith(tail)
+    assert set(head.split() + tail.split()) <= set(WORDS.split())
+    # A maior parte do orçamento fica com o início do texto
+    assert len(head) > 2 * len(tail)
+
+
+def test_budget_smaller_than_the_marker_cuts_the_text():
+    assert trim_text(WORDS, 1) == WORDS[:CHARS_PER_TOKEN]
+    assert trim_text(WORDS, 0) == ''
+
+
+def test_fields_within_the_budget_are_kept():
+    fields = dict(parties='A x B', facts='Fatos.', requests='Pedidos.')
+
+    fitted, trimmed = fit_fields(fields, 100)
+
+    assert fitted == fields and fitted is not fields
+    assert trimmed == []
+
+
+def test_only_the_largest_fields_are_trimmed():
+    fields = dict(parties='A x B', facts=WORDS, legal_grounds=WORDS[:800], requests='Indenização.')
+
+    fitted, trimmed = fit_fields(fields, 300)
+
+    assert list(fitted) == list(fields)
+    assert sorted(trimmed) == ['facts', 'legal_grounds']
+    assert fitted['parties'] == 'A x B' and fitted['requests'] == 'Indenização.'
+    assert all(TRIM_MARKER in fitted[name] for name in trimmed)
+    assert sum(estimate_tokens(text) for text in fitted.values()) <= 300
+
+
+def test_a_field_below_its_share_is_kept_whole():
+    fields = dict(facts=WORDS, legal_grounds=WORDS[:400])
+
+    fitted, trimmed = fit_fields(fields, 300)
+
+    assert trimmed == ['facts']
+    assert fitted['legal_grounds'] == WORDS[:400]
+    assert sum(estimate_tokens(text) for text in fitted.values()) <= 300
+
+
+@pytest.mark.parametrize('max_input_tokens, expected', [(None, []), (50, ['facts'])])
+def test_render_trims_to_the_input_budget(max_input_tokens, expected):
+    template = PromptTemplate('test', '1', 'Instruções.', '[FACTS]\n{facts}\n[PARTIES]\n{parties}')
+
+    prompt, trimmed = template.render(max_input_tokens=max_input_tokens, facts=WORDS, parties='A x B')
+
+    assert trimmed == expected
+    assert prompt.endswith('[PARTIES]\nA x B')
+    assert (WORDS in prompt) == (not expected)
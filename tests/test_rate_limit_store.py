@@ -0,0 +1,97 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from utils import rate_limit_store
+from utils.rate_limit_store import LoginThrottle, SQLiteStorage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit_store, 'time', SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(f'sqlite:///{tmp_path}/ratelimit.db')
+
+
+def test_counter_restarts_after_its_window(storage, clock):
+    assert [storage.incr('k', 60) for _ in range(3)] == [1, 2, 3]
+    assert storage.get('k') == 3 and storage.get_expiry('k') == 1060
+
+    clock.now += 59
+    assert storage.incr('k', 60) == 4
+    clock.now += 1
+    assert storage.get('k') == 0
+    assert storage.incr('k', 60) == 1 and storage.get_expiry('k') == 1120
+
+
+def test_elastic_expiry_extends_the_window_on_each_hit(storage, clock):
+    storage.incr('k', 60, elastic_expiry=True)
+    clock.now += 50
+    storage.incr('k', 60, elastic_expiry=True)
+    clock.now += 50
+
+    assert storage.get('k') == 2
+    assert storage.get_expiry('k') == 1110
+
+
+def test_moving_window_admits_up_to_the_limit(storage, clock):
+    assert [storage.acquire_entry('k', 2, 60) for _ in range(3)] == [True, True, False]
+    assert storage.get_moving_window('k', 2, 60) == (1000, 2)
+    clock.now += 61
+    assert storage.acquire_entry('k', 2, 60)
+    assert not storage.acquire_entry('k', 2, 60, amount=3)
+
+
+def test_login_is_blocked_after_max_attempts_until_the_window_passes(storage, clock):
+    throttle = LoginThrottle(storage, max_attempts=3, window=900)
+
+    assert [throttle.attempt('10.0.0.1') for _ in range(4)] == [True, True, True, False]
+    assert throttle.attempt('10.0.0.2')
+    # Tentativas durante o bloqueio estendem a janela
+    clock.now += 899
+    assert not throttle.attempt('10.0.0.1')
+    clock.now += 900
+    assert throttle.attempt('10.0.0.1')
+
+    throttle.reset('10.0.0.1')
+    assert storage.get('login/10.0.0.1') == 0
+
+
+def test_concurrent_attempts_never_exceed_the_limit(storage):
+    throttle = LoginThrottle(storage, max_attempts=3, window=900)
+    results = []
+    start = threading.Barrier(12)
+
+    def attempt():
+        start.wait()
+        results.append(throttle.attempt('10.0.0.1'))
+
+    threads = [threading.Thread(target=attempt) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 9 + [True] * 3
+
+
+def test_login_view_blocks_the_fourth_attempt(app):
+    from config import Config
+
+    client = app.test_client()
+    form = dict(username=Config.DEFAULT_USERNAME, password='errada')
+    environ = {'REMOTE_ADDR': '10.9.9.9'}
+    for _ in range(Config.LOGIN_MAX_ATTEMPTS):
+        page = client.post('/login', data=form, environ_base=environ, follow_redirects=True).get_data(as_text=True)
+        assert 'Usuário ou senha incorretos' in page
+
+    page = client.post(
+        '/login', data=dict(form, password=Config.DEFAULT_PASSWORD), environ_base=environ, follow_redirects=True
+    ).get_data(as_text=True)
+    assert 'Muitas tentativas de login' in page
@@ -0,0 +1,45 @@
+from agents.prompts import ANALYSIS_TEMPLATE, REVIEW_TEMPLATE, document_template
+from agents.router import create_model_router, document_input_tokens
+from config import Config
+
+SHORT_FORM = dict(parties='A x B', facts='Fatos breves do caso.', legal_grounds='Art. 186 do CC.', requests='Indenização.')
+
+
+def test_documents_are_never_downgraded_by_default():
+    router = create_model_router(Config)
+    tokens = document_input_tokens(**SHORT_FORM)
+    assert router.first_model(document_template('Petição Inicial'), 'Petição Inicial', tokens) == Config.GEMINI_MODEL
+    assert router.first_model(document_template('Contestação'), 'Contestação', tokens) == Config.GEMINI_MODEL
+
+
+def test_auxiliary_passes_go_to_the_fast_model():
+    router = create_model_router(Config)
+    assert router.first_model(ANALYSIS_TEMPLATE, 'Petição Inicial', 10) == Config.GEMINI_FAST_MODEL
+    assert router.first_model(REVIEW_TEMPLATE, 'Agravo', 10) == Config.GEMINI_FAST_MODEL
+
+
+def test_strong_tier_is_opt_in(monkeypatch):
+    agravo = document_template('Agravo')
+    assert create_model_router(Config).first_model(agravo, 'Agravo', 100000) == Config.GEMINI_MODEL
+
+    monkeypatch.setattr(Config, 'MODEL_STRONG_CASE_TYPES', ['Agravo'])
+    monkeypatch.setattr(Config, 'MODEL_STRONG_MIN_INPUT_TOKENS', 3000)
+    router = create_model_router(Config)
+    assert router.first_model(agravo, 'Agravo', 10) == Config.GEMINI_STRONG_MODEL
+    assert router.first_model(document_template('Contestação'), 'Contestação', 3000) == Config.GEMINI_STRONG_MODEL
+    assert router.first_model(document_template('Contestação'), 'Contestação', 2999) == Config.GEMINI_MODEL
+    assert router.route(agravo, 'Agravo').chain == ('strong', 'default', 'fast')
+
+
+def test_document_cache_key_follows_the_routed_model():
+    from utils.cache_manager import cache_manager
+
+    key = lambda case_type: cache_manager.document_key(case_type, **SHORT_FORM)  # noqa: E731
+    before = {case_type: key(case_type) for case_type in ('Petição Inicial', 'Agravo')}
+    strong_case_types = cache_manager.router.strong_case_types
+    cache_manager.router.strong_case_types = frozenset(['Agravo'])
+    try:
+        assert key('Agravo') != before['Agravo']
+        assert key('Petição Inicial') == before['Petição Inicial']
+    finally:
+        cache_manager.router.strong_case_types = strong_case_types
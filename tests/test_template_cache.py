@@ -0,0 +1,80 @@
+from utils.template_cache import TemplateCache, make_template, canonicalize
+
+
+class DictStore:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def document_key(case_type, parties, facts, legal_grounds, requests):
+    return '|'.join((case_type, parties, facts, legal_grounds, requests))
+
+
+def request_for(name, cpf, amount):
+    return dict(
+        case_type='Petição Inicial',
+        parties=f'{name}, CPF {cpf}, em face de BANCO EXEMPLO S.A.',
+        facts=f'{name} teve descontado indevidamente o valor de {amount} em sua conta.',
+        legal_grounds='Art. 42 do CDC.',
+        requests=f'Restituição em dobro de {amount}.',
+    )
+
+
+def document_for(name, cpf, amount, extra=''):
+    return {
+        'parties': f'{name}, CPF {cpf}, em face de BANCO EXEMPLO S.A.',
+        'facts': f'O autor, {name}, sofreu desconto de {amount}.{extra}',
+        'legal_grounds': 'Aplica-se o art. 42 do CDC.',
+        'requests': f'A restituição em dobro de {amount}.',
+        'value_cause': f'Dá-se à causa o valor de {amount}.',
+        'city_date': 'São Paulo, 1 de março de 2024',
+        'lawyer_name': '',
+        'lawyer_oab': '',
+    }
+
+
+def test_fully_traced_template_is_reused():
+    cache = TemplateCache(DictStore(), document_key)
+    joao = request_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00')
+    assert cache.put(document=document_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00'), **joao) == 0
+
+    maria = request_for('MARIA SOUZA', '987.654.321-00', 'R$ 800,00')
+    document = cache.get(**maria)
+    assert document is not None
+    assert 'MARIA SOUZA' in document['parties']
+    assert 'R$ 800,00' in document['value_cause']
+    assert 'JOÃO' not in ''.join(document.values()) and '1.500' not in ''.join(document.values())
+
+
+def test_untraced_amount_is_never_reused():
+    # Um total calculado pelo modelo não vem da entrada e seria copiado para outro cliente
+    cache = TemplateCache(DictStore(), document_key)
+    joao = request_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00')
+    document = document_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00', extra=' Ao todo, totalizando R$ 3.000,00.')
+    assert cache.put(document=document, **joao) > 0
+    assert cache.get(**request_for('MARIA SOUZA', '987.654.321-00', 'R$ 800,00')) is None
+
+
+def test_untraced_value_cause_is_never_reused():
+    _, entities = canonicalize(request_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00'))
+    document = document_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00')
+    document['value_cause'] = 'Dá-se à causa o valor de R$ 13.000,00.'
+    _, residuals = make_template(document, entities)
+    assert residuals == 1
+
+
+def test_legacy_confidence_entries_are_refused():
+    store = DictStore()
+    cache = TemplateCache(store, document_key)
+    joao = request_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00')
+    cache.put(document=document_for('JOÃO DA SILVA', '123.456.789-00', 'R$ 1.500,00'), **joao)
+    for entry in store.entries.values():
+        entry.pop('residuals')
+        entry['confidence'] = 0.94
+    assert cache.get(**request_for('MARIA SOUZA', '987.654.321-00', 'R$ 800,00')) is None
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.validation import GENERATION_FIELDS, Schema, create_generation_schema, generation_fields
+
+LIMITS = SimpleNamespace(MIN_TEXT_LENGTH=10, MAX_TEXT_LENGTH=40, ALLOWED_CASE_TYPES=['Petição Inicial', 'Agravo'])
+VALID = dict(case_type='Agravo', parties='Fulano x Beltrano', facts='Fatos do caso.', legal_grounds='Art. 186 do CC.',
+             requests='Indenização.')
+
+
+@pytest.fixture
+def schema():
+    return create_generation_schema(LIMITS)
+
+
+@pytest.mark.parametrize('name, value, message', [
+    ('case_type', '', 'O campo Tipo de peça não pode estar vazio'),
+    ('case_type', 'Habeas Corpus', 'Tipo de peça inválido'),
+    ('facts', '   \n ', 'O campo Fatos não pode estar vazio'),
+    ('facts', None, 'O campo Fatos não pode estar vazio'),
+    ('facts', 'Curto', 'O campo Fatos deve ter pelo menos 10 caracteres'),
+    ('parties', 'A x B', 'O campo Partes Envolvidas deve ter pelo menos 10 caracteres. '
+                         'Descreva detalhadamente as partes envolvidas no processo.'),
+    ('requests', 'R' * 41, 'O campo Pedidos não pode ter mais que 40 caracteres'),
+    ('legal_grounds', 'Ver <SCRIPT>alert(1)</script>', 'O campo Fundamentação Jurídica contém caracteres não permitidos'),
+    ('legal_grounds', 'Link javascript:alert(1)', 'O campo Fundamentação Jurídica contém caracteres não permitidos'),
+    ('legal_grounds', '<img src=x onerror =alert(1)>', 'O campo Fundamentação Jurídica contém caracteres não permitidos'),
+])
+def test_check_reports_the_first_failing_rule(schema, name, value, message):
+    assert schema.check(name, value) == message
+
+
+def test_check_strips_the_value_before_the_length_rules(schema):
+    assert schema.check('facts', '   ' + 'F' * 40 + '   ') is None
+    assert schema.check('facts', ' ' * 20 + 'F' * 9) is not None
+    # Palavras comuns que contêm "on" não são atributos de evento
+    assert schema.check('facts', 'Condenação e ônus da prova.') is None
+
+
+def test_optional_fields_may_be_empty():
+    schema = Schema({'notes': dict(label='Notas', min_length=5)})
+
+    assert schema.check('notes', '') is None
+    assert schema.validate({}) == ({'notes': ''}, {})
+
+
+def test_validate_reports_every_error_and_strips_the_values(schema):
+    values, errors = schema.validate(dict(VALID, parties='  Fulano x Beltrano  ', facts='', requests='x', extra='ignorado'))
+
+    assert values == dict(case_type='Agravo', parties='Fulano x Beltrano', legal_grounds='Art. 186 do CC.')
+    assert list(errors) == ['facts', 'requests']
+    assert Schema.summary(errors) == (
+        'O campo Fatos não pode estar vazio; O campo Pedidos deve ter pelo menos 10 caracteres'
+    )
+    assert schema.validate(VALID) == (VALID, {})
+
+
+def test_json_keeps_the_field_order_and_the_version_follows_the_rules(schema):
+    data = schema.as_json()
+
+    assert data['order'] == ['case_type', *GENERATION_FIELDS]
+    assert data['fields']['facts']['max_length'] == 40
+    assert data['messages']['forbidden'] == 'O campo {label} contém caracteres não permitidos'
+    assert create_generation_schema(LIMITS).version == schema.version
+    assert create_generation_schema(SimpleNamespace(**dict(vars(LIMITS), MAX_TEXT_LENGTH=50))).version != schema.version
+    assert len(schema.version) == 16
+
+
+def test_rules_come_from_the_config_limits():
+    fields = generation_fields(LIMITS)
+
+    assert fields['case_type']['choices'] == ['Petição Inicial', 'Agravo']
+    assert {fields[name]['min_length'] for name in GENERATION_FIELDS} == {10}
+
+
+def test_schema_endpoint_is_conditional(client):
+    from app import generation_schema
+
+    response = client.get('/validation-schema')
+    assert response.get_json() == generation_schema.as_json()
+    assert response.headers['ETag'] == f'"{generation_schema.version}"'
+
+    revalidated = client.get('/validation-schema', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_validate_endpoint_returns_every_error(client):
+    response = client.post('/validate', json={'case_type': 'Agravo', 'facts': 'curto'})
+
+    payload = response.get_json()
+    assert payload['valid'] is False
+    assert set(payload['errors']) == {'parties', 'facts', 'legal_grounds', 'requests'}
+    assert client.post('/validate', data='não é JSON').get_json() == {'valid': False, 'message': 'Dados inválidos', 'errors': {}}
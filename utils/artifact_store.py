@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ArtifactStore:
+    """Content-addressed store for rendered PDFs.
+
+    Each artifact is keyed by the SHA-256 of the HTML it was rendered from,
+    so identical documents are rendered once and every later request is a
+    plain file read. Files are sharded by the first two hex digits of the
+    digest; the modification time doubles as the last access time used by
+    the garbage collector.
+    """
+
+    def __init__(self, root, ttl=None, max_bytes=None, gc_interval=600, suffix='.pdf'):
+        self.root = os.path.abspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self.suffix = suffix
+        self._gc_thread = None
+        self._gc_lock = threading.Lock()
+
+    @staticmethod
+    def digest(content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def _path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest + self.suffix)
+
+    def path(self, digest):
+        """Absolute path of a stored artifact, or None if it does not exist"""
+        if not digest or not _DIGEST_RE.match(digest):
+            return None
+        path = self._path_for(digest)
+        return path if os.path.isfile(path) else None
+
+    def get_or_create(self, source, render):
+        """Return the digest for ``source``, calling ``render(source)`` only if it is not stored yet"""
+        digest = self.digest(source)
+        path = self._path_for(digest)
+        if os.path.isfile(path):
+            self._touch(path)
+            return digest
+        self.put(digest, render(source))
+        return digest
+
+    def put(self, digest, data):
+        """Store ``data`` atomically under ``digest``"""
+        path = self._path_for(digest)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def collect_garbage(self):
+        """Delete expired artifacts, then the least recently used ones above the size quota"""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        entries = []
+        removed = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                # Temporários órfãos de escritas interrompidas
+                expired = name.endswith('.tmp') and now - stat.st_mtime > 3600
+                if self.ttl and now - stat.st_mtime > self.ttl:
+                    expired = True
+                if expired:
+                    removed += self._remove(path)
+                elif name.endswith(self.suffix):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        if self.max_bytes:
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+
+        if removed:
+            logger.info(f"Artifact GC removed {removed} files")
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def start_background_gc(self):
+        """Run :meth:`collect_garbage` every ``gc_interval`` seconds in a daemon thread"""
+        with self._gc_lock:
+            if self._gc_thread is not None:
+                return
+            self._gc_thread = threading.Thread(target=self._gc_loop, name='artifact-gc', daemon=True)
+            self._gc_thread.start()
+
+    def _gc_loop(self):
+        while True:
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logger.error(f"Artifact GC failed: {str(e)}")
+            time.sleep(self.gc_interval)
+
+
+def create_artifact_store(config):
+    """Build the artifact store configured in ``Config``"""
+    return ArtifactStore(
+        config.ARTIFACT_DIR,
+        ttl=config.ARTIFACT_TTL,
+        max_bytes=config.ARTIFACT_MAX_BYTES,
+        gc_interval=config.ARTIFACT_GC_INTERVAL
+    )
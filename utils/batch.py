@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BATCH_COLUMNS = ['case_type', 'parties', 'facts', 'legal_grounds', 'requests']
+ROW_ERROR = 'Erro ao gerar a peça desta linha. Tente novamente.'
+
+
+class BatchFormatError(ValueError):
+    """Raised when the uploaded batch file cannot be parsed"""
+
+
+def read_rows(stream, fmt):
+    """Lazily yield row dicts from a binary CSV or JSONL stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = [column for column in BATCH_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise BatchFormatError(f"Colunas ausentes no CSV: {', '.join(missing)}")
+        for row in reader:
+            yield {column: (row.get(column) or '') for column in BATCH_COLUMNS}
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            if not isinstance(row, dict):
+                # Uma linha ruim não derruba o lote inteiro; vira erro no manifesto
+                yield {'error': f"JSON inválido na linha {line_number}"}
+                continue
+            yield {column: str(row.get(column) or '') for column in BATCH_COLUMNS}
+    else:
+        raise BatchFormatError("Formato não suportado; use CSV ou JSONL")
+
+
+def limit_rows(rows, max_rows):
+    """Yield at most ``max_rows`` rows; if the batch is longer, a last row marks it as truncated.
+
+    The rows past the limit are not read, so the marker does not say how
+    many were dropped.
+    """
+    for index, row in enumerate(rows):
+        if index == max_rows:
+            yield {'status': 'truncated', 'error': f"Lote limitado a {max_rows} linhas; as linhas seguintes não foram processadas"}
+            return
+        yield row
+
+
+def detect_format(filename):
+    """Infer the batch format from the file extension"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension)
+
+
+def run_batch(rows, process_row, key_func, concurrency=4):
+    """Process rows on a bounded thread pool and yield ``(index, row, result)`` in input order.
+
+    At most ``2 * concurrency`` rows are in flight, so memory does not grow
+    with the size of the batch. Identical rows in flight share one call
+    (``key_func`` decides identity); later duplicates are expected to be
+    answered by the document cache inside ``process_row``.
+    """
+    window = deque()
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as pool:
+        for index, row in enumerate(rows, start=1):
+            key = key_func(row)
+            future = in_flight.get(key)
+            if future is None:
+                future = pool.submit(process_row, row)
+                in_flight[key] = future
+            window.append((index, row, key, future))
+            if len(window) >= 2 * concurrency:
+                yield _pop_result(window, in_flight)
+        while window:
+            yield _pop_result(window, in_flight)
+
+
+def _pop_result(window, in_flight):
+    index, row, key, future = window.popleft()
+    if in_flight.get(key) is future and not any(item[3] is future for item in window):
+        del in_flight[key]
+    try:
+        result = future.result()
+    except Exception as e:
+        # O detalhe fica no log; o manifesto vai para quem enviou o lote
+        logger.error(f"Batch row {index} failed: {str(e)}")
+        result = {'status': 'error', 'error': ROW_ERROR}
+    return index, row, result
+
+
+class StreamBuffer(io.RawIOBase):
+    """Write-only, non seekable sink that hands written bytes back to a generator"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(results, manifest_name='manifest.jsonl'):
+    """Stream a ZIP of the generated PDFs plus a JSONL manifest.
+
+    ``results`` yields ``(index, row, result)`` where ``result`` may carry a
+    ``pdf_path`` on disk. PDFs are copied into the archive in chunks and the
+    manifest is spooled to a temporary file, so memory stays flat.
+    """
+    buffer = StreamBuffer()
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8') as manifest:
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for index, row, result in results:
+                entry = {'row': index, 'case_type': row.get('case_type', '')}
+                entry.update({k: v for k, v in result.items() if k != 'pdf_path'})
+                pdf_path = result.get('pdf_path')
+                if pdf_path:
+                    entry['file'] = f'{index:05d}.pdf'
+                    with open(pdf_path, 'rb') as source, archive.open(entry['file'], mode='w') as target:
+                        while True:
+                            chunk = source.read(64 * 1024)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+                            yield from drain(buffer)
+                manifest.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                yield from drain(buffer)
+
+            manifest.seek(0)
+            with archive.open(manifest_name, mode='w') as target:
+                for line in manifest:
+                    target.write(line.encode('utf-8'))
+        yield from drain(buffer)
+
+
+def drain(buffer):
+    """Yield the bytes written to ``buffer`` since the last call, if any"""
+    data = buffer.pop()
+    if data:
+        yield data
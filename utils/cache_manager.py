@@ -1,7 +1,17 @@
+from flask import request
 from flask_caching import Cache
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from limits.storage import storage_from_string
 from config import Config
+from utils.document_cache import DocumentCache, make_cache_key
+from utils.template_cache import TemplateCache
+# Registra o esquema sqlite:// no limits antes de o Limiter resolver o storage_uri
+from utils.rate_limit_store import LoginThrottle
+from utils.metrics import RATE_LIMIT_REJECTIONS
+from agents.document import LegalDocument
+from agents.prompts import document_template
+from agents.router import create_model_router, document_input_tokens
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,8 +25,25 @@ class CacheManager:
         self.limiter = Limiter(
             key_func=get_remote_address,
             default_limits=[Config.RATELIMIT_DEFAULT],
-            storage_uri=Config.RATELIMIT_STORAGE_URL
+            storage_uri=Config.RATELIMIT_STORAGE_URL,
+            on_breach=self._on_rate_limit_breach
         )
+        self.login_throttle = LoginThrottle(
+            storage_from_string(Config.RATELIMIT_STORAGE_URL),
+            max_attempts=Config.LOGIN_MAX_ATTEMPTS,
+            window=Config.LOGIN_LOCKOUT_SECONDS
+        )
+        self.documents = DocumentCache(
+            Config.DOCUMENT_CACHE_PATH,
+            ttl=Config.DOCUMENT_CACHE_TTL,
+            memory_entries=Config.DOCUMENT_CACHE_MEMORY_ENTRIES,
+            max_bytes=Config.DOCUMENT_CACHE_MAX_BYTES
+        )
+        # Só decide o modelo de cada pedido, para a chave do cache (as chamadas usam o router do agente)
+        self.router = create_model_router(Config)
+        self.templates = TemplateCache(self.documents, self.document_key) if Config.TEMPLATE_CACHE else None
+        # Versão do índice cujos dispositivos vão no prompt da peça (ver create_app); None fica fora da chave
+        self.citation_version = None
         if app is not None:
             self.init_app(app)
 
@@ -24,32 +51,85 @@ class CacheManager:
         """Initialize the cache and limiter with the Flask app"""
         self.cache.init_app(app)
         self.limiter.init_app(app)
-        logger.info("Cache and rate limiter initialized")
+        logger.debug("Cache and rate limiter initialized")
+
+    @staticmethod
+    def _on_rate_limit_breach(request_limit):
+        """Count limiter rejections per endpoint"""
+        RATE_LIMIT_REJECTIONS.inc(endpoint=request.endpoint or '')
+
+    def document_key(self, case_type, parties, facts, legal_grounds, requests):
+        """Stable cache key for a generation request, including the model it is routed to"""
+        prompt_version = f"{Config.GEMINI_PROMPT_VERSION}:{document_template(case_type).key}"
+        if self.citation_version is not None:
+            # Recompilar o índice muda os dispositivos de referência enviados no prompt
+            prompt_version += f":{self.citation_version()}"
+        return make_cache_key(
+            case_type, parties, facts, legal_grounds, requests,
+            model=self.router.first_model(
+                document_template(case_type), case_type, document_input_tokens(parties, facts, legal_grounds, requests)
+            ),
+            # Mudar o template do tipo de peça invalida apenas os documentos daquele tipo
+            prompt_version=prompt_version
+        )
 
     def cache_document(self, case_type, parties, facts, legal_grounds, requests, document):
         """Cache a document with its parameters"""
-        cache_key = f"doc_{hash(f'{case_type}{parties}{facts}{legal_grounds}{requests}')}"
-        self.cache.set(cache_key, document)
+        cache_key = self.document_key(case_type, parties, facts, legal_grounds, requests)
+        self.documents.set(cache_key, document)
         logger.debug(f"Document cached with key: {cache_key}")
+        if self.templates is not None:
+            self.templates.put(case_type, parties, facts, legal_grounds, requests, document)
         return cache_key
 
     def get_cached_document(self, case_type, parties, facts, legal_grounds, requests):
         """Retrieve a cached document"""
-        cache_key = f"doc_{hash(f'{case_type}{parties}{facts}{legal_grounds}{requests}')}"
-        document = self.cache.get(cache_key)
-        if document:
-            logger.debug(f"Document retrieved from cache: {cache_key}")
+        cache_key = self.document_key(case_type, parties, facts, legal_grounds, requests)
+        document = self.documents.get(cache_key)
+        if document is None:
+            return self._get_templated_document(cache_key, case_type, parties, facts, legal_grounds, requests)
+        logger.debug(f"Document retrieved from cache: {cache_key}")
+        if not isinstance(document, LegalDocument):
+            # Veio do disco como dict: a instância vai para a memória para reaproveitar o HTML já renderizado
+            document = LegalDocument.from_mapping(document)
+            self.documents.memory.set(cache_key, document)
+        return document
+
+    def _get_templated_document(self, cache_key, case_type, parties, facts, legal_grounds, requests):
+        """Document rebuilt from the template of a request with the same skeleton, or None"""
+        if self.templates is None:
+            return None
+        document = self.templates.get(case_type, parties, facts, legal_grounds, requests)
+        if document is not None:
+            logger.info(f"Document rebuilt from a cached template: {cache_key}")
+            self.documents.set(cache_key, document)
         return document
 
+    def cache_insights(self, case_type, parties, facts, legal_grounds, requests, insights):
+        """Cache the analysis, basis and review passes of a generation request"""
+        cache_key = 'insights:' + self.document_key(case_type, parties, facts, legal_grounds, requests)
+        self.documents.set(cache_key, insights)
+        return cache_key
+
+    def get_cached_insights(self, case_type, parties, facts, legal_grounds, requests):
+        """Retrieve the cached analysis, basis and review passes"""
+        return self.documents.get('insights:' + self.document_key(case_type, parties, facts, legal_grounds, requests))
+
     def clear_cache(self):
         """Clear all cached documents"""
         self.cache.clear()
+        self.documents.clear()
         logger.info("Document cache cleared")
 
+    def document_cache_stats(self):
+        """Hit/miss counters of the document cache"""
+        return self.documents.stats()
+
 # Create global instances
 cache_manager = CacheManager()
 cache = cache_manager.cache
 limiter = cache_manager.limiter
+login_throttle = cache_manager.login_throttle
 
 def init_cache(app):
     """Initialize cache with Flask app"""
@@ -65,4 +145,9 @@ def get_cached_document(case_type, parties, facts, legal_grounds, requests):
 
 def clear_document_cache():
     """Clear document cache"""
-    cache_manager.clear_cache() 
\ No newline at end of file
+    cache_manager.clear_cache()
+
+def document_cache_stats():
+    """Get document cache counters"""
+    return cache_manager.document_cache_stats()
+ 
\ No newline at end of file
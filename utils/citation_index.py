@@ -0,0 +1,445 @@
+"""Offline index of statute articles and súmulas for checking and grounding citations.
+
+Sources are JSON files (``data/citations/*.json``), one per law or court:
+code, aliases used in citations (``CPC``, ``Código Civil``), last article
+number and the transcribed entries. They are compiled into one binary file
+read through ``mmap``:
+
+* a sorted table of identifiers (``cpc 300``) answers exact and prefix
+  lookups by binary search, so checking a citation is a few comparisons;
+* an inverted index of the entry texts (stemmed terms with their
+  postings) ranks, with BM25, the entries most relevant to a case, which
+  are sent with the prompt.
+
+Opening the index only maps the file and reads its small JSON header, so it
+costs the same however large the sources grow; worker processes share the
+mapped pages.
+"""
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+
+from utils.metrics import CITATION_CHECKS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LXCITE01'
+# magic, offset/tamanho do cabeçalho JSON, tabelas de entradas, chaves e termos (offset, quantidade)
+_HEADER = struct.Struct('<8sIIIIIIII')
+# Entrada: offset e tamanho do JSON, número de termos (para o BM25)
+_ENTRY = struct.Struct('<III')
+# Chave ou termo: offset e tamanho do texto, valor (entrada ou offset das postings), quantidade
+_ROW = struct.Struct('<IIII')
+# Posting: entrada e frequência do termo nela
+_POSTING = struct.Struct('<IH')
+
+# Resultado da verificação de uma citação
+VERIFIED = 'verified'  # o dispositivo está no índice
+INVALID = 'invalid'  # número além do último artigo da lei (não existe)
+NOT_FOUND = 'not_found'  # a fonte está completa no índice e não tem o dispositivo
+UNCHECKED = 'unchecked'  # a fonte foi reconhecida, mas o dispositivo não foi transcrito
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_NUMBER = r'\d{1,3}(?:\.\d{3})*\s*[º°o]?(?:-[A-Za-z])?'
+_SPAN_NUMBER_RE = re.compile(r'(?:^|,\s*|\s+e\s+)(\d{1,3}(?:\.\d{3})*)\s*[º°o]?(?:-([A-Za-z]))?(?=[\s,;)]|$)')
+# Depois disso os números são de parágrafos, incisos ou alíneas, não de artigos
+_SPAN_STOP_RE = re.compile(r'§|par[áa]grafo|inciso|al[íi]nea|caput', re.IGNORECASE)
+_THOUSANDS_RE = re.compile(r'(?<=\d)\.(?=\d{3})')
+_WORD_RE = re.compile(r'[a-z]{3,}')
+_STEM_LENGTH = 6
+STOPWORDS = frozenset("""
+a ao aos as com como contra da das de dela dele do dos e em entre na nas no nos o os ou para pela pelas pelo
+pelos por que se sem sob sobre sua suas seu seus um uma uns umas ser sera serao sao foi foram tem ter
+qualquer quando quanto ainda assim bem caso casos deste desta este esta isso essa esse lei art arts artigo
+""".split())
+
+
+def _ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def terms(text):
+    """Stemmed index terms of ``text`` (accents, case and stopwords removed)"""
+    return [word[:_STEM_LENGTH] for word in _WORD_RE.findall(_ascii(text)) if word not in STOPWORDS]
+
+
+def entry_key(code, number):
+    """Identifier key of an entry, e.g. ``cpc 1015`` or ``stj 385``"""
+    return f'{code} {number}'.lower()
+
+
+def _article_number(value):
+    """Numeric part of an article number (``1.015-A`` -> 1015), or None when it has none"""
+    digits = value.replace('.', '').split('-')[0]
+    return int(digits) if digits.isdecimal() else None
+
+
+def load_sources(sources_dir):
+    """Read every ``*.json`` source of ``sources_dir``, sorted by file name"""
+    sources = []
+    for name in sorted(os.listdir(sources_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(sources_dir, name), encoding='utf-8') as f:
+                sources.append(json.load(f))
+    return sources
+
+
+def build_index(sources):
+    """Compile the sources into the binary index format; returns the bytes"""
+    meta = {'sources': {}}
+    entries = []
+    for source in sources:
+        code = source['code']
+        meta['sources'][code] = {
+            'name': source['name'],
+            'kind': source.get('kind', 'article'),
+            'aliases': source['aliases'],
+            'preposition': source.get('preposition', 'do'),
+            'last': source.get('last'),
+            'complete': bool(source.get('complete')),
+        }
+        for item in source['entries']:
+            number = item['number'].replace('.', '')
+            entries.append({'key': entry_key(code, number), 'source': code, 'number': number, 'text': item['text']})
+
+    entry_blob = bytearray()
+    entry_rows = []
+    postings = {}
+    total_terms = 0
+    for index, entry in enumerate(entries):
+        payload = json.dumps(
+            {'source': entry['source'], 'number': entry['number'], 'text': entry['text']}, ensure_ascii=False
+        ).encode('utf-8')
+        entry_terms = terms(entry['text'])
+        total_terms += len(entry_terms)
+        entry_rows.append((len(entry_blob), len(payload), len(entry_terms)))
+        entry_blob += payload
+        for term in entry_terms:
+            counts = postings.setdefault(term, {})
+            counts[index] = counts.get(index, 0) + 1
+    meta['avg_terms'] = total_terms / len(entries) if entries else 0.0
+
+    keys = sorted((entry['key'].encode('utf-8'), index) for index, entry in enumerate(entries))
+    term_rows = sorted((term.encode('utf-8'), counts) for term, counts in postings.items())
+
+    # O cabeçalho JSON vai primeiro e as tabelas logo depois, em offsets absolutos
+    meta['version'] = hashlib.sha256(json.dumps(sources, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    meta_offset = _HEADER.size
+    entries_offset = meta_offset + len(meta_bytes)
+    keys_offset = entries_offset + _ENTRY.size * len(entries)
+    terms_offset = keys_offset + _ROW.size * len(keys)
+    blob_offset = terms_offset + _ROW.size * len(term_rows)
+
+    out = bytearray(_HEADER.pack(
+        MAGIC, meta_offset, len(meta_bytes), entries_offset, len(entries),
+        keys_offset, len(keys), terms_offset, len(term_rows)
+    ))
+    out += meta_bytes
+    strings = bytearray()
+    for offset, length, term_count in entry_rows:
+        out += _ENTRY.pack(blob_offset + offset, length, term_count)
+    strings += entry_blob
+    for key, index in keys:
+        out += _ROW.pack(blob_offset + len(strings), len(key), index, 0)
+        strings += key
+    posting_blob = bytearray()
+    posting_rows = []
+    for term, counts in term_rows:
+        posting_rows.append((len(strings), len(term), len(posting_blob), len(counts)))
+        strings += term
+        for index, count in sorted(counts.items()):
+            posting_blob += _POSTING.pack(index, min(count, 0xFFFF))
+    postings_offset = blob_offset + len(strings)
+    for string_offset, length, posting_offset, count in posting_rows:
+        out += _ROW.pack(blob_offset + string_offset, length, postings_offset + posting_offset, count)
+    return bytes(out + strings + posting_blob)
+
+
+class _SortedRows:
+    """Binary-searchable view of a key or term table inside the index buffer"""
+
+    def __init__(self, buffer, offset, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def row(self, position):
+        return _ROW.unpack_from(self.buffer, self.offset + position * _ROW.size)
+
+    def __getitem__(self, position):
+        # Usado pelo bisect: compara os bytes da chave direto no buffer
+        string_offset, length, _, _ = self.row(position)
+        return self.buffer[string_offset:string_offset + length]
+
+    def find(self, key):
+        position = bisect.bisect_left(self, key)
+        if position < self.count and self[position] == key:
+            return self.row(position)
+        return None
+
+    def prefixed(self, prefix):
+        """Rows whose key starts with ``prefix``, in key order"""
+        position = bisect.bisect_left(self, prefix)
+        while position < self.count and self[position].startswith(prefix):
+            yield self.row(position)
+            position += 1
+
+
+class CitationIndex:
+    """Memory-mapped citation index, opened on first use.
+
+    A prebuilt index (see ``flask build-citation-index``) is mapped when it
+    is newer than every source; otherwise it is compiled in memory from
+    ``sources_dir``. Lookups are thread safe.
+    """
+
+    def __init__(self, path, sources_dir=None):
+        self.path = path
+        self.sources_dir = sources_dir
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def _sources_mtime(self):
+        if not self.sources_dir or not os.path.isdir(self.sources_dir):
+            return 0
+        return max((os.path.getmtime(os.path.join(self.sources_dir, name))
+                    for name in os.listdir(self.sources_dir) if name.endswith('.json')), default=0)
+
+    def build(self):
+        if not self.sources_dir or not os.path.isdir(self.sources_dir):
+            logger.warning(f"Citation sources not found: {self.sources_dir}; the index is empty")
+            return build_index([])
+        return build_index(load_sources(self.sources_dir))
+
+    def write(self):
+        """Compile the sources to ``path`` and return its size in bytes"""
+        data = self.build()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, self.path)
+        with self._lock:
+            self._buffer = None
+        return len(data)
+
+    def _load(self):
+        if self.path and os.path.exists(self.path) and os.path.getmtime(self.path) >= self._sources_mtime():
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.path and os.path.exists(self.path):
+            logger.info("Citation index is stale; compiling in memory")
+        return self.build()
+
+    def _open(self):
+        buffer = self._load()
+        magic, meta_offset, meta_length, entries_offset, entry_count, keys_offset, key_count, terms_offset, \
+            term_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a citation index: {self.path}")
+        self.meta = json.loads(bytes(buffer[meta_offset:meta_offset + meta_length]).decode('utf-8'))
+        self._entries_offset = entries_offset
+        self._entry_count = entry_count
+        self._keys = _SortedRows(buffer, keys_offset, key_count)
+        self._terms = _SortedRows(buffer, terms_offset, term_count)
+        self._patterns = self._compile_patterns()
+        self._buffer = buffer
+
+    def _ensure_open(self):
+        if self._buffer is None:
+            with self._lock:
+                if self._buffer is None:
+                    self._open()
+
+    def _compile_patterns(self):
+        aliases = {'article': set(), 'sumula': set()}
+        self._aliases = {}
+        for code, source in self.meta['sources'].items():
+            for alias in source['aliases']:
+                # Com e sem acentos: "Código Civil" e "Codigo Civil"
+                aliases[source['kind']].update((alias, _ascii(alias)))
+                self._aliases[_ascii(alias)] = code
+
+        def alternation(names):
+            # Aliases mais longos primeiro: "CPC/2015" antes de "CPC"
+            return '|'.join(
+                r'\s+'.join(re.escape(part) for part in name.split()) for name in sorted(names, key=len, reverse=True)
+            )
+
+        patterns = []
+        if aliases['article']:
+            patterns.append(re.compile(
+                rf"\b(?:arts?\.|artigos?)\s*(?P<span>{_NUMBER}(?:(?!\bart)[^;\n]){{0,80}}?)"
+                rf",?\s+(?:d[oa]s?|/)\s*(?P<law>{alternation(aliases['article'])})(?![\w/])",
+                re.IGNORECASE
+            ))
+        if aliases['sumula']:
+            patterns.append(re.compile(
+                rf"\bs[uú]mulas?\s+(?:n[º°o.]*\s*)?(?P<span>\d+(?:\s*(?:,|e)\s*\d+)*)"
+                rf"\s*(?:,?\s*d[oa]\s+|/\s*)(?P<law>{alternation(aliases['sumula'])})(?![\w/])",
+                re.IGNORECASE
+            ))
+        return patterns
+
+    @property
+    def version(self):
+        """Hash of the sources the index was built from"""
+        self._ensure_open()
+        return self.meta['version']
+
+    def __len__(self):
+        self._ensure_open()
+        return self._entry_count
+
+    def _entry(self, index):
+        offset, length, _ = _ENTRY.unpack_from(self._buffer, self._entries_offset + index * _ENTRY.size)
+        entry = json.loads(bytes(self._buffer[offset:offset + length]).decode('utf-8'))
+        entry['id'] = self.label(entry['source'], entry['number'])
+        return entry
+
+    def label(self, code, number):
+        """Citation as written in a document, e.g. ``art. 1.015 do CPC`` or ``Súmula 385 do STJ``"""
+        self._ensure_open()
+        source = self.meta['sources'].get(code, {})
+        preposition = source.get('preposition', 'do')
+        if source.get('kind') == 'sumula':
+            return f'Súmula {number} {preposition} {code}'
+        digits, _, suffix = number.partition('-')
+        # Números fora do padrão (sem algarismos) vão como estão na fonte
+        if digits.isdecimal() and len(digits) > 3:
+            digits = f'{digits[:-3]}.{digits[-3:]}'
+        elif digits.isdecimal() and int(digits) < 10:
+            digits += 'º'
+        return f"art. {digits}{'-' + suffix if suffix else ''} {preposition} {code}"
+
+    def get(self, code, number):
+        """Entry of article/súmula ``number`` of source ``code``, or None"""
+        self._ensure_open()
+        row = self._keys.find(entry_key(code, number.replace('.', '')).encode('utf-8'))
+        return self._entry(row[2]) if row else None
+
+    def prefix(self, query, limit=10):
+        """Entries whose identifier starts with ``query`` (``art. 30 do CPC`` or ``cpc 30``)"""
+        self._ensure_open()
+        found = self.find_citations(query)
+        key = entry_key(*found[0][1:]) if found else _THOUSANDS_RE.sub('', ' '.join(_ascii(query).split()))
+        rows = self._keys.prefixed(key.encode('utf-8'))
+        return [self._entry(row[2]) for _, row in zip(range(limit), rows)]
+
+    def find_citations(self, text):
+        """``(matched text, source code, number)`` of every citation of an indexed source in ``text``"""
+        self._ensure_open()
+        citations = []
+        for pattern in self._patterns:
+            for match in pattern.finditer(text):
+                code = self._aliases.get(' '.join(_ascii(match.group('law')).split()))
+                if code is None:
+                    continue
+                span = match.group('span')
+                stop = _SPAN_STOP_RE.search(span)
+                if stop:
+                    span = span[:stop.start()]
+                for number, suffix in _SPAN_NUMBER_RE.findall(span.strip()):
+                    number = number.replace('.', '') + (f'-{suffix.upper()}' if suffix else '')
+                    citations.append((match.group(0), code, number))
+        return citations
+
+    def status(self, code, number):
+        """Verification status of one citation (``VERIFIED``, ``INVALID``, ``NOT_FOUND`` or ``UNCHECKED``)"""
+        if self.get(code, number) is not None:
+            return VERIFIED
+        return self._missing_status(code, number)
+
+    def _missing_status(self, code, number):
+        source = self.meta['sources'][code]
+        article = _article_number(number)
+        if source['last'] and article is not None and article > source['last']:
+            return INVALID
+        return NOT_FOUND if source['complete'] else UNCHECKED
+
+    def check(self, sections):
+        """Verify the citations of a document (a section name to text mapping).
+
+        Returns one dict per distinct citation with its ``id``, ``section``
+        (the first one citing it), ``status`` and, when verified, the
+        indexed ``text``.
+        """
+        self._ensure_open()
+        report = {}
+        for section, text in sections.items():
+            if not text:
+                continue
+            for _, code, number in self.find_citations(text):
+                key = (code, number)
+                if key in report:
+                    continue
+                entry = self.get(code, number)
+                status = VERIFIED if entry is not None else self._missing_status(code, number)
+                CITATION_CHECKS.inc(status=status)
+                report[key] = {
+                    'id': self.label(code, number),
+                    'section': section,
+                    'status': status,
+                    'text': entry['text'] if entry else None,
+                }
+        return list(report.values())
+
+    def search(self, text, k=5):
+        """The ``k`` entries most relevant to ``text`` (BM25 over the indexed texts)"""
+        self._ensure_open()
+        if not k or not self._entry_count:
+            return []
+        scores = {}
+        average = self.meta['avg_terms'] or 1.0
+        for term in set(terms(text)):
+            row = self._terms.find(term.encode('utf-8'))
+            if row is None:
+                continue
+            _, _, postings_offset, frequency = row
+            idf = math.log(1 + (self._entry_count - frequency + 0.5) / (frequency + 0.5))
+            for position in range(frequency):
+                index, count = _POSTING.unpack_from(self._buffer, postings_offset + position * _POSTING.size)
+                length = _ENTRY.unpack_from(self._buffer, self._entries_offset + index * _ENTRY.size)[2]
+                norm = count + BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[index] = scores.get(index, 0.0) + idf * count * (BM25_K1 + 1) / norm
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self._entry(index) for index, _ in best]
+
+    def references(self, text, k=5):
+        """Prompt block with the entries cited in ``text`` plus the most relevant ones, up to ``k``"""
+        if not k:
+            return ''
+        chosen = {}
+        for _, code, number in self.find_citations(text):
+            entry = self.get(code, number)
+            if entry is not None:
+                chosen.setdefault(entry['id'], entry)
+        for entry in self.search(text, k):
+            if len(chosen) >= k:
+                break
+            chosen.setdefault(entry['id'], entry)
+        return '\n'.join(f"- {entry['id']}: {entry['text']}" for entry in list(chosen.values())[:k])
+
+
+def create_citation_index(config, root=None):
+    """Citation index configured in ``Config``; relative source paths are resolved against ``root``"""
+    sources_dir = config.CITATION_SOURCES_DIR
+    if root and sources_dir and not os.path.isabs(sources_dir):
+        sources_dir = os.path.join(root, sources_dir)
+    return CitationIndex(config.CITATION_INDEX_PATH, sources_dir)
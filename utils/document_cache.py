@@ -0,0 +1,268 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalize a user supplied field so equivalent inputs share a cache key"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', str(text))
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def make_cache_key(case_type, parties, facts, legal_grounds, requests, model, prompt_version):
+    """Build a stable, process independent digest for a generation request.
+
+    Unlike the builtin ``hash()`` the digest does not change between
+    interpreter runs, so it can be shared by every gunicorn worker.
+    """
+    payload = json.dumps(
+        [
+            normalize_text(case_type),
+            normalize_text(parties),
+            normalize_text(facts),
+            normalize_text(legal_grounds),
+            normalize_text(requests),
+            str(model),
+            str(prompt_version),
+        ],
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache with per entry TTL, timed by ``clock``"""
+
+    def __init__(self, max_entries=256, ttl=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= self.clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Store ``value`` for ``ttl`` seconds, or until the absolute time ``expires_at`` when given"""
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = self.clock() + ttl if ttl else None
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Disk backed cache tier shared by every process that opens the same file.
+
+    The database runs in WAL mode so readers in other workers are never
+    blocked by a writer. Entries expire after ``ttl`` seconds and the least
+    recently used ones are evicted once the stored payloads exceed
+    ``max_bytes``. Expiry and access times are read from ``clock``.
+    """
+
+    # Evicção roda a cada N escritas para não pagar um SUM() por requisição
+    EVICTION_INTERVAL = 50
+
+    def __init__(self, path, ttl=None, max_bytes=None, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._writes = 0
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        with self._init_lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS documents ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' value TEXT NOT NULL,'
+                    ' size INTEGER NOT NULL,'
+                    ' expires_at REAL,'
+                    ' accessed_at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS documents_accessed ON documents (accessed_at)')
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        item = self.get_with_expiry(key)
+        return item[0] if item is not None else None
+
+    def get_with_expiry(self, key):
+        """Return ``(value, expires_at)`` for a live entry, or None"""
+        conn = self._connect()
+        now = self.clock()
+        row = conn.execute(
+            'SELECT value, expires_at FROM documents WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute('DELETE FROM documents WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE documents SET accessed_at = ? WHERE key = ?', (now, key))
+        return json.loads(value), expires_at
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = self.clock()
+        # Modelos com interface de Mapping (LegalDocument) são gravados como objeto JSON
+        payload = json.dumps(value, ensure_ascii=False, default=dict)
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO documents (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (key, payload, len(payload), now + ttl if ttl else None, now),
+        )
+        self._writes += 1
+        if self._writes % self.EVICTION_INTERVAL == 0:
+            return self.evict()
+        return 0
+
+    def evict(self):
+        """Drop expired entries and enforce the byte quota, oldest access first"""
+        conn = self._connect()
+        removed = conn.execute(
+            'DELETE FROM documents WHERE expires_at IS NOT NULL AND expires_at <= ?', (self.clock(),)
+        ).rowcount
+        if self.max_bytes:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM documents').fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims = []
+                for key, size in conn.execute('SELECT key, size FROM documents ORDER BY accessed_at'):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany('DELETE FROM documents WHERE key = ?', victims)
+                removed += len(victims)
+        if removed:
+            logger.debug(f"Evicted {removed} documents from disk cache")
+        return removed
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM documents WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM documents')
+
+
+class DocumentCache:
+    """Two tier document cache: in-process LRU in front of a shared SQLite file"""
+
+    def __init__(self, path, ttl=None, memory_entries=256, max_bytes=None, clock=time.time):
+        self.memory = LRUCache(max_entries=memory_entries, ttl=ttl, clock=clock)
+        self.disk = SQLiteCache(path, ttl=ttl, max_bytes=max_bytes, clock=clock)
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        try:
+            item = self.disk.get_with_expiry(key)
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.warning(f"Disk cache read failed: {str(e)}")
+            item = None
+        if item is None:
+            self._count('misses')
+            return None
+        self._count('disk_hits')
+        value, expires_at = item
+        # Promovido para a memória com a validade gravada no disco, não com um TTL novo
+        self._count('evictions', self.memory.set(key, value, expires_at=expires_at))
+        return value
+
+    def set(self, key, value):
+        self._count('sets')
+        self._count('evictions', self.memory.set(key, value))
+        try:
+            self._count('evictions', self.disk.set(key, value))
+        except sqlite3.Error as e:
+            self._count('errors')
+            logger.warning(f"Disk cache write failed: {str(e)}")
+
+    def delete(self, key):
+        self.memory.delete(key)
+        try:
+            self.disk.delete(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache delete failed: {str(e)}")
+
+    def clear(self):
+        self.memory.clear()
+        try:
+            self.disk.clear()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache clear failed: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['memory_entries'] = len(self.memory)
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
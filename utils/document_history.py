@@ -0,0 +1,232 @@
+"""Per-user history of generated documents with full-text search.
+
+Each row keeps what is needed to reopen a document without the model or
+the PDF renderer: the form inputs, the parsed sections and the digest of
+the rendered PDF. An FTS5 index over the section text (external content,
+kept in sync by triggers) answers searches with ranked, highlighted
+snippets; accents are ignored and every term matches as a prefix, so
+"agrav tarifa bancaria" finds "Agravo ... tarifas bancárias".
+"""
+import html
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seções indexadas; qualificação, valor da causa e assinatura ficam de fora da busca
+SEARCH_SECTIONS = ('parties', 'facts', 'legal_grounds', 'requests')
+
+_TERM_RE = re.compile(r'\w+')
+
+# Marcadores do snippet() trocados por <mark> depois do escape do texto
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS documents ('
+    ' id INTEGER PRIMARY KEY,'
+    ' owner TEXT NOT NULL,'
+    ' key TEXT NOT NULL,'
+    ' case_type TEXT NOT NULL,'
+    ' inputs TEXT NOT NULL,'
+    ' sections TEXT NOT NULL,'
+    ' body TEXT NOT NULL,'
+    ' pdf_digest TEXT,'
+    ' generation_date TEXT,'
+    ' created_at REAL NOT NULL,'
+    ' updated_at REAL NOT NULL,'
+    ' UNIQUE (owner, key))',
+    'CREATE INDEX IF NOT EXISTS documents_owner_updated ON documents (owner, updated_at)',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+    " case_type, body, content='documents', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN'
+    ' INSERT INTO documents_fts (rowid, case_type, body) VALUES (new.id, new.case_type, new.body);'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN'
+    " INSERT INTO documents_fts (documents_fts, rowid, case_type, body) VALUES ('delete', old.id, old.case_type, old.body);"
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF case_type, body ON documents BEGIN'
+    " INSERT INTO documents_fts (documents_fts, rowid, case_type, body) VALUES ('delete', old.id, old.case_type, old.body);"
+    ' INSERT INTO documents_fts (rowid, case_type, body) VALUES (new.id, new.case_type, new.body);'
+    ' END',
+)
+
+_COLUMNS = 'd.key, d.case_type, d.inputs, d.pdf_digest, d.generation_date, d.created_at, d.updated_at'
+
+
+def match_query(text):
+    """FTS5 query for free text typed by the user: every word, as a prefix, must appear.
+
+    Only ``\\w`` runs are kept, so quotes and FTS5 operators in the input
+    can never produce a syntax error. Returns '' when there is no word.
+    """
+    return ' '.join(f'"{term}"*' for term in _TERM_RE.findall(text or ''))
+
+
+def highlight(snippet):
+    """HTML of an FTS5 snippet: the text escaped and the matched terms in ``<mark>``"""
+    return html.escape(snippet).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+class DocumentHistory:
+    """SQLite store of the documents generated by each user.
+
+    Documents are keyed by ``(owner, key)`` where ``key`` is the document
+    cache digest, so generating the same request again updates the entry
+    instead of adding a duplicate. The database runs in WAL mode with one
+    connection per thread, like the document cache.
+    """
+
+    def __init__(self, path, page_size=20):
+        self.path = path
+        self.page_size = page_size
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        with self._init_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def record(self, owner, key, inputs, sections, pdf_digest=None, generation_date=None):
+        """Insert or update the entry of ``key`` for ``owner``.
+
+        ``inputs`` are the validated form fields and ``sections`` the
+        mapping of section name to text. A missing ``pdf_digest`` or
+        ``generation_date`` keeps the one already stored.
+        """
+        sections = dict(sections)
+        body = '\n\n'.join(sections[name] for name in SEARCH_SECTIONS if sections.get(name))
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO documents'
+            ' (owner, key, case_type, inputs, sections, body, pdf_digest, generation_date, created_at, updated_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (owner, key) DO UPDATE SET'
+            ' case_type = excluded.case_type, inputs = excluded.inputs, sections = excluded.sections,'
+            ' body = excluded.body, pdf_digest = COALESCE(excluded.pdf_digest, pdf_digest),'
+            ' generation_date = COALESCE(excluded.generation_date, generation_date),'
+            ' updated_at = excluded.updated_at',
+            (
+                str(owner), key, inputs['case_type'], json.dumps(inputs, ensure_ascii=False),
+                json.dumps(sections, ensure_ascii=False), body, pdf_digest, generation_date, now, now
+            ),
+        )
+
+    def update_sections(self, owner, key, sections, expected_updated_at):
+        """Replace the sections of an entry unless it changed since it was read (compare-and-set).
+
+        ``expected_updated_at`` is the ``updated_at`` of the entry the new
+        sections were built from; returns False, writing nothing, when
+        another request (in any worker) updated the entry in the meantime.
+        """
+        sections = dict(sections)
+        body = '\n\n'.join(sections[name] for name in SEARCH_SECTIONS if sections.get(name))
+        return self._connect().execute(
+            'UPDATE documents SET sections = ?, body = ?, pdf_digest = NULL, updated_at = ?'
+            ' WHERE owner = ? AND key = ? AND updated_at = ?',
+            (json.dumps(sections, ensure_ascii=False), body, time.time(), str(owner), key, expected_updated_at),
+        ).rowcount > 0
+
+    def set_pdf(self, owner, key, pdf_digest):
+        """Store the digest of a PDF rendered again for an entry (the search index is untouched)"""
+        self._connect().execute(
+            'UPDATE documents SET pdf_digest = ? WHERE owner = ? AND key = ?', (pdf_digest, str(owner), key)
+        )
+
+    def get(self, owner, key):
+        """The entry of ``key`` for ``owner`` with its inputs and sections, or None"""
+        row = self._connect().execute(
+            f'SELECT {_COLUMNS}, d.sections FROM documents d WHERE d.owner = ? AND d.key = ?', (str(owner), key)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = self._entry(row)
+        entry['sections'] = json.loads(row[-1])
+        return entry
+
+    def delete(self, owner, key):
+        return self._connect().execute(
+            'DELETE FROM documents WHERE owner = ? AND key = ?', (str(owner), key)
+        ).rowcount > 0
+
+    def search(self, owner, text='', case_type=None, page=1):
+        """One page of ``owner``'s documents, newest first or best match first when ``text`` is given.
+
+        Returns ``(entries, has_more)``. Matches carry a ``snippet`` with
+        the matched terms highlighted (see :func:`highlight`).
+        """
+        page = max(int(page), 1)
+        limit = self.page_size + 1
+        offset = (page - 1) * self.page_size
+        query = match_query(text)
+        filters = 'd.owner = ?'
+        params = [str(owner)]
+        if case_type:
+            filters += ' AND d.case_type = ?'
+            params.append(case_type)
+        conn = self._connect()
+        if query:
+            # Peso maior para o tipo de peça do que para o corpo; bm25() é menor para os melhores resultados
+            rows = conn.execute(
+                f'SELECT {_COLUMNS}, snippet(documents_fts, 1, ?, ?, \'…\', 24)'
+                ' FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid'
+                f' WHERE documents_fts MATCH ? AND {filters}'
+                ' ORDER BY bm25(documents_fts, 2.0, 1.0) LIMIT ? OFFSET ?',
+                [_MARK_OPEN, _MARK_CLOSE, query] + params + [limit, offset],
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f'SELECT {_COLUMNS} FROM documents d WHERE {filters}'
+                ' ORDER BY d.updated_at DESC LIMIT ? OFFSET ?',
+                params + [limit, offset],
+            ).fetchall()
+        entries = []
+        for row in rows[:self.page_size]:
+            entry = self._entry(row)
+            if query:
+                entry['snippet'] = highlight(row[-1])
+            entries.append(entry)
+        return entries, len(rows) > self.page_size
+
+    def count(self, owner):
+        return self._connect().execute('SELECT COUNT(*) FROM documents WHERE owner = ?', (str(owner),)).fetchone()[0]
+
+    def optimize(self):
+        """Merge the FTS5 index segments (worth running after bulk imports)"""
+        self._connect().execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    @staticmethod
+    def _entry(row):
+        key, case_type, inputs, pdf_digest, generation_date, created_at, updated_at = row[:7]
+        return {
+            'key': key,
+            'case_type': case_type,
+            'inputs': json.loads(inputs),
+            'pdf_digest': pdf_digest,
+            'generation_date': generation_date,
+            'created_at': created_at,
+            'updated_at': updated_at,
+        }
+
+
+def create_document_history(config):
+    return DocumentHistory(config.HISTORY_PATH, page_size=config.HISTORY_PAGE_SIZE)
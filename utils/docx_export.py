@@ -0,0 +1,247 @@
+"""Editable DOCX export written straight from the document sections.
+
+The OOXML package is assembled by hand and streamed as a ZIP: no HTML,
+no PDF and no office suite are involved. Formatting comes from a prebuilt
+``styles.xml``/``numbering.xml`` pair (``data/docx``) whose paragraph
+styles mirror the classes of ``static/css/document.css``; each line of a
+section becomes one paragraph with the style of what it is (paragraph,
+``§`` numbered paragraph, inciso, alínea or numbered request).
+"""
+import hashlib
+import html
+import os
+import re
+import threading
+import zipfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from utils.batch import StreamBuffer, drain
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Mesmos padrões do formatador (agents/formatter.py) para incisos, alíneas e parágrafos numerados
+_ROMAN_ITEM_RE = re.compile(r'^[IVX]+\s*-\s*')
+_LETTER_ITEM_RE = re.compile(r'^[a-j]\)\s*')
+_NUMBERED_PARAGRAPH_RE = re.compile(r'^(§\s*\d+\.)\s*(.*)$')
+# Negrito e itálico do texto do modelo viram runs; as demais tags são descartadas
+_INLINE_TAG_RE = re.compile(r'<(/?)(strong|b|em|i)\b[^>]*>|<[^>]*>', re.IGNORECASE)
+# Caracteres de controle não são permitidos em XML 1.0
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_CONTENT_TYPES = _XML_DECLARATION + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '<Override PartName="/word/numbering.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>'
+    '<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+    '</Types>'
+)
+_PACKAGE_RELS = _XML_DECLARATION + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>'
+    '</Relationships>'
+)
+_DOCUMENT_RELS = _XML_DECLARATION + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" Target="numbering.xml"/>'
+    '</Relationships>'
+)
+# A4 com margens de 2,5 cm, como o perfil de impressão do PDF (Config.PDF_OPTIONS)
+_SECTION_PROPERTIES = (
+    '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+    '<w:pgMar w:top="1417" w:right="1417" w:bottom="1417" w:left="1417" w:header="709" w:footer="709" w:gutter="0"/>'
+    '</w:sectPr>'
+)
+
+# Seções do corpo na ordem de _legal_document.html: (título, seção)
+BODY_SECTIONS = (
+    (None, 'parties'),
+    ('DOS FATOS', 'facts'),
+    ('DA FUNDAMENTAÇÃO JURÍDICA', 'legal_grounds'),
+)
+
+
+def _text(value):
+    return escape(_INVALID_XML_RE.sub('', value))
+
+
+def runs(text, style=None):
+    """``<w:r>`` elements of one line, keeping ``<strong>``/``<em>`` from the model as bold/italic"""
+    parts = []
+    bold = italic = False
+    position = 0
+    for match in _INLINE_TAG_RE.finditer(text):
+        parts.append((text[position:match.start()], bold, italic))
+        position = match.end()
+        name = (match.group(2) or '').lower()
+        if name in ('strong', 'b'):
+            bold = not match.group(1)
+        elif name in ('em', 'i'):
+            italic = not match.group(1)
+    parts.append((text[position:], bold, italic))
+
+    xml = []
+    for chunk, bold, italic in parts:
+        chunk = html.unescape(chunk)
+        if not chunk:
+            continue
+        properties = (f'<w:rStyle w:val="{style}"/>' if style else '') + ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+        xml.append(
+            (f'<w:r><w:rPr>{properties}</w:rPr>' if properties else '<w:r>')
+            + f'<w:t xml:space="preserve">{_text(chunk)}</w:t></w:r>'
+        )
+    return ''.join(xml)
+
+
+def paragraph(style, text='', prefix=None):
+    """One ``<w:p>`` with paragraph style ``style``; ``prefix`` goes first in the ParagraphNumber style"""
+    content = (runs(prefix, 'ParagraphNumber') + runs(' ') if prefix else '') + runs(text)
+    return f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>{content}</w:p>'
+
+
+def text_paragraphs(text):
+    """Paragraphs of a free text section, one per non blank line, styled by what the line is"""
+    for line in (text or '').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if _ROMAN_ITEM_RE.match(line):
+            yield paragraph('LegalItem', line)
+        elif _LETTER_ITEM_RE.match(line):
+            yield paragraph('LegalSubitem', line)
+        else:
+            numbered = _NUMBERED_PARAGRAPH_RE.match(line)
+            if numbered:
+                yield paragraph('NumberedParagraph', numbered.group(2), prefix=numbered.group(1))
+            else:
+                yield paragraph('DocumentParagraph', line)
+
+
+def request_paragraphs(text):
+    """One numbered ``RequestItem`` per non blank line, like ``items_html`` in the preview"""
+    for line in (text or '').split('\n'):
+        if line.strip():
+            yield paragraph('RequestItem', line.strip())
+
+
+class DocxExporter:
+    """Stream ``.docx`` packages of legal documents built from their sections.
+
+    The style and numbering parts are read from ``template_dir`` once per
+    process; everything else is generated per document.
+    """
+
+    def __init__(self, template_dir, compression_level=6):
+        self.template_dir = template_dir
+        self.compression_level = compression_level
+        self._parts = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _template_parts(self):
+        if self._parts is None:
+            with self._lock:
+                if self._parts is None:
+                    parts = {}
+                    digest = hashlib.sha256()
+                    for name in ('styles.xml', 'numbering.xml'):
+                        with open(os.path.join(self.template_dir, name), 'rb') as f:
+                            parts[f'word/{name}'] = f.read()
+                        digest.update(parts[f'word/{name}'])
+                    self._version = digest.hexdigest()[:16]
+                    self._parts = parts
+        return self._parts
+
+    @property
+    def version(self):
+        """Digest of the style template, part of the download ETag"""
+        self._template_parts()
+        return self._version
+
+    def body(self, document, case_type, court_header, generation_date=''):
+        """Paragraphs of ``word/document.xml`` in the layout of ``_legal_document.html``, section by section"""
+        yield paragraph('DocumentTitle', case_type.upper())
+        yield paragraph('CourtHeader', court_header)
+        for title, name in BODY_SECTIONS:
+            if title:
+                yield paragraph('SectionTitle', title)
+            yield ''.join(text_paragraphs(document[name]))
+        yield paragraph('SectionTitle', 'DOS PEDIDOS') + ''.join(request_paragraphs(document['requests']))
+        yield ''.join((
+            paragraph('DocumentParagraph', document['value_cause']),
+            paragraph('DocumentParagraph', 'Nestes termos, pede deferimento.'),
+            paragraph('DocumentParagraph', document['city_date']),
+            paragraph('SignatureLine'),
+            paragraph('SignatureName', document['lawyer_name'] or '[Nome do Advogado]'),
+            paragraph('SignatureOab', document['lawyer_oab'] or 'OAB/UF XXXXX'),
+            paragraph('DocumentFooterFirst', 'Documento gerado por LexGenius'),
+            paragraph('DocumentFooter', f'Data de geração: {generation_date or ""}'),
+        ))
+
+    def stream(self, document, case_type, court_header, generation_date=''):
+        """Yield the bytes of the ``.docx`` as they are compressed.
+
+        ``document`` is a mapping of section name to text (a
+        :class:`~agents.document.LegalDocument` or the dict from the cache).
+        """
+        buffer = StreamBuffer()
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED,
+                             compresslevel=self.compression_level) as archive:
+            # [Content_Types].xml precisa ser a primeira entrada do pacote
+            archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+            archive.writestr('_rels/.rels', _PACKAGE_RELS)
+            archive.writestr('docProps/core.xml', self._core_properties(case_type))
+            archive.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+            for name, data in self._template_parts().items():
+                archive.writestr(name, data)
+            yield from drain(buffer)
+
+            with archive.open('word/document.xml', mode='w') as target:
+                target.write(f'{_XML_DECLARATION}<w:document {_NS}><w:body>'.encode('utf-8'))
+                for xml in self.body(document, case_type, court_header, generation_date):
+                    target.write(xml.encode('utf-8'))
+                    yield from drain(buffer)
+                target.write(f'{_SECTION_PROPERTIES}</w:body></w:document>'.encode('utf-8'))
+        yield from drain(buffer)
+
+    def render(self, document, case_type, court_header, generation_date=''):
+        """The whole ``.docx`` as bytes"""
+        return b''.join(self.stream(document, case_type, court_header, generation_date))
+
+    @staticmethod
+    def _core_properties(case_type):
+        created = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return _XML_DECLARATION + (
+            '<cp:coreProperties '
+            'xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            f'<dc:title>{_text(case_type)}</dc:title><dc:creator>LexGenius</dc:creator>'
+            f'<dcterms:created xsi:type="dcterms:W3CDTF">{created}</dcterms:created>'
+            '</cp:coreProperties>'
+        )
+
+
+def create_docx_exporter(config, root=None):
+    """DOCX exporter with the style template configured in ``Config``, resolved against ``root``"""
+    template_dir = config.DOCX_TEMPLATE_DIR
+    if root and not os.path.isabs(template_dir):
+        template_dir = os.path.join(root, template_dir)
+    return DocxExporter(template_dir, compression_level=config.DOCX_COMPRESSION_LEVEL)
@@ -0,0 +1,161 @@
+"""Compression, fingerprinted static URLs and validators for HTTP responses.
+
+Static files are linked as ``/static/<file>?v=<content hash>`` and served
+with a one year immutable ``Cache-Control`` when the hash is current, so a
+changed file simply gets a new URL. Their compressed bodies are computed
+once per file version. Dynamic HTML and JSON are compressed per response
+(brotli when the optional ``brotli`` package is installed, gzip otherwise).
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+))
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding offered by the client (``request.accept_encodings``), or None"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6):
+    """``level`` is the gzip level (1-9); brotli uses the matching quality up to 11"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level + 2, 11))
+    # mtime=0: o mesmo conteúdo gera sempre os mesmos bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _set_encoded_body(response, data, encoding):
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # A representação comprimida não é idêntica byte a byte: o validador passa a ser fraco
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response, accept_encodings, min_size=500, level=6):
+    """Compress a buffered HTML/JSON/text response in place when the client accepts it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or (response.content_length or 0) < min_size:
+        return response
+    _set_encoded_body(response, compress(response.get_data(), encoding, level), encoding)
+    return response
+
+
+def etag_for(*parts):
+    """Validator built from the values a rendered page depends on"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class StaticAssets:
+    """Content fingerprints and pre-compressed bodies of the files under ``folder``.
+
+    Entries are keyed by the file's mtime and size, so an edited file is
+    hashed again on its next URL. Thread safe; concurrent first calls may
+    hash the same file twice, which is harmless.
+    """
+
+    def __init__(self, folder, max_age=365 * 24 * 3600, level=9):
+        self.folder = folder
+        self.max_age = max_age
+        self.level = level
+        self._fingerprints = {}
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def _path(self, filename):
+        path = os.path.realpath(os.path.join(self.folder, filename))
+        if not path.startswith(os.path.realpath(self.folder) + os.sep):
+            return None
+        return path
+
+    def fingerprint(self, filename):
+        """Short content hash of ``filename``, or None when it does not exist"""
+        path = self._path(filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            return None
+        if stat is None:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._fingerprints.get(filename)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._fingerprints[filename] = (version, digest)
+        return digest
+
+    def compressed(self, filename, encoding):
+        """Compressed body of ``filename``, computed once per file version"""
+        digest = self.fingerprint(filename)
+        key = (filename, encoding)
+        cached = self._compressed.get(key)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        with open(self._path(filename), 'rb') as f:
+            data = compress(f.read(), encoding, self.level)
+        with self._lock:
+            self._compressed[key] = (digest, data)
+        return data
+
+    def finalize(self, response, filename, version, accept_encodings):
+        """Cache headers and compression of a static file response.
+
+        ``version`` is the ``v`` query argument of the URL: when it matches
+        the current fingerprint the response is cached for ``max_age`` as
+        immutable; otherwise it keeps the default revalidation.
+        """
+        if response.status_code != 200:
+            return response
+        if version and version == self.fingerprint(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+            response.expires = None
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(accept_encodings)
+        if encoding is None:
+            return response
+        close = getattr(response.response, 'close', None)
+        if close is not None:
+            close()
+        response.direct_passthrough = False
+        _set_encoded_body(response, self.compressed(filename, encoding), encoding)
+        return response
+
+
+def tree_fingerprint(folder):
+    """Hash of the names, sizes and mtimes of the files under ``folder`` (e.g. the templates)"""
+    entries = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            entries.append((os.path.relpath(os.path.join(root, name), folder), stat.st_size, stat.st_mtime_ns))
+    return etag_for(*sorted(entries))[:12]
@@ -0,0 +1,290 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# Devolvida ao cliente no lugar da exceção, que fica só no log
+JOB_ERROR_MESSAGE = 'Erro ao gerar o documento. Por favor, tente novamente.'
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds the maximum number of pending jobs"""
+
+
+class MemoryJobStore:
+    """Job records kept in process memory; only the accepting worker can answer for them"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._purge()
+            self._jobs[job['id']] = dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def expire(self, before, **fields):
+        """Apply ``fields`` to the queued or running jobs not updated since ``before``; returns their ids"""
+        now = time.time()
+        with self._lock:
+            stale = [
+                job for job in self._jobs.values()
+                if job['status'] in (JOB_QUEUED, JOB_RUNNING) and job['updated_at'] < before
+            ]
+            for job in stale:
+                job.update(fields, updated_at=now)
+        return [job['id'] for job in stale]
+
+    def _purge(self):
+        limit = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['status'] in (JOB_DONE, JOB_FAILED) and job['updated_at'] < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Job records in a local SQLite file, visible to every worker on the host"""
+
+    def __init__(self, path, ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' data TEXT NOT NULL,'
+                ' status TEXT NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def create(self, job):
+        conn = self._connect()
+        conn.execute(
+            'DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+            (JOB_DONE, JOB_FAILED, time.time() - self.ttl)
+        )
+        conn.execute(
+            'INSERT INTO jobs (id, data, status, updated_at) VALUES (?, ?, ?, ?)',
+            (job['id'], json.dumps(job, ensure_ascii=False), job['status'], job['updated_at'])
+        )
+
+    def update(self, job_id, **fields):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is not None:
+                job = json.loads(row[0])
+                job.update(fields, updated_at=time.time())
+                conn.execute(
+                    'UPDATE jobs SET data = ?, status = ?, updated_at = ? WHERE id = ?',
+                    (json.dumps(job, ensure_ascii=False), job['status'], job['updated_at'], job_id)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def expire(self, before, **fields):
+        """Apply ``fields`` to the queued or running jobs not updated since ``before``; returns their ids"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT data FROM jobs WHERE status IN (?, ?) AND updated_at < ?', (JOB_QUEUED, JOB_RUNNING, before)
+            ).fetchall()
+            now = time.time()
+            for (data,) in rows:
+                job = json.loads(data)
+                job.update(fields, updated_at=now)
+                conn.execute(
+                    'UPDATE jobs SET data = ?, status = ?, updated_at = ? WHERE id = ?',
+                    (json.dumps(job, ensure_ascii=False), job['status'], now, job['id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [json.loads(data)['id'] for (data,) in rows]
+
+
+class Job:
+    """Handle passed to job functions so they can report progress"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.id = job_id
+
+    def progress(self, stage):
+        self.store.update(self.id, stage=stage)
+
+
+class JobQueue:
+    """Bounded local job queue.
+
+    Jobs run on a thread pool (suited to the I/O bound Gemini calls); CPU
+    heavy steps such as PDF rendering are handed by the job itself to the
+    process pool of :class:`utils.pdf_renderer.PdfRenderer`. Nothing here
+    needs an external broker.
+
+    Jobs only live in the worker that accepted them, so each worker renews
+    the ``updated_at`` of its unfinished jobs every ``lease / 3`` seconds.
+    A queued or running job left without renewal for ``lease`` seconds
+    belonged to a worker that died: it is reported as failed when read, and
+    :meth:`recover` fails every such job at startup.
+    """
+
+    def __init__(self, store, api_workers=4, max_pending=32, lease=60):
+        self.store = store
+        self.api_workers = api_workers
+        self.max_pending = max_pending
+        self.lease = lease
+        self._pending = 0
+        self._active = set()
+        self._lock = threading.Lock()
+        self._api_pool = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def _get_api_pool(self):
+        with self._lock:
+            if self._api_pool is None:
+                self._api_pool = ThreadPoolExecutor(max_workers=self.api_workers, thread_name_prefix='job')
+                self._stopped.clear()
+                self._heartbeat = threading.Thread(target=self._renew_leases, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+            return self._api_pool
+
+    def _renew_leases(self):
+        while not self._stopped.wait(self.lease / 3):
+            with self._lock:
+                active = list(self._active)
+            for job_id in active:
+                try:
+                    self.store.update(job_id)
+                except Exception as e:
+                    logger.warning(f"Could not renew the lease of job {job_id}: {str(e)}")
+
+    def recover(self):
+        """Fail the jobs abandoned by dead workers; returns how many"""
+        expired = self.store.expire(time.time() - self.lease, status=JOB_FAILED, error=JOB_ERROR_MESSAGE)
+        if expired:
+            logger.warning(f"{len(expired)} abandoned job(s) marked as failed")
+        return len(expired)
+
+    def submit(self, func, *args, owner=None, **kwargs):
+        """Enqueue ``func(job, *args, **kwargs)`` and return the new job id"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError("Too many pending jobs")
+            self._pending += 1
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.store.create({
+            'id': job_id,
+            'owner': owner,
+            'status': JOB_QUEUED,
+            'stage': None,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        })
+        with self._lock:
+            self._active.add(job_id)
+        try:
+            self._get_api_pool().submit(self._run, job_id, func, args, kwargs)
+        except Exception:
+            self._release(job_id)
+            raise
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self.store.update(job_id, status=JOB_RUNNING)
+        try:
+            result = func(Job(self.store, job_id), *args, **kwargs)
+            self.store.update(job_id, status=JOB_DONE, stage=None, result=result)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            self.store.update(job_id, status=JOB_FAILED, error=JOB_ERROR_MESSAGE)
+        finally:
+            self._release(job_id)
+
+    def _release(self, job_id):
+        with self._lock:
+            self._pending -= 1
+            self._active.discard(job_id)
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        if (job is not None and job['status'] in (JOB_QUEUED, JOB_RUNNING)
+                and job['updated_at'] < time.time() - self.lease):
+            # Sem renovação do lease: o worker que aceitou o job morreu
+            self.recover()
+            job = self.store.get(job_id)
+        return job
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._api_pool = self._api_pool, None
+        self._stopped.set()
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+def create_job_queue(config):
+    """Build the job queue configured in ``Config``"""
+    if config.JOB_QUEUE_BACKEND == 'memory':
+        store = MemoryJobStore(ttl=config.JOB_RESULT_TTL)
+    elif config.JOB_QUEUE_BACKEND == 'sqlite':
+        store = SQLiteJobStore(config.JOB_QUEUE_PATH, ttl=config.JOB_RESULT_TTL)
+    else:
+        raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {config.JOB_QUEUE_BACKEND}")
+    queue = JobQueue(
+        store,
+        api_workers=config.JOB_API_WORKERS,
+        max_pending=config.JOB_MAX_PENDING,
+        lease=config.JOB_LEASE
+    )
+    queue.recover()
+    return queue
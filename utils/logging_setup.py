@@ -0,0 +1,215 @@
+"""Non-blocking, structured logging for the app processes.
+
+Request threads only put records on a bounded queue; a listener thread
+(started with the first record, once per process) writes them to stderr
+and, when ``LOG_FILE`` is set, appends them to that file. Rotation of the
+file is left to an external tool (logrotate): several gunicorn workers
+append to the same file and each one reopens it once it is rotated. Records are JSON lines carrying the request
+id and, for the per request access record, the stage timings. Personal
+data (CPF, CNPJ, e-mail, phone numbers) is masked before writing, and
+payloads are logged as :func:`fingerprint` digests instead of their text.
+INFO and DEBUG records are sampled per request with ``LOG_SAMPLE_RATE``;
+warnings and errors are always written.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+from utils.metrics import LOG_RECORDS_DROPPED
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+_verbose_sampled = contextvars.ContextVar('log_verbose_sampled', default=None)
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Atributos padrão do LogRecord; o resto veio de extra= e entra no JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_SENSITIVE_PATTERNS = (
+    (re.compile(r'\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b'), '[CNPJ]'),
+    (re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b'), '[CPF]'),
+    (re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.-]+\b'), '[EMAIL]'),
+    (re.compile(r'\(?\b\d{2}\)?\s?9?\d{4}-?\d{4}\b'), '[TELEFONE]'),
+)
+
+
+def fingerprint(value):
+    """Short digest standing for a payload in the logs (equal inputs share it)"""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return f"sha256:{hashlib.sha256(value.encode('utf-8')).hexdigest()[:12]}/{len(value)}"
+
+
+def redact(text):
+    """Mask CPF, CNPJ, e-mail addresses and phone numbers in ``text``"""
+    for pattern, replacement in _SENSITIVE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def start_request(incoming_id=None, sample_rate=1.0):
+    """Bind a request id (the client's ``X-Request-ID`` when well formed) and take the sampling decision"""
+    request_id = incoming_id if incoming_id and _REQUEST_ID_RE.match(incoming_id) else uuid.uuid4().hex
+    request_id_var.set(request_id)
+    _verbose_sampled.set(sample_rate >= 1.0 or random.random() < sample_rate)
+    return request_id
+
+
+def end_request():
+    """Unbind the request id so records of a reused worker thread do not inherit it"""
+    request_id_var.set(None)
+    _verbose_sampled.set(None)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp the request id and drop unsampled verbose records; runs in the thread that logs"""
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            sampled = _verbose_sampled.get()
+            if sampled is None:
+                sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+            if not sampled:
+                return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RedactingFilter(logging.Filter):
+    """Mask personal data in the final message; runs in the listener thread"""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and the ``extra`` fields"""
+
+    def format(self, record):
+        payload = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        record.__dict__.setdefault('request_id', None)
+        return super().format(record)
+
+
+class StderrHandler(logging.StreamHandler):
+    """Writes to the current ``sys.stderr``, which servers and test runners may replace"""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller and owns its listener thread.
+
+    The listener starts with the first record (not at import or in
+    ``create_app()``) and again in a forked child. When the queue is full
+    the record is dropped and counted in ``lexgenius_log_records_dropped_total``.
+    """
+
+    def __init__(self, handlers, max_size=10000):
+        super().__init__(queue.Queue(max_size))
+        self.handlers = handlers
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Processo filho: a fila e a thread herdadas do pai não servem
+                self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.flush_and_stop)
+
+    def prepare(self, record):
+        # Só o necessário na thread da requisição: a mensagem final e o traceback como texto
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush_and_stop(self):
+        """Write the queued records and stop the listener (registered with ``atexit``)"""
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None and self._pid == os.getpid():
+            listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+def configure_logging(config):
+    """Install the queue handler on the root logger; calling it again is a no-op"""
+    root = logging.getLogger()
+    if any(isinstance(handler, AsyncQueueHandler) for handler in root.handlers):
+        return
+    formatter = JsonFormatter() if config.LOG_FORMAT == 'json' else TextFormatter()
+    handlers = [StderrHandler()]
+    if config.LOG_FILE:
+        # Sem rotação no processo: cada worker rotacionaria o mesmo arquivo por conta própria
+        handlers.append(logging.handlers.WatchedFileHandler(config.LOG_FILE, encoding='utf-8', delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(RedactingFilter())
+    queue_handler = AsyncQueueHandler(handlers, max_size=config.LOG_QUEUE_SIZE)
+    queue_handler.addFilter(ContextFilter(config.LOG_SAMPLE_RATE))
+    root.handlers = [queue_handler]
+    root.setLevel(getattr(logging, config.LOG_LEVEL))
@@ -0,0 +1,278 @@
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Segundos; cobre de etapas locais (ms) até chamadas longas ao Gemini
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Decisão de amostragem da requisição atual (None fora de uma requisição)
+_sampled = contextvars.ContextVar('metrics_sampled', default=None)
+# Duração de cada etapa da requisição atual, para o registro de acesso nos logs
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter; always exact, sampling never applies to it"""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket histogram in the Prometheus layout"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """Gauge read at scrape time from ``func()``, a number or a ``{label_value: number}`` dict"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, func, labelname=None):
+        super().__init__(name, documentation, (labelname,) if labelname else ())
+        self.func = func
+
+    def _samples(self):
+        value = self.func()
+        if isinstance(value, dict):
+            return [
+                f'{self.name}{_format_labels(self.labelnames, (label,))} {_format_value(item)}'
+                for label, item in value.items()
+            ]
+        return [f'{self.name} {_format_value(value)}']
+
+
+class _Span:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, **self.labels)
+        timings = _stage_timings.get()
+        if timings is not None and 'stage' in self.labels:
+            timings[self.labels['stage']] = timings.get(self.labels['stage'], 0.0) + elapsed
+        return False
+
+
+_NOT_SAMPLED = nullcontext()
+
+
+class MetricsRegistry:
+    """Process-local metrics with sampled timing spans.
+
+    Only a ``sample_rate`` fraction of requests is timed; the decision is
+    taken once per request (:meth:`start_request`) so every stage of a
+    sampled request is recorded together. Histogram counts are therefore a
+    sample of the traffic, while counters stay exact. Outside a request
+    (jobs, batch threads) each span flips its own coin.
+    """
+
+    def __init__(self, sample_rate=1.0, enabled=True):
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, func, labelname=None):
+        return self._register(GaugeCallback(name, documentation, func, labelname))
+
+    def _should_sample(self):
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def start_request(self):
+        """Decide whether the current request is timed; returns the decision"""
+        sampled = self._should_sample()
+        _sampled.set(sampled)
+        _stage_timings.set({} if sampled else None)
+        return sampled
+
+    def stage_timings(self):
+        """Seconds spent in each stage of the current (sampled) request, or None"""
+        return _stage_timings.get()
+
+    def is_sampled(self):
+        sampled = _sampled.get()
+        return self._should_sample() if sampled is None else sampled
+
+    def span(self, histogram, **labels):
+        """Context manager timing the enclosed block into ``histogram`` when the request is sampled"""
+        if not self.is_sampled():
+            return _NOT_SAMPLED
+        return _Span(histogram, labels)
+
+    def expose(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'lexgenius_stage_seconds', 'Duration of each generation pipeline stage (sampled)', ['stage']
+)
+REQUEST_SECONDS = metrics.histogram(
+    'lexgenius_request_seconds', 'HTTP request duration by endpoint (sampled)', ['endpoint', 'status']
+)
+GEMINI_TOKENS = metrics.counter(
+    'lexgenius_gemini_tokens_total', 'Tokens reported by the Gemini usage metadata', ['kind', 'template']
+)
+GEMINI_SECONDS = metrics.histogram(
+    'lexgenius_gemini_seconds', 'Duration of Gemini calls by prompt template version (sampled)', ['template']
+)
+PROMPT_TRIMS = metrics.counter(
+    'lexgenius_prompt_trims_total', 'Prompts whose fields were trimmed to the input token budget', ['template']
+)
+GEMINI_CALLS = metrics.counter(
+    'lexgenius_gemini_calls_total', 'Gemini calls by outcome', ['outcome']
+)
+TEMPLATE_CACHE_LOOKUPS = metrics.counter(
+    'lexgenius_template_cache_lookups_total', 'Template cache lookups by result (hit, miss, uncertain)', ['result']
+)
+LOG_RECORDS_DROPPED = metrics.counter(
+    'lexgenius_log_records_dropped_total', 'Log records dropped because the logging queue was full'
+)
+CITATION_CHECKS = metrics.counter(
+    'lexgenius_citation_checks_total', 'Citations checked against the local index by status', ['status']
+)
+RATE_LIMIT_REJECTIONS = metrics.counter(
+    'lexgenius_rate_limit_rejections_total', 'Requests rejected by the rate limiter', ['endpoint']
+)
+
+
+def stage(name):
+    """Shorthand for ``metrics.span(STAGE_SECONDS, stage=name)``"""
+    return metrics.span(STAGE_SECONDS, stage=name)
+
+
+def record_usage(response, template=''):
+    """Add the token counts of a Gemini response to ``GEMINI_TOKENS``, labelled by prompt template"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, field in (
+        ('prompt', 'prompt_token_count'),
+        ('completion', 'candidates_token_count'),
+        ('cached', 'cached_content_token_count'),
+    ):
+        count = getattr(usage, field, 0) or 0
+        if count:
+            GEMINI_TOKENS.inc(count, kind=kind, template=template)
+
+
+def configure(config):
+    """Apply ``METRICS_*`` settings from ``Config`` to the global registry"""
+    metrics.enabled = config.METRICS_ENABLED
+    metrics.sample_rate = config.METRICS_SAMPLE_RATE
+    return metrics
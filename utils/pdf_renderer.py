@@ -0,0 +1,282 @@
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class PdfRenderError(Exception):
+    """Raised when a document could not be rendered to PDF"""
+
+
+class PdfBackend:
+    """Interface of an HTML to PDF engine.
+
+    ``pooled`` engines run in-process and are kept alive in the renderer's
+    worker processes; the others already start a process of their own per
+    render and are called directly from the requesting thread.
+    """
+
+    name = None
+    pooled = True
+
+    def __init__(self, options=None, **settings):
+        self.options = dict(options or {})
+        self.settings = settings
+
+    def render(self, html):
+        """Render an HTML string and return the PDF bytes"""
+        raise NotImplementedError
+
+    def render_file(self, path):
+        """Render an HTML file and return the PDF bytes"""
+        with open(path, encoding='utf-8') as f:
+            return self.render(f.read())
+
+
+class WkhtmltopdfBackend(PdfBackend):
+    """wkhtmltopdf through pdfkit, one process per render killed after ``timeout`` seconds"""
+
+    name = 'wkhtmltopdf'
+    pooled = False
+
+    def __init__(self, options=None, wkhtmltopdf_path=None, timeout=None, **settings):
+        super().__init__(options, **settings)
+        import pdfkit
+        self._pdfkit = pdfkit
+        self.configuration = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
+        self.timeout = timeout
+
+    def _run(self, source, source_type):
+        # Mesmo comando e tratamento de erro do pdfkit, com timeout no processo
+        kit = self._pdfkit.PDFKit(source, source_type, configuration=self.configuration, options=self.options)
+        stdin = kit.source.to_s().encode('utf-8') if source_type == 'string' else None
+        try:
+            result = subprocess.run(kit.command(), input=stdin, capture_output=True, env=kit.environ, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise PdfRenderError(f"Renderização do PDF excedeu {self.timeout}s")
+        kit.handle_error(result.returncode, (result.stderr or result.stdout or b'').decode('utf-8', errors='replace'))
+        return result.stdout
+
+    def render(self, html):
+        return self._run(html, 'string')
+
+    def render_file(self, path):
+        return self._run(path, 'file')
+
+
+class WeasyPrintBackend(PdfBackend):
+    """In-process engine; fonts and stylesheets stay loaded in the worker"""
+
+    name = 'weasyprint'
+
+    def __init__(self, options=None, **settings):
+        super().__init__(options, **settings)
+        try:
+            import weasyprint
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:
+            raise PdfRenderError("WeasyPrint não está instalado (pip install weasyprint)")
+        self._weasyprint = weasyprint
+        self._font_config = FontConfiguration()
+
+    def render(self, html):
+        document = self._weasyprint.HTML(string=html)
+        return document.write_pdf(font_config=self._font_config)
+
+    def render_file(self, path):
+        return self._weasyprint.HTML(filename=path).write_pdf(font_config=self._font_config)
+
+
+BACKENDS = {
+    WkhtmltopdfBackend.name: WkhtmltopdfBackend,
+    WeasyPrintBackend.name: WeasyPrintBackend,
+}
+
+# Backend do processo worker: o initializer guarda a especificação e o backend
+# é criado uma única vez, na primeira renderização (erros chegam ao chamador)
+_worker_spec = None
+_worker_backend = None
+
+
+def _init_worker(backend_name, options, settings):
+    global _worker_spec
+    _worker_spec = (backend_name, options, settings)
+
+
+def _timed_render(backend, method, source):
+    started = time.perf_counter()
+    pdf = getattr(backend, method)(source)
+    return pdf, time.perf_counter() - started
+
+
+def _render_in_worker(method, source):
+    global _worker_backend
+    if _worker_backend is None:
+        backend_name, options, settings = _worker_spec
+        _worker_backend = BACKENDS[backend_name](options, **settings)
+    return _timed_render(_worker_backend, method, source)
+
+
+class RenderStats:
+    """Per-render timing counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def record(self, seconds, wait):
+        with self._lock:
+            self.renders += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.last_seconds = seconds
+            self.wait_seconds += wait
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'renders': self.renders,
+                'errors': self.errors,
+                'total_seconds': self.total_seconds,
+                'avg_seconds': self.total_seconds / self.renders if self.renders else 0.0,
+                'max_seconds': self.max_seconds,
+                'last_seconds': self.last_seconds,
+                'avg_wait_seconds': self.wait_seconds / self.renders if self.renders else 0.0,
+            }
+
+
+class PdfRenderer:
+    """Bounded entry point to the PDF backend.
+
+    In-process (``pooled``) backends run in a pool of long-lived worker
+    processes: each worker builds its backend once and reuses it for every
+    render, so engine start-up and font loading are paid per worker instead
+    of per document. At most ``max_concurrency`` renders are queued or
+    running at any time, and a slot is only given back when its worker is
+    done, even if the caller stopped waiting after ``timeout`` seconds.
+
+    Backends that start a process per render (wkhtmltopdf) gain nothing from
+    the pool; they are called from the requesting thread, at most
+    ``workers`` at a time, and the backend kills a render after ``timeout``.
+    Callers beyond the limit wait up to ``timeout`` seconds for a slot.
+    """
+
+    def __init__(self, backend='wkhtmltopdf', options=None, workers=2, max_concurrency=None,
+                 timeout=60, **settings):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {backend}")
+        self.backend = backend
+        self.pooled = BACKENDS[backend].pooled
+        self.options = dict(options or {})
+        self.settings = settings
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = RenderStats()
+        self._slots = threading.BoundedSemaphore((max_concurrency or workers * 2) if self.pooled else workers)
+        self._pool = None
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.backend, self.options, self.settings)
+                )
+            return self._pool
+
+    def _get_backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = BACKENDS[self.backend](self.options, timeout=self.timeout, **self.settings)
+            return self._backend
+
+    def _release_slot(self, future=None):
+        self._slots.release()
+
+    def _render_in_pool(self, method, source):
+        try:
+            future = self._get_pool().submit(_render_in_worker, method, source)
+        except BaseException:
+            self._release_slot()
+            raise
+        # A vaga só volta quando o worker termina: uma renderização que
+        # estourou o timeout continua ocupando o processo
+        future.add_done_callback(self._release_slot)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # ainda na fila: não chega a rodar
+            raise
+
+    def _render_here(self, method, source):
+        try:
+            return _timed_render(self._get_backend(), method, source)
+        finally:
+            self._release_slot()
+
+    def _submit(self, method, source):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.record_error()
+            raise PdfRenderError("Todos os renderizadores de PDF estão ocupados")
+        try:
+            if self.pooled:
+                pdf, seconds = self._render_in_pool(method, source)
+            else:
+                pdf, seconds = self._render_here(method, source)
+        except FutureTimeoutError:
+            self.stats.record_error()
+            raise PdfRenderError(f"Renderização do PDF excedeu {self.timeout}s")
+        except BrokenProcessPool:
+            # Um worker morreu; a próxima chamada cria uma pool nova
+            self.stats.record_error()
+            self.shutdown(wait=False)
+            raise PdfRenderError("Processo de renderização de PDF encerrado inesperadamente")
+        except Exception:
+            self.stats.record_error()
+            raise
+        self.stats.record(seconds, time.perf_counter() - started - seconds)
+        logger.debug(f"PDF rendered by {self.backend} in {seconds:.3f}s")
+        return pdf
+
+    def render(self, html):
+        """Render an HTML string and return the PDF bytes"""
+        return self._submit('render', html)
+
+    def render_file(self, path):
+        """Render an HTML file and return the PDF bytes"""
+        return self._submit('render_file', path)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+def create_pdf_renderer(config):
+    """Build the PDF renderer configured in ``Config``"""
+    return PdfRenderer(
+        backend=config.PDF_BACKEND,
+        options=config.PDF_OPTIONS,
+        workers=config.PDF_RENDER_WORKERS,
+        max_concurrency=config.PDF_RENDER_MAX_CONCURRENCY,
+        timeout=config.PDF_RENDER_TIMEOUT,
+        wkhtmltopdf_path=config.PDFKIT_PATH
+    )
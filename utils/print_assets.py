@@ -0,0 +1,251 @@
+import base64
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+FONT_TYPES = {
+    '.woff2': ('font/woff2', 'woff2'),
+    '.woff': ('font/woff', 'woff'),
+    '.ttf': ('font/ttf', 'truetype'),
+    '.otf': ('font/otf', 'opentype'),
+}
+# Sufixo do nome do arquivo -> (font-weight, font-style), ex.: Tinos-BoldItalic.ttf
+FONT_VARIANTS = {
+    'regular': ('400', 'normal'),
+    'italic': ('400', 'italic'),
+    'bold': ('700', 'normal'),
+    'bolditalic': ('700', 'italic'),
+}
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_IMPORT_RE = re.compile(r'@import[^;]*;')
+_CLASS_ATTR_RE = re.compile(r'class="([^"]*)"')
+_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)')
+_SELECTOR_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][-_a-zA-Z0-9]*)')
+_SELECTOR_TAG_RE = re.compile(r'(?:^|[\s>+~])([a-zA-Z][a-zA-Z0-9]*)')
+_PSEUDO_RE = re.compile(r'::?([-a-zA-Z]+)')
+_FONT_FAMILY_RE = re.compile(r'font-family\s*:\s*([^;}]+)')
+_WHITESPACE_RE = re.compile(r'\s+')
+_AROUND_PUNCTUATION_RE = re.compile(r'\s*([{};:,>])\s*')
+
+# Pseudo-classes que nunca casam numa página impressa
+_INTERACTIVE_PSEUDOS = frozenset({
+    'hover', 'focus', 'active', 'visited', 'focus-within', 'focus-visible',
+    'fullscreen', '-webkit-full-screen', 'target',
+})
+
+
+def parse_rules(css):
+    """Split a stylesheet into top level ``(prelude, body)`` pairs; ``body`` is the raw block content"""
+    rules = []
+    position = 0
+    length = len(css)
+    while position < length:
+        start = css.find('{', position)
+        if start < 0:
+            break
+        depth = 1
+        end = start + 1
+        while end < length and depth:
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+            end += 1
+        rules.append((css[position:start].strip(), css[start + 1:end - 1]))
+        position = end
+    return rules
+
+
+def used_selectors_from_html(*sources):
+    """Class names and tag names that appear in the given HTML/Jinja sources"""
+    classes = set()
+    tags = {'html', 'body'}
+    for source in sources:
+        for value in _CLASS_ATTR_RE.findall(source):
+            classes.update(value.split())
+        tags.update(tag.lower() for tag in _TAG_RE.findall(source))
+    return classes, tags
+
+
+def _selector_is_used(selector, classes, tags):
+    if selector == '*' or selector.startswith(':root'):
+        return True
+    if any(pseudo in _INTERACTIVE_PSEUDOS for pseudo in _PSEUDO_RE.findall(selector)):
+        return False
+    bare = _PSEUDO_RE.sub('', selector)
+    if any(name not in classes for name in _SELECTOR_CLASS_RE.findall(bare)):
+        return False
+    without_classes = _SELECTOR_CLASS_RE.sub('', bare)
+    return all(tag.lower() in tags for tag in _SELECTOR_TAG_RE.findall(without_classes))
+
+
+def tree_shake(css, classes, tags, media='print'):
+    """Keep only rules whose selectors can match the print document.
+
+    Rules inside ``@media print`` are unwrapped (the bundle is only ever
+    used for print), other ``@media`` blocks and remote ``@import`` rules
+    are dropped, and selector lists are trimmed to their used selectors.
+    """
+    css = _IMPORT_RE.sub('', _COMMENT_RE.sub('', css))
+    kept = []
+    for prelude, body in parse_rules(css):
+        if prelude.startswith('@media'):
+            if media in prelude.split():
+                kept.extend(tree_shake(body, classes, tags, media))
+            continue
+        if prelude.startswith('@'):
+            if prelude.startswith(('@font-face', '@page')):
+                kept.append((prelude, body))
+            continue
+        selectors = [s.strip() for s in prelude.split(',') if _selector_is_used(s.strip(), classes, tags)]
+        if selectors:
+            kept.append((', '.join(selectors), body))
+    return kept
+
+
+def minify(rules):
+    """Serialize ``(prelude, body)`` pairs with insignificant whitespace removed"""
+    parts = []
+    for prelude, body in rules:
+        block = _AROUND_PUNCTUATION_RE.sub(r'\1', _WHITESPACE_RE.sub(' ', body)).strip().rstrip(';')
+        if block:
+            parts.append(f'{_WHITESPACE_RE.sub(" ", prelude)}{{{block}}}')
+    return '\n'.join(parts)
+
+
+def font_faces(font_dir, families):
+    """``@font-face`` rules with the local font files of ``families`` embedded as data URIs.
+
+    Files are matched by name, ``<Family>-<Variant>.<ext>`` (e.g.
+    ``Times New Roman-Bold.ttf``); families without local files are left to
+    the fonts installed on the render host.
+    """
+    if not font_dir or not os.path.isdir(font_dir):
+        return []
+    wanted = {family.lower() for family in families}
+    rules = []
+    for name in sorted(os.listdir(font_dir)):
+        stem, extension = os.path.splitext(name)
+        font_type = FONT_TYPES.get(extension.lower())
+        family, _, variant = stem.rpartition('-')
+        if font_type is None or family.lower() not in wanted:
+            continue
+        weight, style = FONT_VARIANTS.get(variant.lower(), ('400', 'normal'))
+        with open(os.path.join(font_dir, name), 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+        mime, css_format = font_type
+        rules.append(('@font-face', (
+            f"font-family:'{family}';font-style:{style};font-weight:{weight};"
+            f"src:url(data:{mime};base64,{data}) format('{css_format}')"
+        )))
+    return rules
+
+
+def referenced_families(rules):
+    families = set()
+    for _, body in rules:
+        for declaration in _FONT_FAMILY_RE.findall(body):
+            families.update(name.strip().strip('\'"') for name in declaration.split(','))
+    return families
+
+
+def build_print_bundle(stylesheets, templates, font_dir=None, extra_classes=()):
+    """Compile the self-contained CSS used by the print template.
+
+    ``stylesheets`` and ``templates`` are file paths; the templates (plus
+    ``extra_classes`` for classes injected at render time) decide which
+    selectors survive tree shaking.
+    """
+    sources = []
+    for path in templates:
+        with open(path, encoding='utf-8') as f:
+            sources.append(f.read())
+    classes, tags = used_selectors_from_html(*sources)
+    classes.update(extra_classes)
+
+    rules = []
+    for path in stylesheets:
+        with open(path, encoding='utf-8') as f:
+            rules.extend(tree_shake(f.read(), classes, tags))
+    families = referenced_families(rules)
+    faces = font_faces(font_dir, families)
+    if not faces:
+        logger.info(
+            "No font files in %s for %s; the PDF uses the fonts installed on the render host",
+            font_dir, ', '.join(sorted(families))
+        )
+    return minify(faces + rules)
+
+
+class PrintAssets:
+    """Print CSS bundle compiled once and kept in memory.
+
+    A prebuilt bundle (see ``flask build-print-assets``) is used when it is
+    newer than every source; otherwise the bundle is compiled on first use.
+    """
+
+    def __init__(self, stylesheets, templates, font_dir=None, bundle_path=None, extra_classes=()):
+        self.stylesheets = list(stylesheets)
+        self.templates = list(templates)
+        self.font_dir = font_dir
+        self.bundle_path = bundle_path
+        self.extra_classes = tuple(extra_classes)
+        self._css = None
+        self._lock = threading.Lock()
+
+    def _sources_mtime(self):
+        paths = self.stylesheets + self.templates
+        if self.font_dir and os.path.isdir(self.font_dir):
+            paths += [os.path.join(self.font_dir, name) for name in os.listdir(self.font_dir)]
+        return max((os.path.getmtime(path) for path in paths if os.path.exists(path)), default=0)
+
+    def build(self):
+        return build_print_bundle(self.stylesheets, self.templates, self.font_dir, self.extra_classes)
+
+    def write(self):
+        """Compile the bundle to ``bundle_path`` and return its size in bytes"""
+        css = self.build()
+        os.makedirs(os.path.dirname(os.path.abspath(self.bundle_path)), exist_ok=True)
+        with open(self.bundle_path, 'w', encoding='utf-8') as f:
+            f.write(css)
+        with self._lock:
+            self._css = css
+        return len(css.encode('utf-8'))
+
+    def _load(self):
+        if self.bundle_path and os.path.exists(self.bundle_path):
+            if os.path.getmtime(self.bundle_path) >= self._sources_mtime():
+                with open(self.bundle_path, encoding='utf-8') as f:
+                    return f.read()
+            logger.info("Print CSS bundle is stale; compiling in memory")
+        return self.build()
+
+    @property
+    def css(self):
+        if self._css is None:
+            with self._lock:
+                if self._css is None:
+                    self._css = self._load()
+        return self._css
+
+
+def create_print_assets(config, extra_classes=(), root=None):
+    """Build the print asset bundle configured in ``Config``.
+
+    Relative source paths (stylesheets, templates, fonts) are resolved
+    against ``root``, normally ``app.root_path``.
+    """
+    def source(path):
+        return os.path.join(root, path) if root and path else path
+
+    return PrintAssets(
+        [source(path) for path in config.PRINT_STYLESHEETS],
+        [source(path) for path in config.PRINT_TEMPLATES],
+        font_dir=source(config.PRINT_FONT_DIR),
+        bundle_path=config.PRINT_BUNDLE_PATH,
+        extra_classes=extra_classes
+    )
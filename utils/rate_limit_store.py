@@ -0,0 +1,183 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import MovingWindowSupport, Storage
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_path_from_uri(uri):
+    """Database path of a ``sqlite:///relative.db`` or ``sqlite:////absolute.db`` URI"""
+    path = uri.split('://', 1)[1]
+    return path[1:] if path.startswith('/') else path
+
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    """``limits`` storage in a local SQLite file shared by every worker on the host.
+
+    Registered under the ``sqlite://`` scheme, so the Flask-Limiter
+    ``storage_uri`` can point at it. Counters are updated with a single
+    ``INSERT ... ON CONFLICT ... RETURNING`` statement, which is atomic
+    across processes without an explicit transaction; in WAL mode readers
+    never wait for the writer. Expired rows are purged every
+    ``PURGE_INTERVAL`` writes.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    PURGE_INTERVAL = 500
+
+    def __init__(self, uri=None, **options):
+        self.path = sqlite_path_from_uri(uri or 'sqlite:///ratelimit.db')
+        self.timeout = float(options.get('timeout', 5))
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._writes = 0
+        super().__init__(uri, **options)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        with self._init_lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._initialized:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS counters ('
+                    ' key TEXT PRIMARY KEY,'
+                    ' count INTEGER NOT NULL,'
+                    ' expires_at REAL NOT NULL)'
+                )
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS events ('
+                    ' key TEXT NOT NULL,'
+                    ' at REAL NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS events_key_at ON events (key, at)')
+                self._initialized = True
+        self._local.conn = conn
+        return conn
+
+    def _count_write(self, conn, now):
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            conn.execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        conn = self._connect()
+        now = time.time()
+        # Janela expirada recomeça do zero; elastic_expiry estende a janela a cada hit
+        count, = conn.execute(
+            'INSERT INTO counters (key, count, expires_at) VALUES (:key, :amount, :expires_at) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            ' count = CASE WHEN counters.expires_at <= :now THEN :amount ELSE counters.count + :amount END,'
+            ' expires_at = CASE WHEN counters.expires_at <= :now OR :elastic THEN :expires_at'
+            '                   ELSE counters.expires_at END '
+            'RETURNING count',
+            {'key': key, 'amount': amount, 'expires_at': now + expiry, 'now': now, 'elastic': bool(elastic_expiry)}
+        ).fetchone()
+        self._count_write(conn, now)
+        return count
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT count FROM counters WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return int(row[0] if row is not None else now)
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM events WHERE key = ? AND at < ?', (key, now - expiry))
+            acquired, = conn.execute('SELECT COUNT(*) FROM events WHERE key = ?', (key,)).fetchone()
+            allowed = acquired + amount <= limit
+            if allowed:
+                conn.executemany('INSERT INTO events (key, at) VALUES (?, ?)', [(key, now)] * amount)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        start, acquired = self._connect().execute(
+            'SELECT MIN(at), COUNT(*) FROM events WHERE key = ? AND at >= ?', (key, now - expiry)
+        ).fetchone()
+        return int(start if start is not None else now), acquired
+
+    def check(self):
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            removed, = conn.execute('SELECT COUNT(*) FROM counters').fetchone()
+            conn.execute('DELETE FROM counters')
+            conn.execute('DELETE FROM events')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return removed
+
+    def clear(self, key):
+        conn = self._connect()
+        conn.execute('DELETE FROM counters WHERE key = ?', (key,))
+        conn.execute('DELETE FROM events WHERE key = ?', (key,))
+
+
+class LoginThrottle:
+    """Login attempt counter kept in the rate limit storage.
+
+    Unlike a counter in the session cookie, the client cannot reset it,
+    and with a shared storage every worker sees the same attempts. Each
+    attempt extends the lockout window (``elastic_expiry``), so the client
+    is released ``window`` seconds after its last attempt; a successful
+    login resets the counter.
+    """
+
+    def __init__(self, storage, max_attempts=3, window=900, prefix='login'):
+        self.storage = storage
+        self.max_attempts = max_attempts
+        self.window = window
+        self.prefix = prefix
+
+    def _key(self, client):
+        return f'{self.prefix}/{client}'
+
+    def attempt(self, client):
+        """Count an attempt and return False when the client is over ``max_attempts``.
+
+        The attempt is counted before the password is checked, in the same
+        atomic increment that returns the total: concurrent requests cannot
+        all pass a check made before any of them recorded its failure.
+        """
+        return self.storage.incr(self._key(client), self.window, elastic_expiry=True) <= self.max_attempts
+
+    def reset(self, client):
+        self.storage.clear(self._key(client))
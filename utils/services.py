@@ -0,0 +1,134 @@
+import os
+import threading
+
+from agents.formatter import ALLOWED_CLASSES
+from agents.gemini_agent import GeminiAgent
+from utils.artifact_store import create_artifact_store
+from utils.citation_index import create_citation_index
+from utils.document_history import create_document_history
+from utils.docx_export import create_docx_exporter
+from utils.http_cache import StaticAssets, tree_fingerprint
+from utils.job_queue import create_job_queue
+from utils.pdf_renderer import create_pdf_renderer
+from utils.print_assets import create_print_assets
+
+
+class resource:
+    """Declare a :class:`Services` resource built by the decorated method on first access"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, services, owner):
+        if services is None:
+            return self
+        return services._get(self.name, self.factory)
+
+
+class Services:
+    """Process-wide resources shared by every request, created on first use.
+
+    Nothing is built at import or in ``create_app()``, so starting the app
+    opens no connections, spawns no processes and starts no threads. Each
+    resource is built once per process: a forked worker (e.g. gunicorn
+    with ``--preload``) builds its own instead of inheriting the parent's
+    threads and pools.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.root_path = None
+        self._resources = {}
+        self._pid = os.getpid()
+        # Reentrante: um recurso pode depender de outro (o agente usa o índice de citações)
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        self.root_path = app.root_path
+        app.extensions['services'] = self
+
+    def _get(self, name, factory):
+        value = self._resources.get(name)
+        if value is not None and self._pid == os.getpid():
+            return value
+        with self._lock:
+            if self._pid != os.getpid():
+                self._resources = {}
+                self._pid = os.getpid()
+            value = self._resources.get(name)
+            if value is None:
+                value = self._resources[name] = factory(self)
+        return value
+
+    def ready(self, name):
+        """True when ``name`` was already built in this process (for metrics that must not build it)"""
+        return self._pid == os.getpid() and name in self._resources
+
+    def override(self, name, value):
+        """Replace a resource, e.g. an agent with a stub backend in benchmarks"""
+        with self._lock:
+            self._resources[name] = value
+
+    @resource
+    def gemini_agent(self):
+        return GeminiAgent(citation_index=self.citation_index)
+
+    @resource
+    def citation_index(self):
+        # Só mapeia o arquivo (ou compila as fontes) na primeira consulta
+        return create_citation_index(self.config, root=self.root_path)
+
+    def citation_version(self):
+        """Version of the citation index whose entries go in the document prompts ('' when none go)"""
+        if not self.config.CITATION_TOP_K:
+            return ''
+        try:
+            return self.citation_index.version
+        except Exception:
+            # Sem o índice o prompt vai sem dispositivos (ver GeminiAgent._references)
+            return ''
+
+    @resource
+    def pdf_renderer(self):
+        # Pool de processos de longa duração; os processos só sobem no primeiro PDF
+        return create_pdf_renderer(self.config)
+
+    @resource
+    def docx_exporter(self):
+        return create_docx_exporter(self.config, root=self.root_path)
+
+    @resource
+    def artifact_store(self):
+        # PDFs renderizados (endereçados por conteúdo) com coleta de lixo em background
+        store = create_artifact_store(self.config)
+        store.start_background_gc()
+        return store
+
+    @resource
+    def document_history(self):
+        return create_document_history(self.config)
+
+    @resource
+    def job_queue(self):
+        return create_job_queue(self.config)
+
+    @resource
+    def print_assets(self):
+        # As classes do formatador entram porque são injetadas no HTML em tempo de render
+        return create_print_assets(self.config, extra_classes=ALLOWED_CLASSES, root=self.root_path)
+
+    @resource
+    def static_assets(self):
+        # Hash do conteúdo de cada arquivo estático, para URLs com ?v= e cache imutável
+        return StaticAssets(
+            os.path.join(self.root_path, 'static'),
+            max_age=self.config.STATIC_MAX_AGE,
+            level=self.config.STATIC_COMPRESSION_LEVEL
+        )
+
+    @resource
+    def templates_version(self):
+        # Entra no ETag dos previews: um deploy com templates novos invalida as páginas no navegador
+        return tree_fingerprint(os.path.join(self.root_path, 'templates'))
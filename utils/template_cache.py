@@ -0,0 +1,289 @@
+"""Reuse of generated documents across requests that differ only in entities.
+
+Mass campaigns produce requests whose parties and facts differ only in
+names, CPF/CNPJ numbers, dates and amounts. Their inputs are reduced to a
+canonical skeleton (each entity replaced by a numbered placeholder) and the
+document generated for the first request is stored with the same entities
+turned into placeholders, so the next request with the same skeleton is
+answered by substituting its own entities back. Everything else, including
+gendered words such as "brasileiro"/"brasileira", must match exactly.
+
+A template is only reused when every entity-like token of its content
+sections (value of the cause included) was traced back to an input
+entity. A single leftover, such as a spelled-out amount, a total computed
+from two values or a first name used alone, would be carried over
+verbatim into another client's document, so such documents are always
+generated again.
+"""
+import logging
+import re
+
+from agents.document import LegalDocument
+from utils.document_cache import normalize_text
+from utils.metrics import TEMPLATE_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Campos com entidades; a fundamentação jurídica entra literal na chave
+ENTITY_FIELDS = ('parties', 'facts', 'requests')
+# Seções cujo conteúdo deriva da entrada; data, advogado e OAB são copiados como estão
+CONTENT_SECTIONS = ('parties', 'facts', 'legal_grounds', 'requests', 'value_cause')
+
+MONTHS = (
+    'janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+    'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro'
+)
+PARTICLES = frozenset(('de', 'da', 'do', 'dos', 'das', 'e'))
+# Sequências capitalizadas com estas palavras são leis, órgãos ou lugares do processo, não partes
+NOT_NAMES = frozenset((
+    'código', 'lei', 'decreto', 'tribunal', 'constituição', 'federal', 'civil', 'penal', 'processo',
+    'superior', 'supremo', 'justiça', 'juizado', 'juízo', 'vara', 'comarca', 'foro', 'ministério',
+    'defesa', 'consumidor', 'súmula', 'danos', 'morais', 'materiais', 'ação', 'direito', 'cível',
+    'consolidação', 'leis', 'trabalho', 'república', 'excelentíssimo', 'senhor', 'doutor', 'juiz',
+))
+# Palavras que só aparecem capitalizadas por abrir a frase ("Em São Paulo", "O Banco")
+LEADING_WORDS = frozenset((
+    'o', 'a', 'os', 'as', 'em', 'no', 'na', 'nos', 'nas', 'ao', 'aos', 'do', 'da', 'dos', 'das', 'de',
+    'pelo', 'pela', 'para', 'por', 'com', 'sem', 'que', 'este', 'esta', 'esse', 'essa', 'neste', 'nesta',
+    'conforme', 'segundo', 'após', 'ante', 'entre', 'sobre', 'até', 'desde', 'como', 'quando', 'se', 'não',
+))
+
+_UPPER_WORD = r"[A-ZÀ-Ý][A-ZÀ-Ý']+"
+_TITLE_WORD = r"[A-ZÀ-Ý][a-zà-ÿ']+"
+_SEPARATOR = r"\s+(?:(?:de|da|do|dos|das|e|DE|DA|DO|DOS|DAS|E)\s+)?"
+# Sem o ponto final, que fica no esqueleto ("LTDA." e "S.A." viram "⟦NAME_1⟧.")
+_COMPANY_SUFFIX = r"(?:\s+(?:S\.\s?A|S/A)\b)?"
+
+_ENTITY_RE = re.compile(
+    r'(?P<cnpj>\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b)'
+    r'|(?P<cpf>\b\d{3}\.\d{3}\.\d{3}-\d{2}\b)'
+    r'|(?P<date>\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{1,2}º? de (?:' + '|'.join(MONTHS) + r') de \d{4}\b)'
+    r'|(?P<money>R\$\s?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d{2})?(?![\d.,]\d))'
+    r'|(?P<name>\b' + _UPPER_WORD + r'(?:' + _SEPARATOR + _UPPER_WORD + r')+' + _COMPANY_SUFFIX +
+    r'|\b' + _TITLE_WORD + r'(?:' + _SEPARATOR + _TITLE_WORD + r')+)',
+)
+_MONEY_IN_WORDS_RE = re.compile(r'\([^()]*\b(?:reais|real|centavos)\b[^()]*\)', re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r'⟦([A-Z]+)_(\d+)\|(\w+)⟧')
+
+
+def _name_span(match):
+    """Span of a capitalized sequence without its sentence opener; None when it is not a name"""
+    start, value = match.start(), match.group()
+    first, _, rest = value.partition(' ')
+    if first.lower() in LEADING_WORDS:
+        if ' ' not in rest.strip():
+            return None
+        start += len(value) - len(rest)
+        value = rest
+    if any(word.strip("'.").lower() in NOT_NAMES for word in value.split()):
+        return None
+    return start, match.end()
+
+
+def find_entities(text):
+    """``(kind, start, end)`` of every name, CPF, CNPJ, date and amount in ``text``"""
+    for match in _ENTITY_RE.finditer(text):
+        kind = match.lastgroup
+        if kind != 'name':
+            yield kind, match.start(), match.end()
+            continue
+        span = _name_span(match)
+        if span is not None:
+            yield (kind, *span)
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value)
+
+
+def _parse_date(value):
+    numbers = re.findall(r'\d+', value)
+    day, year = int(numbers[0]), int(numbers[-1])
+    if len(numbers) == 3:
+        month = int(numbers[1])
+    else:
+        month = next(index for index, name in enumerate(MONTHS, 1) if name in value.lower())
+    return day, month, year
+
+
+def _cents(value):
+    integer, _, cents = value.replace('R$', '').strip().partition(',')
+    return int(integer.replace('.', '')) * 100 + int(cents or 0)
+
+
+def _title(value):
+    return ' '.join(word.lower() if word.lower() in PARTICLES else word.capitalize() for word in value.split())
+
+
+def entity_key(kind, value):
+    """Identity of an entity: two spellings of the same person, date or amount share it"""
+    if kind == 'name':
+        return ' '.join(value.casefold().split())
+    if kind in ('cpf', 'cnpj'):
+        return _digits(value)
+    if kind == 'date':
+        return '%04d-%02d-%02d' % _parse_date(value)[::-1]
+    return str(_cents(value))
+
+
+def render_entity(kind, value, style):
+    """Write ``value`` in the ``style`` recorded when the template was made"""
+    if style == 'raw':
+        return value
+    if kind == 'name':
+        return value.upper() if style == 'upper' else _title(value)
+    if kind in ('cpf', 'cnpj'):
+        return _digits(value)
+    if kind == 'date':
+        day, month, year = _parse_date(value)
+        if style == 'long' and not 1 <= month <= 12:
+            return value
+        return f'{day} de {MONTHS[month - 1]} de {year}' if style == 'long' else f'{day:02d}/{month:02d}/{year}'
+    integer, cents = divmod(_cents(value), 100)
+    amount = f'{integer:,}'.replace(',', '.') + f',{cents:02d}'
+    return f'R$ {amount}' if style == 'formatted' else f'R${amount}'
+
+
+STYLES = {
+    'name': ('raw', 'upper', 'title'),
+    'cpf': ('raw', 'digits'),
+    'cnpj': ('raw', 'digits'),
+    'date': ('raw', 'numeric', 'long'),
+    'money': ('raw', 'formatted', 'compact'),
+}
+
+
+def canonicalize(fields):
+    """Return ``(skeleton, entities)``: the fields with entities replaced by placeholders
+    (``⟦NAME_1⟧``, numbered per kind in order of appearance) and the value of each placeholder"""
+    slots = {}
+    entities = {}
+    counts = {}
+    skeleton = {}
+    for field in ENTITY_FIELDS:
+        text = normalize_text(fields.get(field))
+        parts = []
+        last = 0
+        for kind, start, end in find_entities(text):
+            value = text[start:end]
+            slot = (kind, entity_key(kind, value))
+            placeholder = slots.get(slot)
+            if placeholder is None:
+                counts[kind] = counts.get(kind, 0) + 1
+                placeholder = slots[slot] = f'{kind.upper()}_{counts[kind]}'
+                entities[placeholder] = value
+            parts.append(text[last:start])
+            parts.append(f'⟦{placeholder}⟧')
+            last = end
+        parts.append(text[last:])
+        skeleton[field] = ''.join(parts)
+    return skeleton, entities
+
+
+def _variants(entities):
+    """Regex matching every spelling of the entities, and the ``(placeholder, style)`` of each spelling"""
+    spellings = {}
+    for placeholder, value in entities.items():
+        kind = placeholder.split('_')[0].lower()
+        for style in STYLES[kind]:
+            spellings.setdefault(render_entity(kind, value, style), (placeholder, style))
+    # As mais longas primeiro: "FULANO DE TAL" antes de "FULANO"
+    ordered = sorted(spellings, key=len, reverse=True)
+    pattern = re.compile(r'(?<!\w)(?:' + '|'.join(re.escape(spelling) for spelling in ordered) + r')(?!\w)')
+    return pattern, spellings
+
+
+def _residuals(text, entities):
+    """Entity-like tokens of a templated text that are not placeholders"""
+    text = _PLACEHOLDER_RE.sub(' ', text)
+    count = sum(1 for kind, _, _ in find_entities(text) if kind != 'name')
+    count += len(_MONEY_IN_WORDS_RE.findall(text))
+    # Pedaços de nomes da entrada (ex.: só o primeiro nome) seriam copiados para outra parte
+    folded = text.casefold()
+    for placeholder, value in entities.items():
+        if placeholder.startswith('NAME_'):
+            words = {word for word in value.casefold().split() if len(word) > 3 and word not in PARTICLES}
+            count += sum(1 for word in words if re.search(r'(?<!\w)' + re.escape(word) + r'(?!\w)', folded))
+    return count
+
+
+def make_template(document, entities):
+    """Return ``(sections, residuals)``: ``document`` with the input entities replaced by
+    ``⟦PLACEHOLDER|style⟧`` and the number of entity-like tokens of its content sections
+    that could not be traced back to them (the template is only reusable when it is 0)"""
+    pattern, spellings = _variants(entities)
+    residual = 0
+    sections = {}
+    for name, text in document.items():
+        if name not in CONTENT_SECTIONS:
+            sections[name] = text or ''
+            continue
+
+        def replace(match):
+            placeholder, style = spellings[match.group()]
+            return f'⟦{placeholder}|{style}⟧'
+
+        sections[name] = pattern.sub(replace, text or '')
+        residual += _residuals(sections[name], entities)
+    return sections, residual
+
+
+def fill_template(sections, entities):
+    """Substitute ``entities`` into a template; None when a placeholder has no value"""
+    missing = []
+
+    def replace(match):
+        kind, number, style = match.groups()
+        value = entities.get(f'{kind}_{number}')
+        if value is None:
+            missing.append(match.group())
+            return ''
+        return render_entity(kind.lower(), value, style)
+
+    filled = {name: _PLACEHOLDER_RE.sub(replace, text) for name, text in sections.items()}
+    return None if missing else LegalDocument.from_mapping(filled)
+
+
+class TemplateCache:
+    """Documents stored as entity templates, keyed by the canonical skeleton of their input.
+
+    ``store`` stands for a :class:`~utils.document_cache.DocumentCache` and
+    ``key_func`` for ``CacheManager.document_key``, so templates share the
+    storage, TTL and invalidation (model, prompt version) of the documents.
+    """
+
+    def __init__(self, store, key_func):
+        self.store = store
+        self.key_func = key_func
+
+    def _key(self, case_type, skeleton, legal_grounds):
+        return 'template:' + self.key_func(
+            case_type, skeleton['parties'], skeleton['facts'], legal_grounds, skeleton['requests']
+        )
+
+    def put(self, case_type, parties, facts, legal_grounds, requests, document):
+        """Store ``document`` as a template; returns its untraced tokens, or None without entities"""
+        skeleton, entities = canonicalize({'parties': parties, 'facts': facts, 'requests': requests})
+        if not entities:
+            return None
+        sections, residuals = make_template(document, entities)
+        self.store.set(self._key(case_type, skeleton, legal_grounds), {'sections': sections, 'residuals': residuals})
+        logger.debug(f"Template stored with {residuals} untraced tokens ({len(entities)} entities)")
+        return residuals
+
+    def get(self, case_type, parties, facts, legal_grounds, requests):
+        """Document for this request built from a template, or None to generate it"""
+        skeleton, entities = canonicalize({'parties': parties, 'facts': facts, 'requests': requests})
+        if not entities:
+            return None
+        entry = self.store.get(self._key(case_type, skeleton, legal_grounds))
+        if entry is None:
+            TEMPLATE_CACHE_LOOKUPS.inc(result='miss')
+            return None
+        # Entradas antigas (só com 'confidence') também são recusadas
+        if entry.get('residuals') != 0:
+            TEMPLATE_CACHE_LOOKUPS.inc(result='uncertain')
+            return None
+        document = fill_template(entry['sections'], entities)
+        TEMPLATE_CACHE_LOOKUPS.inc(result='hit' if document is not None else 'uncertain')
+        return document
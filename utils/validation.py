@@ -0,0 +1,111 @@
+"""Declarative validation of the generation form, shared by the server and the browser.
+
+The schema is plain data (labels, lengths, allowed choices, a forbidden
+pattern and the message templates) compiled once into :class:`Schema`. The
+same data is served as JSON (:meth:`Schema.as_json`) so the form checks
+every field as the user types without a request; the server validates all
+fields in a single pass and reports every error at once.
+"""
+import hashlib
+import json
+import re
+
+GENERATION_FIELDS = ('parties', 'facts', 'legal_grounds', 'requests')
+
+# Trechos que indicam tentativa de injetar script no HTML gerado (regex válida também em JavaScript)
+FORBIDDEN_PATTERN = r'<script|javascript:|on\w+\s*='
+
+MESSAGES = {
+    'required': 'O campo {label} não pode estar vazio',
+    'choices': '{label} inválido',
+    'min_length': 'O campo {label} deve ter pelo menos {min_length} caracteres',
+    'max_length': 'O campo {label} não pode ter mais que {max_length} caracteres',
+    'forbidden': 'O campo {label} contém caracteres não permitidos',
+}
+
+
+def generation_fields(config):
+    """Field rules of the generation form, from the limits in ``Config``"""
+    text = dict(
+        required=True, min_length=config.MIN_TEXT_LENGTH, max_length=config.MAX_TEXT_LENGTH, forbidden=FORBIDDEN_PATTERN
+    )
+    return {
+        'case_type': dict(label='Tipo de peça', required=True, choices=list(config.ALLOWED_CASE_TYPES)),
+        'parties': dict(text, label='Partes Envolvidas', hint='Descreva detalhadamente as partes envolvidas no processo.'),
+        'facts': dict(text, label='Fatos'),
+        'legal_grounds': dict(text, label='Fundamentação Jurídica'),
+        'requests': dict(text, label='Pedidos'),
+    }
+
+
+class Schema:
+    """Compiled form schema: the patterns and choice sets are built once.
+
+    Values are checked after stripping surrounding whitespace; the rules
+    run in the order required, choices, min_length, max_length, forbidden
+    and the first failing one gives the field's message.
+    """
+
+    def __init__(self, fields, messages=MESSAGES):
+        self.fields = fields
+        self.messages = messages
+        self._choices = {name: frozenset(spec['choices']) for name, spec in fields.items() if spec.get('choices')}
+        self._forbidden = {
+            name: re.compile(spec['forbidden'], re.IGNORECASE) for name, spec in fields.items() if spec.get('forbidden')
+        }
+        # jsonify ordena as chaves: a ordem dos campos no formulário vai à parte
+        self._json = {'fields': fields, 'order': list(fields), 'messages': messages}
+        self.version = hashlib.sha256(json.dumps(self._json, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def message(self, name, rule):
+        spec = self.fields[name]
+        message = self.messages[rule].format(**spec)
+        if rule == 'min_length' and spec.get('hint'):
+            message = f"{message}. {spec['hint']}"
+        return message
+
+    def check(self, name, value):
+        """Error message for ``value`` of field ``name``, or None when it is valid"""
+        spec = self.fields[name]
+        value = value.strip() if isinstance(value, str) else ''
+        if not value:
+            return self.message(name, 'required') if spec.get('required') else None
+        if name in self._choices and value not in self._choices[name]:
+            return self.message(name, 'choices')
+        if len(value) < spec.get('min_length', 0):
+            return self.message(name, 'min_length')
+        if spec.get('max_length') and len(value) > spec['max_length']:
+            return self.message(name, 'max_length')
+        if name in self._forbidden and self._forbidden[name].search(value):
+            return self.message(name, 'forbidden')
+        return None
+
+    def validate(self, data):
+        """Check every field of ``data`` in one pass.
+
+        Returns ``(values, errors)``: the stripped values of the schema
+        fields and a field name to message dict, empty when all are valid.
+        """
+        values = {}
+        errors = {}
+        for name in self.fields:
+            value = data.get(name)
+            error = self.check(name, value)
+            if error:
+                errors[name] = error
+            else:
+                values[name] = value.strip() if isinstance(value, str) else ''
+        return values, errors
+
+    @staticmethod
+    def summary(errors):
+        """All the messages of ``errors`` in one line (for flash messages and plain error strings)"""
+        return '; '.join(message.rstrip('.') for message in errors.values())
+
+    def as_json(self):
+        """The schema as served to the browser (``static/js/validation.js`` applies the same rules)"""
+        return self._json
+
+
+def create_generation_schema(config):
+    return Schema(generation_fields(config))